@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Encode time, on-disk size and decode throughput of the scenario codecs on a synthetic corpus.
+Run from the repository root with `python -m benchmarks.codecs`.
+"""
+from benchmarks.synthetic import iter_update_records, iter_rib_records, get_prefixes, write_mrt_file
+from src.services.mrt import get_codec_suffix, iter_chunks, iter_records, zstandard
+from src.services.rewrite import rewrite_file
+from src.models.rewrite import CODEC_CHOICES, RewriteTask
+from pathlib import Path
+import tempfile
+import time
+
+UPDATE_FILES = 4
+RECORDS_PER_FILE = 50000
+
+def main():
+    """ Transcode a synthetic corpus to every codec and measure encode time, size and decode throughput.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        prefixes = get_prefixes(100000)
+        sources = []
+
+        for index in range(UPDATE_FILES):
+            path = directory / f'update{index}.bz2'
+            write_mrt_file(path, iter_update_records(1704067200 + index * 900, 900, RECORDS_PER_FILE, seed=index, prefixes=prefixes))
+            sources.append(path)
+
+        path = directory / 'rib.bz2'
+        write_mrt_file(path, iter_rib_records(1704067200, prefixes=prefixes))
+        sources.append(path)
+
+        uncompressed = sum(len(chunk) for source in sources for chunk in iter_chunks(source))
+        print(f'corpus {len(sources)} files, {uncompressed / 1e6:.1f} MB uncompressed\n')
+
+        for codec in CODEC_CHOICES:
+            if codec == 'zstd' and not zstandard:
+                print(f'{codec:<5} skipped, install zstandard')
+                continue
+
+            targets = []
+            start_time = time.perf_counter()
+            for source in sources:
+                target = directory / codec / source.with_suffix(get_codec_suffix(codec)).name
+                target.parent.mkdir(exist_ok=True)
+                rewrite_file(RewriteTask(source=source, target=target))
+                targets.append(target)
+            encode_duration = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            for target in targets:
+                for _ in iter_chunks(target):
+                    pass
+            decompress_duration = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            records = sum(1 for target in targets for _ in iter_records(target))
+            decode_duration = time.perf_counter() - start_time
+
+            size = sum(target.stat().st_size for target in targets)
+            print(
+                f'{codec:<5} size {size / 1e6:>7.1f} MB ({size / uncompressed:>6.1%})'
+                f'  encode {uncompressed / encode_duration / 1e6:>7.1f} MB/s'
+                f'  decompress {uncompressed / decompress_duration / 1e6:>8.1f} MB/s'
+                f'  decode {records / decode_duration:>10.0f} records/s'
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Replay benchmark of compiled bucket files against raw MRT files at playback speed 1, 10 and 100.
+Playback is simulated on a virtual clock from the measured cost of every bucket, so no time is spent sleeping.
+Run from the repository root with `python -m benchmarks.compiled_replay`.
+"""
+from benchmarks.synthetic import get_mrt_file_name, iter_update_records, get_prefixes, write_mrt_file
+from src.services.compile import compile_scenario, iter_buckets
+from src.models.mrt_scenario import MRTScenario
+from src.services.mrt import iter_records
+from datetime import datetime, timedelta
+from typing import Iterator
+from pathlib import Path
+import tempfile
+import heapq
+import time
+
+PEER_NAMES = ['decix', 'linx', 'amsix']
+FILES_PER_PEER = 8
+RECORDS_PER_FILE = 20000
+INTERVAL = 5
+SPEEDS = [1, 10, 100]
+LATE_THRESHOLD = 0.001
+
+def iter_raw_buckets(mrt_files: list[Path], interval: int) -> Iterator[tuple[int, bytes]]:
+    """ Replay raw MRT files like a player without compiled files, decompressing, parsing and grouping every record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The MRT files.
+            interval (int): The bucket interval in seconds.
+
+        Returns:
+            Iterator[tuple[int, bytes]]: The bucket timestamps and their raw MRT records.
+    """
+    bucket_timestamp = None
+    bucket = []
+
+    for record in heapq.merge(*map(iter_records, mrt_files), key=lambda record: (record.timestamp, record.microsecond)):
+        timestamp = record.timestamp - record.timestamp % interval
+
+        if timestamp != bucket_timestamp and bucket:
+            yield bucket_timestamp, b''.join(bucket)
+            bucket = []
+
+        bucket_timestamp = timestamp
+        bucket.append(bytes(record.data))
+
+    if bucket:
+        yield bucket_timestamp, b''.join(bucket)
+
+def measure(buckets: Iterator[tuple[int, bytes]]) -> list[tuple[int, float, int]]:
+    """ Measure the cost of producing and sending every bucket.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            buckets (Iterator[tuple[int, bytes]]): The bucket timestamps and their raw MRT records.
+
+        Returns:
+            list[tuple[int, float, int]]: The timestamp, cost in seconds and size of every bucket.
+    """
+    costs = []
+    last_time = time.perf_counter()
+
+    for timestamp, data in buckets:
+        # Stand-in for the send, touching the whole batch once
+        size = len(bytes(data))
+        now = time.perf_counter()
+        costs.append((timestamp, now - last_time, size))
+        last_time = now
+
+    return costs
+
+def simulate(costs: list[tuple[int, float, int]], speed: int) -> tuple[float, float]:
+    """ Simulate paced playback at a speed on a virtual clock.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            costs (list[tuple[int, float, int]]): The timestamp, cost in seconds and size of every bucket.
+            speed (int): The playback speed.
+
+        Returns:
+            tuple[float, float]: The maximum lag behind schedule in seconds and the share of buckets late by more than a millisecond.
+    """
+    first_timestamp = costs[0][0]
+    clock = 0.0
+    max_lag = 0.0
+    late = 0
+
+    for timestamp, cost, _ in costs:
+        due = (timestamp - first_timestamp) / speed
+        clock = max(clock, due) + cost
+        lag = clock - due - cost
+
+        if lag > LATE_THRESHOLD:
+            late += 1
+            max_lag = max(max_lag, lag)
+
+    return max_lag, late / len(costs)
+
+def main():
+    """ Compare compiled and raw replay throughput and lag at several playback speeds.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        scenario_path = Path(directory)
+        prefixes = get_prefixes(100000)
+        start = datetime(2024, 1, 1)
+        mrt_files = []
+
+        for peer_index, peer_name in enumerate(PEER_NAMES):
+            for file_index in range(FILES_PER_PEER):
+                timestamp = start + timedelta(minutes=15 * file_index)
+                path = scenario_path / get_mrt_file_name(timestamp, peer_name, 'update')
+                write_mrt_file(path, iter_update_records(
+                    int(timestamp.timestamp()),
+                    900,
+                    RECORDS_PER_FILE,
+                    peer_as=64500 + peer_index,
+                    seed=peer_index * FILES_PER_PEER + file_index,
+                    prefixes=prefixes,
+                ))
+                mrt_files.append(path)
+
+        scenario = MRTScenario(
+            name='Benchmark',
+            description='',
+            no_rabbitmq_direct=False,
+            rabbitmq_grouped=INTERVAL,
+            no_mongodb_log=True,
+            no_mongodb_state=True,
+            no_mongodb_statistics=True,
+            clear_mongodb=False,
+            playback_speed=None,
+            mrt_files=[path.name for path in mrt_files],
+        )
+        result = compile_scenario(scenario_path, scenario, INTERVAL)
+        print(f'compiled {result.records} records into {result.buckets} buckets in {result.duration:.2f}s\n')
+
+        for label, buckets in [
+            ('raw', iter_raw_buckets(mrt_files, INTERVAL)),
+            ('compiled', ((bucket.timestamp, data) for bucket, data in iter_buckets(result.target))),
+        ]:
+            costs = measure(buckets)
+            duration = sum(cost for _, cost, _ in costs)
+            replayed = costs[-1][0] - costs[0][0] + INTERVAL
+
+            print(
+                f'{label:<9} {result.records / duration:>10.0f} records/s'
+                f'  {sum(size for _, _, size in costs) / duration / 1e6:>7.1f} MB/s'
+                f'  max speed {replayed / duration:>8.0f}x'
+            )
+
+            for speed in SPEEDS:
+                max_lag, late = simulate(costs, speed)
+                print(f'          speed {speed:>3}x  max lag {max_lag:>7.3f}s  late buckets {late:>6.1%}')
+
+if __name__ == '__main__':
+    main()
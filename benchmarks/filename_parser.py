@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Micro-benchmark of the per-file cost of parsing MRT file names.
+Run from the repository root with `python -m benchmarks.filename_parser`.
+"""
+from src.services.filename import parse_mrt_file_name
+from benchmarks.synthetic import iter_mrt_file_names
+from src.models.query import PEER_NAME_CHOICES
+from datetime import datetime
+import timeit
+
+def legacy_parse(name: str) -> tuple:
+    """ Parse an MRT file name the way the query service did before the compiled parser.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The MRT file name.
+
+        Returns:
+            tuple: The timestamp, vendor, peer name and BGP type.
+    """
+    timestamp = datetime.strptime(
+        '_'.join(name.split('_')[0:2]),
+        '%Y%m%d_%H%M'
+    )
+
+    return timestamp, name.split('_')[4], name.split('_')[6], name.split('_')[7].split('.')[0]
+
+def main():
+    """ Compare the per-file cost of the legacy and the compiled MRT file name parser.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    names = [name for _, _, name in iter_mrt_file_names(datetime(2024, 1, 1), 30, PEER_NAME_CHOICES)]
+
+    def compiled():
+        parse_mrt_file_name.cache_clear()
+        for name in names:
+            parse_mrt_file_name(name)
+
+    def memoized():
+        for name in names:
+            parse_mrt_file_name(name)
+
+    for label, function in [
+        ('legacy split + strptime', lambda: [legacy_parse(name) for name in names]),
+        ('compiled pattern', compiled),
+        ('compiled pattern (memoized)', memoized),
+    ]:
+        duration = min(timeit.repeat(function, number=1, repeat=5))
+        print(f'{label:<30} {duration / len(names) * 1e9:>8.0f} ns/file ({len(names)} files)')
+
+if __name__ == '__main__':
+    main()
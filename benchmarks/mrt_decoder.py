@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Throughput benchmark of the streaming MRT decoder on synthetic update and rib files.
+Run from the repository root with `python -m benchmarks.mrt_decoder`.
+"""
+from benchmarks.synthetic import iter_update_records, iter_rib_records, get_prefixes, write_mrt_file
+from src.services.bgp import decode_bgp4mp_update, decode_rib_entry, get_as_path
+from src.services.mrt import iter_chunks, iter_records
+from pathlib import Path
+import tempfile
+import time
+
+def decompress_only(path: Path) -> int:
+    """ Decompress a file without decoding records, the lower bound of any decoder.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            int: The number of chunks.
+    """
+    return sum(1 for _ in iter_chunks(path))
+
+def headers_only(path: Path) -> int:
+    """ Decode the MRT headers of a file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            int: The number of records.
+    """
+    return sum(1 for _ in iter_records(path))
+
+def full_decode(path: Path) -> int:
+    """ Decode the MRT headers, BGP messages or RIB entries and AS paths of a file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            int: The number of records.
+    """
+    count = 0
+
+    for record in iter_records(path):
+        update = decode_bgp4mp_update(record)
+        if update:
+            get_as_path(update.attributes, update.as4)
+        else:
+            entry = decode_rib_entry(record)
+            if entry:
+                for _, _, attributes in entry.entries:
+                    get_as_path(attributes)
+        count += 1
+
+    return count
+
+def main():
+    """ Measure records/s and MB/s of the decoder stages on synthetic files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        prefixes = get_prefixes(100000)
+        files = {
+            'update': Path(directory) / 'update.bz2',
+            'rib': Path(directory) / 'rib.bz2',
+        }
+        write_mrt_file(files['update'], iter_update_records(1704067200, 900, 200000, prefixes=prefixes))
+        write_mrt_file(files['rib'], iter_rib_records(1704067200, prefixes=prefixes))
+
+        for bgp_type, path in files.items():
+            compressed = path.stat().st_size
+            uncompressed = sum(len(chunk) for chunk in iter_chunks(path))
+
+            for label, function in [
+                ('decompress only', decompress_only),
+                ('headers', headers_only),
+                ('full decode', full_decode),
+            ]:
+                start_time = time.perf_counter()
+                result = function(path)
+                duration = time.perf_counter() - start_time
+
+                records = f'{result / duration:>10.0f} records/s' if function is not decompress_only else ' ' * 20
+                print(
+                    f'{bgp_type:<7} {label:<16} {records}'
+                    f'  {uncompressed / duration / 1e6:>7.1f} MB/s uncompressed'
+                    f'  {compressed / duration / 1e6:>6.1f} MB/s compressed'
+                )
+
+if __name__ == '__main__':
+    main()
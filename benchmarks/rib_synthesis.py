@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Memory and build time of the prefix trie RIB used for RIB synthesis against a plain dictionary of route objects.
+Run from the repository root with `python -m benchmarks.rib_synthesis`.
+"""
+from benchmarks.synthetic import PEER_IP, get_attributes, get_prefixes
+from src.models.mrt_record import Peer
+from src.services.rib import RIBTable
+import tracemalloc
+import random
+import time
+
+PREFIXES = 200000
+# Full tables share path attributes between many prefixes
+DISTINCT_ATTRIBUTES = 20000
+
+def measure(build) -> tuple[object, int, float]:
+    """ Build a RIB and measure the memory it retains and the build time.
+        Tracing slows down allocations, so the build is timed in a separate untraced run.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            build (Callable[[], object]): The function building the RIB.
+
+        Returns:
+            tuple[object, int, float]: The RIB, the retained bytes and the build duration.
+    """
+    start_time = time.perf_counter()
+    build()
+    duration = time.perf_counter() - start_time
+
+    tracemalloc.start()
+    rib = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    return rib, size, duration
+
+def main():
+    """ Load a synthetic full table into both RIB representations and compare them.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    generator = random.Random(0)
+    prefixes = get_prefixes(PREFIXES)
+    pool = [get_attributes(generator, 64500) for _ in range(DISTINCT_ATTRIBUTES)]
+    # Decoded attributes are fresh bytes objects, like the slices of a RIB dump
+    routes = [(prefix, bytes(bytearray(generator.choice(pool))), 1704067200) for prefix in prefixes]
+    print(f'full table {len(routes)} prefixes, {DISTINCT_ATTRIBUTES} distinct attributes\n')
+
+    def build_dictionary() -> dict:
+        return {
+            prefix: {'peer_index': 0, 'originated_time': stamp, 'attributes': attributes}
+            for prefix, attributes, stamp in routes
+        }
+
+    def build_table() -> RIBTable:
+        table = RIBTable()
+        table.add_peer(Peer(PEER_IP[1], PEER_IP, 64500))
+        tries = table.tries[0]
+        for (afi, network, length), attributes, stamp in routes:
+            tries[afi].insert(network, length, table.intern(attributes), stamp)
+        return table
+
+    _, dictionary_size, dictionary_duration = measure(build_dictionary)
+    table, table_size, table_duration = measure(build_table)
+
+    print(f'dictionary  memory {dictionary_size / 1e6:>7.1f} MB  build {dictionary_duration:>6.2f}s')
+    print(f'prefix trie memory {table_size / 1e6:>7.1f} MB  build {table_duration:>6.2f}s'
+          f'  ({table.get_trie_memory(0) / 1e6:.1f} MB tries, {table.get_attribute_memory() / 1e6:.1f} MB attributes)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Benchmark of time-to-first-result and peak memory of the list and the streaming query API.
+Run from the repository root with `python -m benchmarks.streaming_query`.
+"""
+from src.services.query import query, iter_query
+from src.services.filename import parse_mrt_file_name
+from src.models.query import QueryRequest
+from benchmarks.synthetic import generate_archive
+from datetime import datetime
+from pathlib import Path
+import tempfile
+import tracemalloc
+import time
+
+LAYOUT = '{peer}/{YYYY}/{MM}/{DD}'
+PEER_NAMES = ['amsix', 'decix', 'linx', 'nlix', 'telia', 'cogent', 'ntt', 'gtt']
+
+def measure(function) -> tuple[float, float, int, float]:
+    """ Measure time-to-first-result, total time, result count and peak memory of a query function.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            function: A function returning an iterable of query results.
+
+        Returns:
+            tuple[float, float, int, float]: The time to first result, the total time, the count and the peak memory in MB.
+    """
+    tracemalloc.start()
+    start_time = time.perf_counter()
+    first_result = None
+    count = 0
+
+    for _ in function():
+        if first_result is None:
+            first_result = time.perf_counter() - start_time
+        count += 1
+
+    total = time.perf_counter() - start_time
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return first_result or total, total, count, peak / 1e6
+
+def main():
+    """ Compare the list and the streaming query API on a synthetic archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        root = Path(directory)
+        files = generate_archive(root, datetime(2024, 1, 1), 60, PEER_NAMES)
+        print(f'generated {files} files')
+
+        request = QueryRequest(
+            start_datetime=datetime(2024, 1, 1),
+            end_datetime=datetime(2024, 3, 1),
+            vendor=['lw'],
+            peer_name=PEER_NAMES,
+            bgp_type=['update'],
+        )
+
+        for label, function in [
+            ('query (list)', lambda: query(root, request, LAYOUT).mrt_files),
+            ('iter_query (streaming)', lambda: iter_query(root, request, LAYOUT)),
+        ]:
+            parse_mrt_file_name.cache_clear()
+            first_result, total, count, peak = measure(function)
+            print(f'{label:<24} first result {first_result * 1e3:>8.1f} ms  total {total * 1e3:>8.1f} ms  {count} files  peak {peak:>6.1f} MB')
+
+if __name__ == '__main__':
+    main()
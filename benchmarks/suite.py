@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+
+Benchmark suite timing queries, append transfers and decode paths on synthetic archives,
+writing machine-readable results that can be compared between commits.
+Run from the repository root with `python -m benchmarks.suite --output results.json`
+and `python -m benchmarks.suite --compare results.json` after a change.
+"""
+from benchmarks.synthetic import generate_archive
+from benchmarks.mrt_decoder import decompress_only, headers_only, full_decode
+from src.services.snapshot import ArchiveSnapshot
+from src.services.filename import parse_mrt_file_name
+from src.services.index import build_index, get_index_path
+from src.services.transfer import transfer_files
+from src.services.merge import merge_files
+from src.services.stats import get_file_stats
+from src.services.mrt import iter_chunks
+from src.models.query import QueryRequest, PEER_NAME_CHOICES
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+from pathlib import Path
+import contextlib
+import subprocess
+import platform
+import tempfile
+import argparse
+import shutil
+import json
+import time
+import sys
+
+RESULTS_VERSION = 1
+LAYOUT = '{peer}/{YYYY}/{MM}/{DD}'
+START = datetime(2024, 1, 1)
+WINDOWS = {
+    '1h': timedelta(hours=1),
+    '1d': timedelta(days=1),
+    '7d': timedelta(days=7),
+    '30d': timedelta(days=30),
+    '365d': timedelta(days=365),
+}
+
+def measure(function: Callable[[], object], repeat: int, setup: Optional[Callable[[], None]] = None) -> tuple[float, object]:
+    """ Run a function several times and keep the fastest run, which is the least disturbed by other load.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            function (Callable[[], object]): The function to measure.
+            repeat (int): The number of runs.
+            setup (Optional[Callable[[], None]]): A function run untimed before every run.
+
+        Returns:
+            tuple[float, object]: The duration of the fastest run in seconds and the result of the last run.
+    """
+    best = float('inf')
+    result = None
+
+    for _ in range(repeat):
+        if setup:
+            setup()
+
+        start_time = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start_time)
+
+    return best, result
+
+def add_result(results: dict, name: str, value: float, unit: str, better: str):
+    """ Add a metric to the results and print it.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            results (dict): The results by metric name.
+            name (str): The metric name.
+            value (float): The measured value.
+            unit (str): The unit of the value.
+            better (str): Whether a lower or a higher value is better.
+    """
+    results[name] = {
+        'value': value,
+        'unit': unit,
+        'better': better,
+    }
+
+    print(f'{name:<36} {value:>14.4f} {unit}', file=sys.stderr)
+
+def bench_query(root: Path, peer_names: list[str], days: int, repeat: int, results: dict):
+    """ Time cold queries of growing windows with a live scan, a layout-pruned scan and the archive index.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            root (Path): The root of the synthetic archive.
+            peer_names (list[str]): The peer names of the archive.
+            days (int): The number of days of the archive.
+            repeat (int): The number of runs per measurement.
+            results (dict): The results by metric name.
+    """
+    index_path = get_index_path(root)
+    if index_path.exists():
+        shutil.rmtree(index_path.parent)
+
+    for label, window in WINDOWS.items():
+        if window > timedelta(days=days):
+            continue
+
+        # Place the window in the middle of the archive, so pruning has something to skip on both sides
+        start_datetime = START + (timedelta(days=days) - window) / 2
+        request = QueryRequest(
+            start_datetime=start_datetime,
+            end_datetime=start_datetime + window,
+            vendor=['lw'],
+            peer_name=peer_names[:1],
+            bgp_type=['update'],
+        )
+
+        for mode, layout in [('scan', None), ('layout', LAYOUT)]:
+            duration, response = measure(
+                function=lambda: ArchiveSnapshot(root, layout).query(request),
+                repeat=repeat,
+                setup=parse_mrt_file_name.cache_clear,
+            )
+            add_result(results, f'query.{mode}.{label}', duration, 's', 'lower')
+
+    duration, _ = measure(
+        function=lambda: build_index(root, rebuild=True),
+        repeat=1,
+    )
+    add_result(results, 'index.build', duration, 's', 'lower')
+
+    for label, window in WINDOWS.items():
+        if window > timedelta(days=days):
+            continue
+
+        start_datetime = START + (timedelta(days=days) - window) / 2
+        request = QueryRequest(
+            start_datetime=start_datetime,
+            end_datetime=start_datetime + window,
+            vendor=['lw'],
+            peer_name=peer_names[:1],
+            bgp_type=['update'],
+        )
+
+        duration, _ = measure(
+            function=lambda: ArchiveSnapshot(root).query(request),
+            repeat=repeat,
+        )
+        add_result(results, f'query.index.{label}', duration, 's', 'lower')
+
+    shutil.rmtree(index_path.parent)
+
+def bench_content(root: Path, repeat: int, jobs: int, results: dict):
+    """ Time the append transfer, the decode paths, the scenario statistics and the merge on MRT files with records.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            root (Path): The root of the synthetic archive with records.
+            repeat (int): The number of runs per measurement.
+            jobs (int): The number of concurrent transfers and worker processes.
+            results (dict): The results by metric name.
+    """
+    update_files = sorted(root.rglob('*_update.bz2'))
+    rib_files = sorted(root.rglob('*_rib.bz2'))
+    compressed = sum(path.stat().st_size for path in update_files)
+
+    with tempfile.TemporaryDirectory() as directory:
+        target = Path(directory) / 'scenario'
+
+        duration, _ = measure(
+            function=lambda: transfer_files(update_files, target, 'copy', jobs, show_progress=False),
+            repeat=repeat,
+            setup=lambda: (shutil.rmtree(target, ignore_errors=True), target.mkdir()),
+        )
+        add_result(results, 'append.copy', compressed / duration / 1e6, 'MB/s', 'higher')
+
+        duration, merge_result = measure(
+            function=lambda: merge_files(update_files, Path(directory) / 'merged.bz2', jobs=jobs),
+            repeat=repeat,
+        )
+        add_result(results, 'merge', merge_result.records / duration, 'records/s', 'higher')
+
+    uncompressed = sum(len(chunk) for path in update_files for chunk in iter_chunks(path))
+
+    duration, _ = measure(
+        function=lambda: [decompress_only(path) for path in update_files],
+        repeat=repeat,
+    )
+    add_result(results, 'decode.update.decompress', uncompressed / duration / 1e6, 'MB/s', 'higher')
+
+    for bgp_type, paths in [('update', update_files), ('rib', rib_files)]:
+        if not paths:
+            continue
+
+        duration, records = measure(
+            function=lambda: sum(headers_only(path) for path in paths),
+            repeat=repeat,
+        )
+        add_result(results, f'decode.{bgp_type}.headers', records / duration, 'records/s', 'higher')
+
+        duration, records = measure(
+            function=lambda: sum(full_decode(path) for path in paths),
+            repeat=repeat,
+        )
+        add_result(results, f'decode.{bgp_type}.full', records / duration, 'records/s', 'higher')
+
+    duration, records = measure(
+        function=lambda: sum(get_file_stats(path).records for path in update_files),
+        repeat=repeat,
+    )
+    add_result(results, 'stats', records / duration, 'records/s', 'higher')
+
+def get_commit() -> Optional[str]:
+    """ Get the commit of the working tree the suite runs on.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Returns:
+            Optional[str]: The abbreviated commit hash or None outside of a git repository.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """ Compare results with a baseline and print the relative change of every metric.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            results (dict): The results by metric name.
+            baseline (dict): The baseline results by metric name.
+            threshold (float): The relative slowdown above which a metric counts as regressed.
+
+        Returns:
+            list[str]: The names of the regressed metrics.
+    """
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        previous = baseline[name]['value']
+        if not previous:
+            continue
+
+        # Positive slowdowns are worse, regardless of whether lower or higher values are better
+        if result['better'] == 'lower':
+            slowdown = result['value'] / previous - 1
+        else:
+            slowdown = previous / max(result['value'], 1e-12) - 1
+
+        regressed = slowdown > threshold
+        if regressed:
+            regressions.append(name)
+
+        print(
+            f'{name:<36} {previous:>14.4f} -> {result["value"]:>14.4f} {result["unit"]:<10}'
+            f' {-slowdown:>+8.1%}{"  REGRESSION" if regressed else ""}',
+            file=sys.stderr,
+        )
+
+    return regressions
+
+def main(arguments: Optional[list[str]] = None) -> int:
+    """ Generate the synthetic archives, run all benchmarks and write or compare the results.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            arguments (Optional[list[str]]): The command line arguments, sys.argv if not given.
+
+        Returns:
+            int: The exit code, 1 if a metric regressed beyond the threshold.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.suite',
+        description='Benchmark suite of mrtawk on synthetic archives.',
+    )
+    parser.add_argument('--years', type=float, default=1, help='years of the file name archive (default: 1)')
+    parser.add_argument('--peers', type=int, default=2, help='peers of both archives (default: 2)')
+    parser.add_argument('--content-days', type=int, default=1, help='days of the archive with records, 0 skips it (default: 1)')
+    parser.add_argument('--records', type=int, default=1000, help='update records per file of the archive with records (default: 1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per measurement, the fastest is kept (default: 3)')
+    parser.add_argument('--jobs', type=int, default=4, help='concurrent transfers and worker processes (default: 4)')
+    parser.add_argument('--archive', type=Path, default=None, help='directory the archives are generated in and reused from, a temporary directory if not given')
+    parser.add_argument('--output', type=Path, default=None, help='file the JSON results are written to, stdout if not given')
+    parser.add_argument('--compare', type=Path, default=None, help='JSON results of a previous run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative slowdown counted as regression (default: 0.1)')
+    arguments = parser.parse_args(arguments)
+
+    peer_names = PEER_NAME_CHOICES[:arguments.peers]
+    days = max(round(arguments.years * 365), 1)
+    config = {
+        'years': arguments.years,
+        'peers': arguments.peers,
+        'content_days': arguments.content_days,
+        'records': arguments.records,
+        'repeat': arguments.repeat,
+        'jobs': arguments.jobs,
+    }
+    results = {}
+
+    # Progress output of the measured services goes to stderr, so the results can be piped
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(sys.stderr):
+        archive_path = arguments.archive or Path(directory)
+
+        # Generated archives are reused as long as they were generated with the same parameters
+        for name, archive_days, records_per_file in [
+            ('names', days, 0),
+            ('content', arguments.content_days, arguments.records),
+        ]:
+            root = archive_path / f'{name}-{archive_days}d-{arguments.peers}p-{records_per_file}r'
+            if not archive_days or root.exists():
+                continue
+
+            start_time = time.perf_counter()
+            files = generate_archive(root.with_suffix('.tmp'), START, archive_days, peer_names, records_per_file)
+            root.with_suffix('.tmp').rename(root)
+            print(f'generated {files} files in {root} in {time.perf_counter() - start_time:.1f}s', file=sys.stderr)
+
+        bench_query(archive_path / f'names-{days}d-{arguments.peers}p-0r', peer_names, days, arguments.repeat, results)
+
+        if arguments.content_days:
+            bench_content(archive_path / f'content-{arguments.content_days}d-{arguments.peers}p-{arguments.records}r', arguments.repeat, arguments.jobs, results)
+
+    output = {
+        'version': RESULTS_VERSION,
+        'commit': get_commit(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': config,
+        'results': results,
+    }
+
+    if arguments.output:
+        arguments.output.write_text(json.dumps(output, indent=4))
+    elif not arguments.compare:
+        print(json.dumps(output, indent=4))
+
+    if arguments.compare:
+        baseline = json.loads(arguments.compare.read_text())
+
+        if baseline.get('config') != config:
+            print(f'warning: baseline was measured with {baseline.get("config")}', file=sys.stderr)
+
+        regressions = compare(results, baseline['results'], arguments.threshold)
+        if regressions:
+            print(f'{len(regressions)} metrics regressed by more than {arguments.threshold:.0%}: {", ".join(regressions)}', file=sys.stderr)
+            return 1
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
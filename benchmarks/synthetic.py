@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.bgp import AFI_IPV4, AFI_IPV6, ORIGIN, NEXT_HOP, encode_attribute, encode_as_path, encode_bgp4mp_update, encode_peer_index_table, encode_rib_entry
+from src.services.filename import to_epoch
+from src.models.mrt_record import Peer, Prefix
+from src.services.mrt import MRTWriter
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+from pathlib import Path
+import calendar
+import random
+import bz2
+
+PEER_IP = (AFI_IPV4, 0xC0000201) # 192.0.2.1
+COLLECTOR_IP = (AFI_IPV4, 0xC0000202) # 192.0.2.2
+
+def get_mrt_file_name(timestamp: datetime, peer_name: str, bgp_type: str) -> str:
+    """ Get an MRT file name in the naming scheme of the LW archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (datetime): The timestamp of the MRT file.
+            peer_name (str): The peer name.
+            bgp_type (str): The BGP type.
+
+        Returns:
+            str: The MRT file name.
+    """
+    return f'{timestamp:%Y%m%d_%H%M}_{calendar.timegm(timestamp.timetuple())}_bgp_lw_ixp_{peer_name}_{bgp_type}.bz2'
+
+def iter_mrt_file_names(start: datetime, days: int, peer_names: list[str]) -> Iterator[tuple[datetime, str, str]]:
+    """ Iterate the MRT files of a synthetic archive, update files every 15 minutes and rib files every 8 hours.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            start (datetime): The first timestamp of the archive.
+            days (int): The number of days of the archive.
+            peer_names (list[str]): The peer names of the archive.
+
+        Returns:
+            Iterator[tuple[datetime, str, str]]: The timestamp, peer name and file name of each MRT file.
+    """
+    timestamp = start
+
+    while timestamp < start + timedelta(days=days):
+        for peer_name in peer_names:
+            yield timestamp, peer_name, get_mrt_file_name(timestamp, peer_name, 'update')
+
+            if timestamp.hour % 8 == 0 and timestamp.minute == 0:
+                yield timestamp, peer_name, get_mrt_file_name(timestamp, peer_name, 'rib')
+
+        timestamp += timedelta(minutes=15)
+
+def get_prefixes(count: int, seed: int = 0) -> list[Prefix]:
+    """ Get a deterministic pool of IPv4 and IPv6 prefixes, roughly one in ten is IPv6.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            count (int): The number of prefixes.
+            seed (int): The random seed.
+
+        Returns:
+            list[Prefix]: The prefixes.
+    """
+    generator = random.Random(seed)
+    prefixes = set()
+
+    while len(prefixes) < count:
+        if generator.random() < 0.1:
+            length = generator.choice([32, 40, 44, 48])
+            network = (0x2000 << 112 | generator.getrandbits(112)) >> (128 - length) << (128 - length)
+            prefixes.add((AFI_IPV6, network, length))
+        else:
+            length = generator.choice([16, 20, 22, 23, 24, 24, 24])
+            network = generator.randrange(1 << 24, 223 << 24) >> (32 - length) << (32 - length)
+            prefixes.add((AFI_IPV4, network, length))
+
+    return sorted(prefixes)
+
+def get_attributes(generator: random.Random, peer_as: int) -> bytes:
+    """ Get random path attributes with an AS path starting at the peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            generator (random.Random): The random generator.
+            peer_as (int): The AS number of the peer.
+
+        Returns:
+            bytes: The encoded path attributes.
+    """
+    as_path = [peer_as] + [generator.randrange(1, 65000) for _ in range(generator.randrange(1, 7))]
+
+    return (
+        encode_attribute(ORIGIN, b'\x00')
+        + encode_as_path(as_path)
+        + encode_attribute(NEXT_HOP, PEER_IP[1].to_bytes(4, 'big'))
+    )
+
+def iter_update_records(start: int, duration: int, count: int, peer_as: int = 64500, seed: int = 0, prefixes: Optional[list[Prefix]] = None) -> Iterator[bytes]:
+    """ Iterate synthetic BGP4MP_ET update records in timestamp order.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            start (int): The epoch seconds of the first record.
+            duration (int): The seconds covered by the records.
+            count (int): The number of records.
+            peer_as (int): The AS number of the peer.
+            seed (int): The random seed.
+            prefixes (Optional[list[Prefix]]): The prefix pool to announce and withdraw.
+
+        Returns:
+            Iterator[bytes]: The encoded records.
+    """
+    generator = random.Random(seed)
+    prefixes = prefixes or get_prefixes(10000, seed)
+    offsets = sorted(generator.randrange(duration * 1000000) for _ in range(count))
+
+    for offset in offsets:
+        selected = generator.sample(prefixes, generator.randrange(1, 5))
+
+        if generator.random() < 0.2:
+            withdrawn, announced, attributes = selected, [], b''
+        else:
+            withdrawn, announced, attributes = [], selected, get_attributes(generator, peer_as)
+
+        yield encode_bgp4mp_update(
+            timestamp=start + offset // 1000000,
+            peer_as=peer_as,
+            local_as=64496,
+            peer_ip=PEER_IP,
+            local_ip=COLLECTOR_IP,
+            withdrawn=withdrawn,
+            announced=announced,
+            attributes=attributes,
+            microsecond=offset % 1000000,
+        )
+
+def iter_rib_records(timestamp: int, peer_as: int = 64500, seed: int = 0, prefixes: Optional[list[Prefix]] = None) -> Iterator[bytes]:
+    """ Iterate the records of a synthetic TABLE_DUMP_V2 RIB of a single peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds of the RIB.
+            peer_as (int): The AS number of the peer.
+            seed (int): The random seed.
+            prefixes (Optional[list[Prefix]]): The prefixes of the RIB.
+
+        Returns:
+            Iterator[bytes]: The encoded records.
+    """
+    generator = random.Random(seed)
+    prefixes = prefixes or get_prefixes(10000, seed)
+
+    yield encode_peer_index_table(timestamp, COLLECTOR_IP[1], [Peer(PEER_IP[1], PEER_IP, peer_as)])
+
+    for sequence, prefix in enumerate(prefixes):
+        yield encode_rib_entry(timestamp, sequence, prefix, [(0, timestamp - 3600, get_attributes(generator, peer_as))])
+
+def write_mrt_file(path: Path, records: Iterator[bytes]) -> int:
+    """ Write encoded records to a compressed MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file, the codec is derived from the suffix.
+            records (Iterator[bytes]): The encoded records.
+
+        Returns:
+            int: The number of written records.
+    """
+    with MRTWriter(path) as writer:
+        for record in records:
+            writer.write(record)
+
+    return writer.records
+
+def generate_archive(root: Path, start: datetime, days: int, peer_names: list[str], records_per_file: int = 0) -> int:
+    """ Generate a synthetic MRT archive with the {peer}/{YYYY}/{MM}/{DD} layout.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            root (Path): The root directory of the archive.
+            start (datetime): The first timestamp of the archive.
+            days (int): The number of days of the archive.
+            peer_names (list[str]): The peer names of the archive.
+            records_per_file (int): The number of synthetic update records per file, 0 writes empty MRT files.
+
+        Returns:
+            int: The number of generated MRT files.
+    """
+    content = bz2.compress(b'')
+    prefixes = get_prefixes(10000)
+    count = 0
+
+    for timestamp, peer_name, name in iter_mrt_file_names(start, days, peer_names):
+        directory = root / peer_name / f'{timestamp:%Y}' / f'{timestamp:%m}' / f'{timestamp:%d}'
+        directory.mkdir(
+            parents=True,
+            exist_ok=True,
+        )
+        peer_as = 64500 + peer_names.index(peer_name)
+
+        if not records_per_file:
+            (directory / name).write_bytes(content)
+        elif name.endswith('_rib.bz2'):
+            write_mrt_file(directory / name, iter_rib_records(to_epoch(timestamp), peer_as, count, prefixes))
+        else:
+            write_mrt_file(directory / name, iter_update_records(to_epoch(timestamp), 900, records_per_file, peer_as, count, prefixes))
+
+        count += 1
+
+    return count
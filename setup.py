@@ -24,6 +24,17 @@ setup(
         'click',
         'rich',
     ],
+    extras_require={
+        'yaml': [
+            'pyyaml',
+        ],
+        'zstd': [
+            'zstandard',
+        ],
+        'numpy': [
+            'numpy',
+        ],
+    },
     entry_points={
         'console_scripts': [
             'mrtawk=src.main:cli',
@@ -9,14 +9,143 @@ It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
 Author Benedikt SCHWERING <mail@bschwer.ing>
 """
 from src.services.query import query as query_service
-from src.models.mrt_scenario import MRTScenario
+from src.services.snapshot import ArchiveSnapshot
+from src.services.transfer import transfer_files
+from src.services.store import store_files
+from src.services.rewrite import UPDATE_FILE_INTERVAL, get_rewrite_name, get_rewrite_tasks, rewrite_files
+from src.services.filename import parse_mrt_file_name, to_epoch
+from src.services.merge import get_merged_file_name, merge_files
+from src.services.seek import build_seek_indexes
+from src.services.rib import RIB_LOOKBACK, get_filter_seed_files, get_rib_synthesis_tasks, synthesize_ribs
+from src.commands.seek_index import print_seek_index_result
+from src.commands.verify import get_verify_cache_path, print_verify_result
+from src.services.verify import verify_files
+from src.services.stats import update_stats
+from src.commands.stats import print_stats_summary
+from src.commands.query import print_root_results
+from src.services.scenario import load_scenario, save_scenario
 from src.models.query import QueryRequest
+from src.models.filter import RecordFilter
+from src.models.transfer import TransferResult
+from datetime import timedelta
+from typing import Optional
 from pathlib import Path
 from rich import print
 import click
 
+def print_filter_result(input_records: int, output_records: int, input_bytes: int, output_bytes: int):
+    """ Print how much a record filter reduced the scenario.
+        The replay time of the player grows with the number of records, so the record reduction estimates the replay time saved.
 
-def append(mrt_input_path: Path, scenario_output_path: Path, request: QueryRequest):
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            input_records (int): The number of records read.
+            output_records (int): The number of records kept.
+            input_bytes (int): The size of the read files on disk.
+            output_bytes (int): The size of the written files on disk.
+    """
+    print(
+        f'[yellow]\[finish][/] Filter results\n',
+        f'   kept records [red]{output_records}[/] of [red]{input_records}[/]\n',
+        f'   size reduced by [cyan]{1 - output_bytes / max(input_bytes, 1):.1%}[/]'
+        f' ([cyan]{input_bytes / 1e6:.1f} MB[/] to [cyan]{output_bytes / 1e6:.1f} MB[/])\n',
+        f'   replayed records reduced by [cyan]{1 - output_records / max(input_records, 1):.1%}[/]\n',
+    )
+
+def transfer_sources(sources: list[Path], scenario_output_path: Path, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None) -> TransferResult:
+    """ Transfer MRT files into the scenario directory, through the shared store if given.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            sources (list[Path]): The source files.
+            scenario_output_path (Path): The path to the scenario output directory.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+
+        Returns:
+            TransferResult: The transfer result.
+    """
+    if store_path:
+        return store_files(
+            store_path=store_path,
+            sources=sources,
+            target_directory=scenario_output_path,
+            jobs=jobs,
+        )
+
+    return transfer_files(
+        sources=sources,
+        target_directory=scenario_output_path,
+        strategy=strategy,
+        jobs=jobs,
+        checksum=checksum,
+    )
+
+def transfer_roots(sources: list[Path], roots: list[Path], scenario_output_path: Path, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None) -> TransferResult:
+    """ Transfer MRT files from several archive roots one root after another and print the timing of each root.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            sources (list[Path]): The source files.
+            roots (list[Path]): The archive roots ordered by priority.
+            scenario_output_path (Path): The path to the scenario output directory.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+
+        Returns:
+            TransferResult: The combined transfer result.
+    """
+    result = TransferResult(
+        transferred_files=[],
+        skipped_files=[],
+        failed_files=[],
+        transferred_bytes=0,
+        duration=0,
+    )
+    pending = sources
+
+    print(f'[yellow]\[roots][/] Transfer per archive root')
+    for root in roots:
+        root_sources = [source for source in pending if source.is_relative_to(root)]
+        pending = [source for source in pending if not source.is_relative_to(root)]
+
+        if not root_sources:
+            continue
+
+        root_result = transfer_sources(
+            sources=root_sources,
+            scenario_output_path=scenario_output_path,
+            strategy=strategy,
+            jobs=jobs,
+            checksum=checksum,
+            store_path=store_path,
+        )
+
+        print(
+            f'   [purple]{root}[/] transferred files [red]{len(root_result.transferred_files)}[/]'
+            f' in [cyan]{root_result.duration:.3f}s[/]'
+            f' throughput [cyan]{root_result.transferred_bytes / max(root_result.duration, 1e-9) / 1e6:.1f} MB/s[/]'
+        )
+
+        result.transferred_files.extend(root_result.transferred_files)
+        result.skipped_files.extend(root_result.skipped_files)
+        result.failed_files.extend(root_result.failed_files)
+        result.transferred_bytes += root_result.transferred_bytes
+        result.duration += root_result.duration
+
+    return result
+
+def append(mrt_input_path: Path, scenario_output_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None, trim: bool = False, merge: bool = False, seek_index: bool = False, codec: Optional[str] = None, synthesize_rib: bool = False, record_filter: Optional[RecordFilter] = None, verify: bool = False, stats: bool = False):
     """ Append MRT data to an existing scenario.
 
         Author:
@@ -25,14 +154,29 @@ def append(mrt_input_path: Path, scenario_output_path: Path, request: QueryReque
         Params:
             mrt_input_path (Path): The path to the MRT input directory.
             scenario_output_path (Path): The path to the scenario output directory.
+            request (QueryRequest): The query request.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+            trim (bool): Rewrite the update files at the window boundaries to contain only records within the window.
+            merge (bool): Merge the update files of all peers into a single time-ordered MRT file.
+            seek_index (bool): Build the seek indexes of the MRT files of the scenario.
+            codec (Optional[str]): The codec MRT files are transcoded to, files are kept as-is if not given.
+            synthesize_rib (bool): Synthesize the RIB of each peer at the window start from the nearest earlier RIB and the updates in between.
+            record_filter (Optional[RecordFilter]): Reduce the MRT files to the records matching the filter.
+            verify (bool): Verify the MRT files before appending them and skip corrupt files.
+            stats (bool): Compute the statistics of the new scenario files, collected while rewriting or merging if the records are decoded anyway.
     """
     # Check if the scenario file exists
     if not (scenario_output_path / 'scenario.json').exists():
         print(f'[red]\[error][/] Scenario file does not exist')
         return
 
-    scenario = MRTScenario.model_validate_json(
-        json_data=(scenario_output_path / 'scenario.json').read_text(),
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
     )
 
     print(
@@ -44,17 +188,48 @@ def append(mrt_input_path: Path, scenario_output_path: Path, request: QueryReque
         f'   bgp types [blue]{request.bgp_type}[/]\n',
     )
 
+    query_request = request
+
+    # Also select the update file that started before the window but covers its start
+    if trim:
+        query_request = request.model_copy(
+            update={
+                'start_datetime': request.start_datetime - UPDATE_FILE_INTERVAL + timedelta(seconds=1),
+            },
+        )
+
     result = query_service(
         mrt_input_path=mrt_input_path,
-        request=request,
+        request=query_request,
+        layout=layout,
+        snapshot=snapshot,
     )
 
     print(
         f'[yellow]\[finish][/] Query results\n',
         f'   rib file [red]{not not result.rib_file}[/]\n',
         f'   mrt files [red]{len(result.mrt_files)}[/]\n',
+        f'   scan time [cyan]{result.scan_duration:.3f}s[/]\n',
+        f'   filter time [cyan]{result.filter_duration:.3f}s[/]\n',
     )
 
+    print_root_results(result)
+
+    if verify and result.mrt_files:
+        verify_result = verify_files(
+            paths=result.mrt_files,
+            cache_path=get_verify_cache_path(mrt_input_path),
+            jobs=jobs,
+        )
+
+        print_verify_result(verify_result)
+
+        if verify_result.bad_files:
+            bad_files = {bad_file.path for bad_file in verify_result.bad_files}
+            result.mrt_files = [mrt_file for mrt_file in result.mrt_files if mrt_file not in bad_files]
+
+            print(f'[red]\[warning][/] Skipping [red]{len(bad_files)}[/] corrupt MRT files')
+
     if len(result.mrt_files) > 0 and click.confirm(
             text='Print MRT files?',
             default=False,
@@ -64,23 +239,210 @@ def append(mrt_input_path: Path, scenario_output_path: Path, request: QueryReque
             print(f'   [purple]{mrt_file}[/]')
 
     if len(result.mrt_files) > 0 and click.confirm(
-            text='Copy and append MRT files?',
+            text='Merge and append MRT files?' if merge else 'Copy and append MRT files?',
             default=True,
     ):
-        for mrt_file in result.mrt_files:
-            (scenario_output_path / mrt_file.name).write_bytes(
-                data=mrt_file.read_bytes(),
+        # Statistics of the files whose records are decoded while they are written
+        collected = {}
+        seed_files = None
+
+        # AS path filters keep withdrawals of prefixes announced with a matching path, which may have been announced before the window
+        if record_filter and (record_filter.origin_asns or record_filter.as_path_contains):
+            seed_files = get_filter_seed_files(
+                mrt_input_path=mrt_input_path,
+                request=request,
+                mrt_files=result.mrt_files,
+                layout=layout,
+                snapshot=snapshot,
+            )
+
+            for peer_name in set(request.peer_name) - set(seed_files):
+                print(f'[red]\[warning][/] No RIB file of peer [blue]{peer_name}[/] within {RIB_LOOKBACK} before the window start, withdrawals of earlier announcements are dropped')
+
+        if merge:
+            merge_result = merge_files(
+                mrt_files=result.mrt_files,
+                target=scenario_output_path / get_rewrite_name(
+                    name=get_merged_file_name(
+                        mrt_files=result.mrt_files,
+                        start=to_epoch(request.start_datetime),
+                    ),
+                    codec=codec,
+                    record_filter=record_filter,
+                ),
+                start=to_epoch(request.start_datetime) if trim else None,
+                end=to_epoch(request.end_datetime) if trim else None,
+                jobs=jobs,
+                record_filter=record_filter,
+                stats=stats,
+                seed_files=seed_files,
+            )
+
+            print(
+                f'[yellow]\[finish][/] Merge results\n',
+                f'   merged files [red]{merge_result.input_files}[/] in [red]{merge_result.input_streams}[/] streams\n',
+                f'   merged records [red]{merge_result.records}[/] of [red]{merge_result.input_records}[/]\n',
+                f'   failed files [red]{len(merge_result.failed_files)}[/]\n',
+                f'   merged file [purple]{merge_result.target.name}[/]\n',
+                f'   throughput [cyan]{merge_result.input_bytes / max(merge_result.duration, 1e-9) / 1e6:.1f} MB/s[/]\n',
+            )
+
+            if record_filter:
+                print_filter_result(
+                    input_records=merge_result.input_records,
+                    output_records=merge_result.records,
+                    input_bytes=merge_result.input_bytes,
+                    output_bytes=merge_result.output_bytes,
+                )
+
+            if merge_result.records:
+                scenario.mrt_files.append(merge_result.target.name)
+            else:
+                print(f'[red]\[warning][/] No records left to merge, the merged file is not written')
+
+            if merge_result.stats:
+                collected[merge_result.target.name] = merge_result.stats
+        else:
+            sources, rewrite_tasks = get_rewrite_tasks(
+                mrt_files=result.mrt_files,
+                mrt_file_timestamps=[parse_mrt_file_name(mrt_file.name).timestamp for mrt_file in result.mrt_files],
+                target_directory=scenario_output_path,
+                window=(to_epoch(request.start_datetime), to_epoch(request.end_datetime)) if trim else None,
+                codec=codec,
+                record_filter=record_filter,
+                stats=stats,
+                seed_files=seed_files,
+            )
+
+            if not sources:
+                transfer_result = None
+            elif len(result.roots) > 1:
+                transfer_result = transfer_roots(
+                    sources=sources,
+                    roots=[root.mrt_input_path for root in result.roots],
+                    scenario_output_path=scenario_output_path,
+                    strategy=strategy,
+                    jobs=jobs,
+                    checksum=checksum,
+                    store_path=store_path,
+                )
+            else:
+                transfer_result = transfer_sources(
+                    sources=sources,
+                    scenario_output_path=scenario_output_path,
+                    strategy=strategy,
+                    jobs=jobs,
+                    checksum=checksum,
+                    store_path=store_path,
+                )
+
+            if transfer_result:
+                print(
+                    f'[yellow]\[finish][/] Transfer results\n',
+                    f'   transferred files [red]{len(transfer_result.transferred_files)}[/]\n',
+                    f'   skipped files [red]{len(transfer_result.skipped_files)}[/]\n',
+                    f'   failed files [red]{len(transfer_result.failed_files)}[/]\n',
+                    f'   throughput [cyan]{transfer_result.transferred_bytes / max(transfer_result.duration, 1e-9) / 1e6:.1f} MB/s[/]\n',
+                )
+
+                scenario.mrt_files.extend(transfer_result.transferred_files)
+                scenario.mrt_files.extend(transfer_result.skipped_files)
+
+            if rewrite_tasks:
+                rewrite_results = rewrite_files(
+                    tasks=rewrite_tasks,
+                    jobs=jobs,
+                )
+                rewritten = [rewrite_result for rewrite_result in rewrite_results if not rewrite_result.skipped and not rewrite_result.failed]
+
+                print(
+                    f'[yellow]\[finish][/] Rewrite results\n',
+                    f'   rewritten files [red]{len(rewritten)}[/]\n',
+                    f'   skipped files [red]{sum(rewrite_result.skipped for rewrite_result in rewrite_results)}[/]\n',
+                    f'   failed files [red]{sum(rewrite_result.failed for rewrite_result in rewrite_results)}[/]\n',
+                    f'   empty files [red]{sum(not rewrite_result.output_records for rewrite_result in rewritten)}[/]\n',
+                    f'   kept records [red]{sum(rewrite_result.output_records for rewrite_result in rewritten)}[/]'
+                    f' of [red]{sum(rewrite_result.input_records for rewrite_result in rewritten)}[/]\n',
+                    f'   size [cyan]{sum(rewrite_result.input_bytes for rewrite_result in rewritten) / 1e6:.1f} MB[/]'
+                    f' to [cyan]{sum(rewrite_result.output_bytes for rewrite_result in rewritten) / 1e6:.1f} MB[/]\n',
+                )
+
+                if record_filter and rewritten:
+                    print_filter_result(
+                        input_records=sum(rewrite_result.input_records for rewrite_result in rewritten),
+                        output_records=sum(rewrite_result.output_records for rewrite_result in rewritten),
+                        input_bytes=sum(rewrite_result.input_bytes for rewrite_result in rewritten),
+                        output_bytes=sum(rewrite_result.output_bytes for rewrite_result in rewritten),
+                    )
+
+                scenario.mrt_files.extend(
+                    rewrite_result.target.name
+                    for rewrite_result in rewrite_results
+                    if rewrite_result.output_records or rewrite_result.skipped
+                )
+                collected.update(
+                    (rewrite_result.target.name, rewrite_result.stats)
+                    for rewrite_result in rewrite_results
+                    if rewrite_result.stats
+                )
+
+        if synthesize_rib:
+            rib_tasks, missing_peers = get_rib_synthesis_tasks(
+                mrt_input_path=mrt_input_path,
+                request=request,
+                target_directory=scenario_output_path,
+                layout=layout,
+                snapshot=snapshot,
+                codec=codec,
             )
-            scenario.mrt_files.append(mrt_file.name)
 
-        # Remove duplicates and sort mrt files
-        scenario.mrt_files = list(set(scenario.mrt_files))
-        scenario.mrt_files.sort()
+            for peer_name in missing_peers:
+                print(f'[red]\[warning][/] No RIB file of peer [blue]{peer_name}[/] within {RIB_LOOKBACK} before the window start')
 
-        (scenario_output_path / 'scenario.json').write_text(
-            data=scenario.model_dump_json(
-                indent=4,
-            ),
+            rib_results = synthesize_ribs(
+                tasks=rib_tasks,
+                jobs=jobs,
+            )
+
+            if any(rib_result.failed for rib_result in rib_results):
+                print(f'[red]\[warning][/] Failed to synthesize [red]{sum(rib_result.failed for rib_result in rib_results)}[/] of [red]{len(rib_results)}[/] RIBs')
+
+            for rib_result in rib_results:
+                if rib_result.failed:
+                    continue
+
+                print(
+                    f'[yellow]\[finish][/] RIB synthesis results of [blue]{rib_result.peer_name}[/]\n',
+                    f'   rib file [purple]{rib_result.rib_file.name}[/]\n',
+                    f'   applied updates [red]{rib_result.updates}[/] from [red]{rib_result.update_files}[/] files\n',
+                    f'   prefixes [red]{rib_result.prefixes}[/] of [red]{rib_result.peers}[/] peers with [red]{rib_result.attributes}[/] distinct attributes\n',
+                    f'   largest peer [red]{rib_result.largest_peer_prefixes}[/] prefixes in [cyan]{rib_result.largest_peer_bytes / 1e6:.1f} MB[/]\n',
+                    f'   memory [cyan]{rib_result.trie_bytes / 1e6:.1f} MB[/] tries, [cyan]{rib_result.attribute_bytes / 1e6:.1f} MB[/] attributes\n',
+                    f'   synthetic rib [purple]{rib_result.target.name}[/] in [cyan]{rib_result.duration:.3f}s[/]\n',
+                )
+
+                scenario.rib_files.append(rib_result.target.name)
+
+        if stats:
+            print_stats_summary(scenario, *update_stats(
+                scenario_output_path=scenario_output_path,
+                scenario=scenario,
+                jobs=jobs,
+                collected=collected,
+            ))
+
+        save_scenario(
+            scenario_output_path=scenario_output_path,
+            scenario=scenario,
         )
 
         print(f'[yellow]\[info][/] Scenario file updated')
+
+        if seek_index:
+            print_seek_index_result(build_seek_indexes(
+                paths=[scenario_output_path / mrt_file for mrt_file in scenario.mrt_files],
+                jobs=jobs,
+            ))
+
+        if scenario.compiled_file:
+            print(f'[red]\[warning][/] Compiled file is outdated, run compile again')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.build import load_manifest, build_scenarios
+from src.services.snapshot import ArchiveSnapshot
+from pydantic import ValidationError
+from rich.table import Table
+from typing import Optional
+from pathlib import Path
+from rich import print
+import time
+
+def build(manifest_path: Path, scenario_output_path: Path, snapshot: ArchiveSnapshot, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None):
+    """ Build all scenarios of a manifest without interaction.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            manifest_path (Path): The path to the YAML or JSON manifest.
+            scenario_output_path (Path): The directory scenario paths are relative to.
+            snapshot (ArchiveSnapshot): The archive snapshot shared by chained commands.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers over all scenarios.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenarios.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+    """
+    try:
+        manifest = load_manifest(
+            manifest_path=manifest_path,
+        )
+    except (ValueError, ValidationError) as error:
+        print(f'[red]\[error][/] Cannot load manifest: {error}')
+        return
+
+    print(
+        f'[green]\[start][/] Build with\n',
+        f'   manifest [purple]{manifest_path}[/]\n',
+        f'   scenarios [red]{len(manifest.scenarios)}[/]\n',
+        f'   jobs [blue]{jobs}[/]\n',
+    )
+
+    start_time = time.perf_counter()
+
+    results = build_scenarios(
+        manifest=manifest,
+        scenario_output_path=scenario_output_path,
+        snapshot=snapshot,
+        strategy=strategy,
+        jobs=jobs,
+        checksum=checksum,
+        store_path=store_path,
+    )
+
+    table = Table('Scenario', 'MRT files', 'Transferred', 'Skipped', 'Failed', 'MB', 'Wall time')
+    for result in results:
+        table.add_row(
+            result.path,
+            str(result.mrt_files),
+            str(result.transferred_files),
+            str(result.skipped_files),
+            str(result.failed_files),
+            f'{result.transferred_bytes / 1e6:.1f}',
+            f'{result.duration:.3f}s',
+        )
+    print(table)
+
+    print(
+        f'[yellow]\[finish][/] Build results\n',
+        f'   scenarios [red]{len(results)}[/]\n',
+        f'   failed files [red]{sum(result.failed_files for result in results)}[/]\n',
+        f'   total time [cyan]{time.perf_counter() - start_time:.3f}s[/]\n',
+    )
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.compile import compile_scenario, is_compiled_fresh
+from src.services.scenario import load_scenario, save_scenario
+from typing import Optional
+from pathlib import Path
+from rich import print
+
+def compile(scenario_output_path: Path, interval: Optional[int] = None, force: bool = False):
+    """ Compile the MRT files of a scenario into time buckets for playback.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            interval (Optional[int]): The bucket interval in seconds, defaults to the RabbitMQ grouped interval of the scenario.
+            force (bool): Compile even if the compiled file is up to date.
+    """
+    # Check if the scenario file exists
+    if not (scenario_output_path / 'scenario.json').exists():
+        print(f'[red]\[error][/] Scenario file does not exist')
+        return
+
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
+    )
+    interval = interval or scenario.rabbitmq_grouped or 1
+
+    print(
+        f'[green]\[start][/] Compile with\n',
+        f'   interval [cyan]{interval}s[/]\n',
+        f'   mrt files [red]{len(scenario.mrt_files)}[/]\n',
+    )
+
+    if not force and is_compiled_fresh(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
+        interval=interval,
+    ):
+        print(f'[yellow]\[info][/] Compiled file is up to date')
+        return
+
+    result = compile_scenario(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
+        interval=interval,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Compile results\n',
+        f'   compiled file [purple]{result.target.name}[/]\n',
+        f'   buckets [red]{result.buckets}[/]\n',
+        f'   records [red]{result.records}[/]\n',
+        f'   failed files [red]{len(result.failed_files)}[/]\n',
+        f'   size [cyan]{result.output_bytes / 1e6:.1f} MB[/]\n',
+        f'   duration [cyan]{result.duration:.3f}s[/]\n',
+    )
+
+    save_scenario(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
+    )
+
+    print(f'[yellow]\[info][/] Scenario file updated')
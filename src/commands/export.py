@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.query import query as query_service
+from src.services.snapshot import ArchiveSnapshot
+from src.services.export import export_files
+from src.models.query import QueryRequest
+from typing import Optional
+from pathlib import Path
+from rich import print
+
+def export(mrt_input_path: Path, export_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, jobs: int = 4, force: bool = False):
+    """ Export the BGP updates of a subset of MRTs to columnar arrays.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            export_path (Path): The path to the export directory.
+            request (QueryRequest): The query request.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            jobs (int): The number of worker processes.
+            force (bool): Export files that are already exported again.
+    """
+    print(
+        f'[green]\[start][/] Export with\n',
+        f'   start datetime [cyan]{request.start_datetime}[/]\n',
+        f'   end datetime [cyan]{request.end_datetime}[/]\n',
+        f'   vendors [blue]{request.vendor}[/]\n',
+        f'   peer names [blue]{request.peer_name}[/]\n',
+        f'   export path [purple]{export_path}[/]\n',
+    )
+
+    result = query_service(
+        mrt_input_path=mrt_input_path,
+        request=request,
+        layout=layout,
+        snapshot=snapshot,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Query results\n',
+        f'   mrt files [red]{len(result.mrt_files)}[/]\n',
+        f'   scan time [cyan]{result.scan_duration:.3f}s[/]\n',
+        f'   filter time [cyan]{result.filter_duration:.3f}s[/]\n',
+    )
+
+    if not result.mrt_files:
+        print(f'[red]\[warning][/] No MRT files to export')
+        return
+
+    export_result = export_files(
+        mrt_files=result.mrt_files,
+        export_path=export_path,
+        jobs=jobs,
+        force=force,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Export results\n',
+        f'   exported files [red]{export_result.exported_files}[/]\n',
+        f'   skipped files [red]{export_result.skipped_files}[/]\n',
+        f'   failed files [red]{len(export_result.failed_files)}[/]\n',
+        f'   rows [red]{export_result.rows}[/]\n',
+        f'   size [cyan]{export_result.input_bytes / 1e6:.1f} MB[/] to [cyan]{export_result.output_bytes / 1e6:.1f} MB[/]\n',
+        f'   throughput [cyan]{export_result.rows / max(export_result.duration, 1e-9):.0f} rows/s[/]\n',
+    )
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.store import collect_garbage
+from pathlib import Path
+from rich import print
+
+def gc(store_path: Path):
+    """ Remove blobs from the MRT store that are no longer referenced by any scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+    """
+    print(
+        f'[green]\[start][/] Garbage collection with\n',
+        f'   store [purple]{store_path}[/]\n',
+    )
+
+    result = collect_garbage(
+        store_path=store_path,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Garbage collection results\n',
+        f'   removed references [red]{result.removed_references}[/]\n',
+        f'   removed blobs [red]{result.removed_blobs}[/] ([cyan]{result.removed_bytes / 1e6:.1f} MB[/])\n',
+        f'   remaining blobs [red]{result.remaining_blobs}[/] ([cyan]{result.remaining_bytes / 1e6:.1f} MB[/])\n',
+    )
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.hotspot import get_hotspots
+from src.services.snapshot import ArchiveSnapshot
+from src.services.filename import from_epoch
+from src.models.query import QueryRequest
+from typing import Optional
+from pathlib import Path
+from rich import print
+
+def hotspots(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, records: bool = False, window: int = 96, threshold: float = 3.5, top: int = 10, jobs: int = 4):
+    """ Rank candidate anomaly windows by bursts in the update rates of the peers.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the date range.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            records (bool): Count the records of the update files instead of using their sizes.
+            window (int): The number of preceding update files of the baseline.
+            threshold (float): The robust z-score above which an update file is anomalous.
+            top (int): The number of windows to print.
+            jobs (int): The number of worker processes counting records.
+    """
+    print(
+        f'[green]\[start][/] Hotspots with\n',
+        f'   start datetime [cyan]{request.start_datetime}[/]\n',
+        f'   end datetime [cyan]{request.end_datetime}[/]\n',
+        f'   vendors [blue]{request.vendor}[/]\n',
+        f'   peer names [blue]{request.peer_name}[/]\n',
+        f'   metric [blue]{"records" if records else "bytes"}[/] per update file\n',
+        f'   baseline [cyan]{window}[/] update files, threshold [cyan]{threshold}[/]\n',
+    )
+
+    result = get_hotspots(
+        mrt_input_path=mrt_input_path,
+        request=request,
+        layout=layout,
+        snapshot=snapshot,
+        records=records,
+        window=window,
+        threshold=threshold,
+        top=top,
+        jobs=jobs,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Hotspot results\n',
+        f'   series [red]{result.series}[/] with [red]{result.points}[/] update files\n',
+        f'   cached files [red]{result.cached_files}[/]\n',
+        f'   counted files [red]{result.counted_files}[/]\n',
+        f'   skipped files [red]{len(result.skipped_files)}[/]\n',
+        f'   windows [red]{len(result.hotspots)}[/]\n',
+        f'   duration [cyan]{result.duration:.3f}s[/]\n',
+    )
+
+    for rank, hotspot in enumerate(result.hotspots, start=1):
+        print(
+            f'[yellow]\[{rank}][/] [blue]{hotspot.peer_name}[/] score [red]{hotspot.score:.1f}[/]'
+            f' peak [red]{hotspot.peak}[/] {result.metric} vs baseline [red]{hotspot.baseline:.0f}[/]\n',
+            f'   append -s {from_epoch(hotspot.start):%Y-%m-%dT%H:%M} -e {from_epoch(hotspot.end):%Y-%m-%dT%H:%M} -p {hotspot.peer_name}\n',
+        )
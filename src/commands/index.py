@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.index import build_index, get_index_path
+from pathlib import Path
+from rich import print
+import time
+
+def index(mrt_input_path: Path, action: str):
+    """ Build or update the persistent index of the MRT archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            action (str): The index action, either build or update.
+    """
+    print(
+        f'[green]\[start][/] Index with\n',
+        f'   action [blue]{action}[/]\n',
+        f'   index file [purple]{get_index_path(mrt_input_path)}[/]\n',
+    )
+
+    start_time = time.perf_counter()
+
+    result = build_index(
+        mrt_input_path=mrt_input_path,
+        rebuild=action == 'build',
+    )
+
+    print(
+        f'[yellow]\[finish][/] Index results\n',
+        f'   scanned directories [red]{result.scanned_directories}[/]\n',
+        f'   skipped directories [red]{result.skipped_directories}[/]\n',
+        f'   removed directories [red]{result.removed_directories}[/]\n',
+        f'   indexed files [red]{result.indexed_files}[/]\n',
+        f'   removed files [red]{result.removed_files}[/]\n',
+        f'   unparseable files [red]{result.unparseable_files}[/]\n',
+        f'   duration [cyan]{time.perf_counter() - start_time:.3f}s[/]\n',
+    )
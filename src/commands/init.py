@@ -8,6 +8,7 @@ It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
 
 Author Benedikt SCHWERING <mail@bschwer.ing>
 """
+from src.services.scenario import save_scenario
 from src.models.mrt_scenario import MRTScenario
 from pathlib import Path
 from rich import print
@@ -81,10 +82,9 @@ def init(scenario_output_path: Path):
         mrt_files=[],
     )
 
-    (scenario_output_path / 'scenario.json').write_text(
-        data=scenario.model_dump_json(
-            indent=4,
-        ),
+    save_scenario(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
     )
 
     print(f'[yellow]\[info][/] Scenario file created')
@@ -8,13 +8,37 @@ It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
 
 Author Benedikt SCHWERING <mail@bschwer.ing>
 """
-from src.services.query import query as query_service
-from src.models.query import QueryRequest
+from src.services.query import query as query_service, iter_query
+from src.services.snapshot import ArchiveSnapshot
+from src.services.filename import from_epoch
+from src.models.query import QueryRequest, QueryResponse
+from typing import Optional
 from pathlib import Path
 from rich import print
 import click
+import json
+import sys
 
-def query(mrt_input_path: Path, request: QueryRequest):
+def print_root_results(result: QueryResponse):
+    """ Print the result of every archive root of a query over several roots.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            result (QueryResponse): The query response.
+    """
+    if len(result.roots) < 2:
+        return
+
+    print(f'[yellow]\[roots][/] Query results per archive root')
+    for root in result.roots:
+        print(
+            f'   [purple]{root.mrt_input_path}[/] files [red]{root.files}[/]'
+            f' duplicate files [red]{root.duplicate_files}[/] scan time [cyan]{root.scan_duration:.3f}s[/]'
+        )
+
+def query(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, output_format: str = 'text'):
     """ Query the MRT archive for a subset of MRTs.
 
         Author:
@@ -23,7 +47,27 @@ def query(mrt_input_path: Path, request: QueryRequest):
         Params:
             mrt_input_path (Path): The path to the MRT input directory.
             request (QueryRequest): The query request.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            output_format (str): The output format, text prints a summary and ndjson streams one JSON line per file to stdout.
     """
+    if output_format == 'ndjson':
+        for mrt_file_name, path in iter_query(
+            mrt_input_path=mrt_input_path,
+            request=request,
+            layout=layout,
+            snapshot=snapshot,
+        ):
+            sys.stdout.write(json.dumps({
+                'path': str(path),
+                'timestamp': from_epoch(mrt_file_name.timestamp).isoformat(),
+                'vendor': mrt_file_name.vendor,
+                'peer_name': mrt_file_name.peer_name,
+                'bgp_type': mrt_file_name.bgp_type,
+            }) + '\n')
+            sys.stdout.flush()
+        return
+
     print(
         f'[green]\[start][/] Query with\n',
         f'   start datetime [cyan]{request.start_datetime}[/]\n',
@@ -36,14 +80,20 @@ def query(mrt_input_path: Path, request: QueryRequest):
     result = query_service(
         mrt_input_path=mrt_input_path,
         request=request,
+        layout=layout,
+        snapshot=snapshot,
     )
 
     print(
         f'[yellow]\[finish][/] Query results\n',
         f'   rib file [red]{not not result.rib_file}[/]\n',
         f'   mrt files [red]{len(result.mrt_files)}[/]\n',
+        f'   scan time [cyan]{result.scan_duration:.3f}s[/]\n',
+        f'   filter time [cyan]{result.filter_duration:.3f}s[/]\n',
     )
 
+    print_root_results(result)
+
     if result.rib_file and click.confirm(
         text='Print RIB file?',
         default=False,
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.scenario import load_scenario
+from src.services.seek import build_seek_indexes
+from src.models.seek import SeekIndexResult
+from pathlib import Path
+from rich import print
+
+def seek_index(scenario_output_path: Path, jobs: int = 4, force: bool = False):
+    """ Build the seek indexes of the MRT files of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            jobs (int): The number of worker processes.
+            force (bool): Rebuild up to date seek indexes.
+    """
+    # Check if the scenario file exists
+    if not (scenario_output_path / 'scenario.json').exists():
+        print(f'[red]\[error][/] Scenario file does not exist')
+        return
+
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
+    )
+
+    print(
+        f'[green]\[start][/] Seek index with\n',
+        f'   mrt files [red]{len(scenario.mrt_files)}[/]\n',
+    )
+
+    print_seek_index_result(build_seek_indexes(
+        paths=[scenario_output_path / mrt_file for mrt_file in scenario.mrt_files],
+        jobs=jobs,
+        force=force,
+    ))
+
+def print_seek_index_result(result: SeekIndexResult):
+    """ Print the result of building seek indexes.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            result (SeekIndexResult): The seek index result.
+    """
+    print(
+        f'[yellow]\[finish][/] Seek index results\n',
+        f'   indexed files [red]{result.indexed_files}[/]\n',
+        f'   skipped files [red]{result.skipped_files}[/]\n',
+        f'   failed files [red]{len(result.failed_files)}[/]\n',
+        f'   blocks [red]{result.blocks}[/]\n',
+        f'   entries [red]{result.entries}[/]\n',
+        f'   duration [cyan]{result.duration:.3f}s[/]\n',
+    )
+
+    for failed_file in result.failed_files:
+        print(f'[red]\[warning][/] No seek index for [purple]{failed_file}[/]')
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.daemon import serve as serve_service, get_socket_path
+from typing import Optional
+from pathlib import Path
+from rich import print
+
+def serve(mrt_input_path: Path, socket_path: Optional[Path] = None, interval: float = 2.0, layout: Optional[str] = None):
+    """ Run the query daemon of the MRT archive until interrupted.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            socket_path (Optional[Path]): The path to the Unix domain socket.
+            interval (float): The seconds between two archive rescans.
+            layout (Optional[str]): The archive layout template used to prune the catalogue.
+    """
+    socket_path = socket_path or get_socket_path(mrt_input_path)
+
+    print(
+        f'[green]\[start][/] Serve with\n',
+        f'   socket [purple]{socket_path}[/]\n',
+        f'   refresh interval [cyan]{interval}s[/]\n',
+    )
+
+    try:
+        catalogue = serve_service(
+            mrt_input_path=mrt_input_path,
+            socket_path=socket_path,
+            interval=interval,
+            layout=layout,
+        )
+    except (ValueError, OSError) as error:
+        print(f'[red]\[error][/] {error}')
+        return
+
+    print(
+        f'[yellow]\[finish][/] Serve results\n',
+        f'   mrt files [red]{len(catalogue.sorted_records)}[/]\n',
+    )
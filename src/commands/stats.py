@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.stats import update_stats, get_minute_stats, estimate_replay_duration
+from src.services.scenario import load_scenario, save_scenario
+from src.services.filename import from_epoch
+from src.models.stats import ScenarioStats, StatsResult
+from src.models.mrt_scenario import MRTScenario
+from datetime import timedelta
+from pathlib import Path
+from rich import print
+
+def print_stats_summary(scenario: MRTScenario, stats: ScenarioStats, result: StatsResult):
+    """ Print the totals and the estimated replay duration of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario (MRTScenario): The scenario.
+            stats (ScenarioStats): The statistics of the scenario.
+            result (StatsResult): The stats update result.
+    """
+    files = stats.files.values()
+
+    print(
+        f'[yellow]\[finish][/] Stats results\n',
+        f'   computed files [red]{result.computed_files}[/]\n',
+        f'   cached files [red]{result.cached_files}[/]\n',
+        f'   collected files [red]{result.collected_files}[/]\n',
+        f'   failed files [red]{len(result.failed_files)}[/]\n',
+        f'   missing files [red]{len(result.missing_files)}[/]\n',
+        f'   records [red]{sum(file_stats.records for file_stats in files)}[/]\n',
+        f'   announcements [red]{sum(file_stats.announcements for file_stats in files)}[/]\n',
+        f'   withdrawals [red]{sum(file_stats.withdrawals for file_stats in files)}[/]\n',
+        f'   estimated replay [cyan]{timedelta(seconds=round(estimate_replay_duration(stats, scenario.playback_speed)))}[/]'
+        f' at playback speed [cyan]{scenario.playback_speed or 1}[/]\n',
+    )
+
+    for failed_file in result.failed_files:
+        print(f'[red]\[warning][/] Could not decode [purple]{failed_file}[/], run verify')
+
+    for missing_file in result.missing_files:
+        print(f'[red]\[warning][/] Scenario file [purple]{missing_file}[/] does not exist')
+
+def stats(scenario_output_path: Path, jobs: int = 4, files: bool = False, top: int = 10):
+    """ Show the statistics of a scenario, computing them for new or changed files first.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            jobs (int): The number of worker processes.
+            files (bool): Print the statistics of every file.
+            top (int): The number of busiest minutes to print.
+    """
+    # Check if the scenario file exists
+    if not (scenario_output_path / 'scenario.json').exists():
+        print(f'[red]\[error][/] Scenario file does not exist')
+        return
+
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
+    )
+
+    print(
+        f'[green]\[start][/] Stats with\n',
+        f'   mrt files [red]{len(scenario.mrt_files)}[/]\n',
+    )
+
+    stats_file = scenario.stats_file
+    scenario_stats, result = update_stats(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
+        jobs=jobs,
+    )
+
+    if scenario.stats_file != stats_file:
+        save_scenario(
+            scenario_output_path=scenario_output_path,
+            scenario=scenario,
+        )
+
+    print_stats_summary(scenario, scenario_stats, result)
+
+    if files:
+        print(f'[yellow]\[files][/]')
+        for mrt_file, file_stats in scenario_stats.files.items():
+            print(
+                f'   [purple]{mrt_file}[/] records [red]{file_stats.records}[/]'
+                f' announcements [red]{file_stats.announcements}[/] withdrawals [red]{file_stats.withdrawals}[/]'
+                f' prefixes [red]{file_stats.prefixes}[/]'
+            )
+
+    minutes = sorted(get_minute_stats(scenario_stats), key=lambda minute: -minute.records)[:top]
+
+    if minutes:
+        print(f'[yellow]\[minutes][/] Busiest minutes')
+        for minute in minutes:
+            print(
+                f'   [cyan]{from_epoch(minute.timestamp):%Y-%m-%dT%H:%M}[/] records [red]{minute.records}[/]'
+                f' announcements [red]{minute.announcements}[/] withdrawals [red]{minute.withdrawals}[/]'
+                f' prefixes [red]{minute.prefixes}[/]'
+            )
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.verify import VERIFY_CACHE_FILE, verify_files
+from src.services.query import query as query_service
+from src.services.scenario import load_scenario
+from src.services.snapshot import ArchiveSnapshot
+from src.services.index import INDEX_DIRECTORY
+from src.models.verify import VerifyResult
+from src.models.query import QueryRequest
+from typing import Optional
+from pathlib import Path
+from rich import print
+
+def get_verify_cache_path(mrt_input_path: Path) -> Path:
+    """ Get the path of the verify cache of MRT files of an archive.
+        The cache is written to the user cache directory instead if the archive is read-only.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            Path: The path to the cache file.
+    """
+    return mrt_input_path / INDEX_DIRECTORY / VERIFY_CACHE_FILE
+
+def print_verify_result(result: VerifyResult):
+    """ Print the results of a verification.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            result (VerifyResult): The verify result.
+    """
+    print(
+        f'[yellow]\[finish][/] Verify results\n',
+        f'   verified files [red]{result.verified_files}[/]\n',
+        f'   cached files [red]{result.cached_files}[/]\n',
+        f'   bad files [red]{len(result.bad_files)}[/]\n',
+        f'   throughput [cyan]{result.verified_bytes / max(result.duration, 1e-9) / 1e6:.1f} MB/s[/]\n',
+    )
+
+    for bad_file in result.bad_files:
+        print(f'[red]\[error][/] [purple]{bad_file.path}[/] after [red]{bad_file.records}[/] records: {bad_file.error}')
+
+def verify(mrt_input_path: Path, scenario_output_path: Optional[Path] = None, request: Optional[QueryRequest] = None, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, jobs: int = 4, force: bool = False):
+    """ Verify the MRT files of a query result or of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            scenario_output_path (Optional[Path]): The path to the scenario output directory, verified if no request is given.
+            request (Optional[QueryRequest]): The query request of the archive files to verify.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            jobs (int): The number of worker processes.
+            force (bool): Verify files with a cached result again.
+    """
+    if request:
+        print(
+            f'[green]\[start][/] Verify archive with\n',
+            f'   start datetime [cyan]{request.start_datetime}[/]\n',
+            f'   end datetime [cyan]{request.end_datetime}[/]\n',
+            f'   vendors [blue]{request.vendor}[/]\n',
+            f'   peer names [blue]{request.peer_name}[/]\n',
+            f'   bgp types [blue]{request.bgp_type}[/]\n',
+        )
+
+        result = query_service(
+            mrt_input_path=mrt_input_path,
+            request=request,
+            layout=layout,
+            snapshot=snapshot,
+        )
+        paths = result.mrt_files + ([result.rib_file] if result.rib_file else [])
+        cache_path = get_verify_cache_path(mrt_input_path)
+    else:
+        # Check if the scenario file exists
+        if not (scenario_output_path / 'scenario.json').exists():
+            print(f'[red]\[error][/] Scenario file does not exist')
+            return
+
+        scenario = load_scenario(
+            scenario_output_path=scenario_output_path,
+        )
+
+        print(
+            f'[green]\[start][/] Verify scenario with\n',
+            f'   mrt files [red]{len(scenario.mrt_files)}[/]\n',
+            f'   rib files [red]{len(scenario.rib_files)}[/]\n',
+        )
+
+        paths = [scenario_output_path / mrt_file for mrt_file in scenario.mrt_files + scenario.rib_files]
+        cache_path = scenario_output_path / f'.{VERIFY_CACHE_FILE}'
+
+    print_verify_result(verify_files(
+        paths=paths,
+        cache_path=cache_path,
+        jobs=jobs,
+        force=force,
+    ))
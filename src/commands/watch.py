@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.daemon import ArchiveCatalogue
+from src.services.watch import watch_cycle
+from src.services.scenario import load_scenario
+from datetime import timedelta
+from typing import Optional
+from pathlib import Path
+from rich import print
+import time
+
+def watch(mrt_input_path: Path, scenario_output_path: Path, vendor: list[str], peer_name: list[str], window: timedelta, interval: float = 60, layout: Optional[str] = None, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None, once: bool = False):
+    """ Keep a rolling window scenario up to date with a growing MRT archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            scenario_output_path (Path): The path to the scenario output directory.
+            vendor (list[str]): The vendors.
+            peer_name (list[str]): The peer names.
+            window (timedelta): The length of the rolling window.
+            interval (float): The seconds between two cycles.
+            layout (Optional[str]): The archive layout template used to skip directories before the window.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+            once (bool): Run a single cycle and exit, e.g. from cron.
+    """
+    # Check if the scenario file exists
+    if not (scenario_output_path / 'scenario.json').exists():
+        print(f'[red]\[error][/] Scenario file does not exist')
+        return
+
+    print(
+        f'[green]\[start][/] Watch with\n',
+        f'   window [cyan]{window}[/]\n',
+        f'   interval [cyan]{interval}s[/]\n',
+        f'   vendors [blue]{vendor}[/]\n',
+        f'   peer names [blue]{peer_name}[/]\n',
+    )
+
+    catalogue = ArchiveCatalogue(
+        mrt_input_path=mrt_input_path,
+        layout=layout,
+    )
+    window_start = None
+
+    try:
+        while True:
+            result = watch_cycle(
+                catalogue=catalogue,
+                scenario_output_path=scenario_output_path,
+                vendor=vendor,
+                peer_name=peer_name,
+                window=window,
+                strategy=strategy,
+                jobs=jobs,
+                checksum=checksum,
+                store_path=store_path,
+                window_start=window_start,
+            )
+            window_start = result.window_start or window_start
+
+            if not result.window_end:
+                print(f'[red]\[warning][/] No matching update files in the archive')
+            else:
+                print(
+                    f'[yellow]\[info][/] Window [cyan]{result.window_start}[/] to [cyan]{result.window_end}[/]'
+                    f' added [red]{len(result.added_files)}[/] expired [red]{len(result.expired_files)}[/]'
+                    f' failed [red]{len(result.failed_files)}[/] listed directories [red]{result.scanned_directories}[/]'
+                    f' in [cyan]{result.duration:.3f}s[/]'
+                )
+
+            if once:
+                break
+
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
+    )
+
+    print(
+        f'[yellow]\[finish][/] Watch results\n',
+        f'   mrt files [red]{len(scenario.mrt_files)}[/]\n',
+    )
+
+    if scenario.compiled_file:
+        print(f'[red]\[warning][/] Compiled file is outdated, run compile again')
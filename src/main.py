@@ -8,16 +8,69 @@ It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
 
 Author Benedikt SCHWERING <mail@bschwer.ing>
 """
-from src.models.query import QueryRequest, VENDOR_CHOICES, PEER_NAME_CHOICES, BGP_TYPE_CHOICES
+from src.models.query import QueryRequest, VENDOR_CHOICES, PEER_NAME_CHOICES, BGP_TYPE_CHOICES, OUTPUT_FORMAT_CHOICES
+from src.models.transfer import TRANSFER_STRATEGY_CHOICES
+from src.models.rewrite import CODEC_CHOICES
+from src.models.filter import RecordFilter
+from src.models.index import INDEX_ACTION_CHOICES
 from src.commands.append import append as append_command
+from src.commands.index import index as index_command
 from src.commands.query import query as query_command
+from src.commands.export import export as export_command
+from src.commands.hotspots import hotspots as hotspots_command
+from src.commands.verify import verify as verify_command
+from src.commands.stats import stats as stats_command
+from src.commands.serve import serve as serve_command
+from src.commands.watch import watch as watch_command
 from src.commands.init import init as init_command
-from datetime import datetime
+from src.commands.build import build as build_command
+from src.commands.compile import compile as compile_command
+from src.commands.seek_index import seek_index as seek_index_command
+from src.commands.gc import gc as gc_command
+from src.services.snapshot import ArchiveSnapshot, TieredSnapshot
+from src.services.daemon import connect_daemon
+from src.services.walk import compile_layout
+from src.services.filter import parse_prefix
+from src.services.timings import enable_timings, get_timings, print_timings, write_trace, stage, profile
+from datetime import datetime, timedelta
+from typing import Optional
 from pathlib import Path
 from rich import print
 import click
+import sys
+
+class TimedCommand(click.Command):
+    """ Command timed as a stage of its own and profiled with cProfile if selected with --profile.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def invoke(self, ctx: click.Context):
+        """ Invoke the command within its stage.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                ctx (click.Context): The Click context.
+        """
+        with stage(self.name):
+            if ctx.obj.get('profile') != self.name:
+                return super().invoke(ctx)
+
+            with profile(self.name, ctx.obj['profile_output']):
+                return super().invoke(ctx)
+
+class TimedGroup(click.Group):
+    """ Group whose commands are timed commands.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    command_class = TimedCommand
 
 @click.group(
+    cls=TimedGroup,
     chain=True,
 )
 @click.option(
@@ -29,7 +82,9 @@ import click
         resolve_path=True,
         exists=True,
     ),
-    default='.',
+    multiple=True,
+    default=['.'],
+    help='MRT archive root, can be given multiple times ordered by priority, e.g. the fastest storage tier first.',
 )
 @click.option(
     '--scenario-output-path',
@@ -39,10 +94,75 @@ import click
         file_okay=False,
         resolve_path=True,
     ),
-    required=True,
+    default=None,
+)
+@click.option(
+    '--archive-layout',
+    '-l',
+    type=str,
+    callback=lambda ctx, param, value: validate_archive_layout(value),
+    default=None,
+    help='Directory layout of the MRT archive used to prune scans, e.g. {peer}/{YYYY}/{MM}/{DD}.',
+)
+@click.option(
+    '--store-path',
+    '-S',
+    type=click.Path(
+        dir_okay=True,
+        file_okay=False,
+        resolve_path=True,
+    ),
+    default=None,
+    help='Content-addressed MRT store shared between scenarios.',
+)
+@click.option(
+    '--daemon-socket',
+    type=click.Path(
+        dir_okay=False,
+        resolve_path=True,
+    ),
+    envvar='MRTAWK_DAEMON_SOCKET',
+    default=None,
+    help='Unix socket of the query daemon, defaults to .mrtawk/daemon.sock of the MRT input directory.',
+)
+@click.option(
+    '--no-daemon',
+    is_flag=True,
+    default=False,
+    help='Scan the archive even if a query daemon is running.',
+)
+@click.option(
+    '--timings',
+    is_flag=True,
+    default=False,
+    help='Print the wall and CPU time, files and bytes of every stage.',
+)
+@click.option(
+    '--timings-trace',
+    type=click.Path(
+        dir_okay=False,
+        resolve_path=True,
+    ),
+    default=None,
+    help='Write the stage timings and every single stage call as JSON.',
+)
+@click.option(
+    '--profile',
+    type=str,
+    default=None,
+    help='Profile a single command with cProfile, e.g. append.',
+)
+@click.option(
+    '--profile-output',
+    type=click.Path(
+        dir_okay=False,
+        resolve_path=True,
+    ),
+    default=None,
+    help='Write the raw cProfile statistics of the profiled command to a file.',
 )
 @click.pass_context
-def cli(ctx: click.Context, mrt_input_path: str, scenario_output_path: str):
+def cli(ctx: click.Context, mrt_input_path: tuple[str, ...], scenario_output_path: Optional[str], archive_layout: Optional[str], store_path: Optional[str], daemon_socket: Optional[str], no_daemon: bool, timings: bool, timings_trace: Optional[str], profile: Optional[str], profile_output: Optional[str]):
     """ Initialize the CLI context with the input and output paths.
 
         Author:
@@ -50,29 +170,148 @@ def cli(ctx: click.Context, mrt_input_path: str, scenario_output_path: str):
 
         Params:
             ctx (click.Context): The Click context.
-            mrt_input_path (str): The path to the MRT input directory.
-            scenario_output_path (str): The path to the scenario output directory.
+            mrt_input_path (tuple[str, ...]): The paths to the MRT input directories ordered by priority.
+            scenario_output_path (Optional[str]): The path to the scenario output directory.
+            archive_layout (Optional[str]): The directory layout of the MRT archive.
+            store_path (Optional[str]): The path to the shared MRT store.
+            daemon_socket (Optional[str]): The path to the query daemon socket.
+            no_daemon (bool): Do not use a running query daemon.
+            timings (bool): Print the timings of every stage.
+            timings_trace (Optional[str]): The path to the JSON trace of the stage timings.
+            profile (Optional[str]): The name of the command profiled with cProfile.
+            profile_output (Optional[str]): The path to the raw cProfile statistics.
     """
     ctx.ensure_object(dict)
-    ctx.obj['mrt_input_path'] = mrt_input_path
+
+    if profile and profile not in ctx.command.commands:
+        raise click.BadParameter(f'Unknown command {profile}', param_hint='\'--profile\'')
+
+    ctx.obj['profile'] = profile
+    ctx.obj['profile_output'] = Path(profile_output) if profile_output else None
+
+    if timings or timings_trace:
+        enable_timings(
+            trace=bool(timings_trace),
+        )
+        ctx.call_on_close(lambda: finish_timings(timings, Path(timings_trace) if timings_trace else None))
+
+    # Caches like the archive index are kept in the root with the highest priority
+    ctx.obj['mrt_input_path'] = mrt_input_path[0]
+    ctx.obj['mrt_input_paths'] = list(dict.fromkeys(mrt_input_path))
     ctx.obj['scenario_output_path'] = scenario_output_path
+    ctx.obj['archive_layout'] = archive_layout
+    ctx.obj['store_path'] = store_path
+    ctx.obj['daemon_socket'] = daemon_socket
+
+    # Chained commands share one archive snapshot, answered by the query daemon if it is running
+    ctx.obj['snapshot'] = None if no_daemon or len(ctx.obj['mrt_input_paths']) > 1 else connect_daemon(
+        mrt_input_path=Path(ctx.obj['mrt_input_path']),
+        socket_path=Path(daemon_socket) if daemon_socket else None,
+    )
+    if ctx.obj['snapshot']:
+        print(f'[yellow]\[info][/] Using query daemon', file=sys.stderr)
+    elif len(ctx.obj['mrt_input_paths']) > 1:
+        ctx.obj['snapshot'] = TieredSnapshot(
+            mrt_input_paths=[Path(path) for path in ctx.obj['mrt_input_paths']],
+            layout=archive_layout,
+        )
+    else:
+        ctx.obj['snapshot'] = ArchiveSnapshot(
+            mrt_input_path=Path(ctx.obj['mrt_input_path']),
+            layout=archive_layout,
+        )
 
-    mrt_input_path = Path(mrt_input_path)
-    scenario_output_path = Path(scenario_output_path)
+    scenario_output_path = Path(scenario_output_path) if scenario_output_path else None
 
+    # Status output goes to stderr, so the output of commands like query --format ndjson can be piped
     print(
         f'[green]\[start][/] mrtawk with\n',
-        f'   mrt input [purple]{mrt_input_path}[/]\n',
+        f'   mrt input [purple]{", ".join(ctx.obj["mrt_input_paths"])}[/]\n',
         f'   scenario output [purple]{scenario_output_path}[/]\n',
+        file=sys.stderr,
     )
 
     # Create the scenario output directory if it does not exist
-    if not scenario_output_path.exists():
+    if scenario_output_path and not scenario_output_path.exists():
         scenario_output_path.mkdir(
             parents=True,
             exist_ok=True,
         )
-        print(f'[yellow]\[info][/] Scenario directory created')
+        print(f'[yellow]\[info][/] Scenario directory created', file=sys.stderr)
+
+def finish_timings(timings: bool, timings_trace: Optional[Path]):
+    """ Print the stage timings and write the trace after all chained commands finished.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timings (bool): Print the timings of every stage.
+            timings_trace (Optional[Path]): The path to the JSON trace of the stage timings.
+    """
+    if timings:
+        print_timings(get_timings())
+
+    if timings_trace:
+        write_trace(get_timings(), timings_trace)
+        print(f'[yellow]\[info][/] Timings trace written to [purple]{timings_trace}[/]', file=sys.stderr)
+
+def validate_archive_layout(archive_layout: Optional[str]) -> Optional[str]:
+    """ Validate the archive layout template option.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            archive_layout (Optional[str]): The archive layout template.
+
+        Returns:
+            Optional[str]: The validated archive layout template.
+    """
+    if archive_layout:
+        try:
+            compile_layout(archive_layout)
+        except ValueError as error:
+            raise click.BadParameter(str(error))
+
+    return archive_layout
+
+def validate_prefixes(prefixes: tuple[str, ...]) -> tuple[str, ...]:
+    """ Validate the prefix filter option.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            prefixes (tuple[str, ...]): The prefixes in CIDR notation.
+
+        Returns:
+            tuple[str, ...]: The validated prefixes.
+    """
+    for prefix in prefixes:
+        try:
+            parse_prefix(prefix)
+        except ValueError as error:
+            raise click.BadParameter(str(error))
+
+    return prefixes
+
+def get_scenario_output_path(obj: dict) -> Path:
+    """ Get the scenario output path for commands that operate on a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+
+        Returns:
+            Path: The path to the scenario output directory.
+    """
+    if not obj['scenario_output_path']:
+        raise click.UsageError('Missing option \'--scenario-output-path\' / \'-o\'.')
+
+    return Path(obj['scenario_output_path'])
 
 @cli.command(
     'init',
@@ -88,7 +327,7 @@ def init(obj: dict):
             obj (dict): The dictionary containing the CLI arguments.
     """
     init_command(
-        scenario_output_path=Path(obj['scenario_output_path']),
+        scenario_output_path=get_scenario_output_path(obj),
     )
 
 @cli.command(
@@ -152,7 +391,101 @@ def init(obj: dict):
     default=['update'],
     show_default=True,
 )
-def append(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], bgp_type: list[str]):
+@click.option(
+    '--strategy',
+    '-t',
+    type=click.Choice(
+        choices=TRANSFER_STRATEGY_CHOICES,
+    ),
+    default='copy',
+    show_default=True,
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--checksum',
+    is_flag=True,
+    default=False,
+    help='Compare checksums instead of size and mtime to skip files already in the scenario.',
+)
+@click.option(
+    '--trim',
+    is_flag=True,
+    default=False,
+    help='Rewrite the update files at the window boundaries to contain only records within the window.',
+)
+@click.option(
+    '--merge',
+    is_flag=True,
+    default=False,
+    help='Merge the update files of all peers into a single time-ordered MRT file.',
+)
+@click.option(
+    '--seek-index',
+    is_flag=True,
+    default=False,
+    help='Build the seek indexes of the MRT files of the scenario.',
+)
+@click.option(
+    '--codec',
+    '-c',
+    type=click.Choice(
+        choices=CODEC_CHOICES,
+    ),
+    default=None,
+    help='Transcode the MRT files to a codec that is faster to decode, files are kept as-is by default.',
+)
+@click.option(
+    '--synthesize-rib',
+    is_flag=True,
+    default=False,
+    help='Synthesize the RIB of each peer at the window start from the nearest earlier RIB and the updates in between.',
+)
+@click.option(
+    '--prefix',
+    type=str,
+    multiple=True,
+    callback=lambda ctx, param, value: validate_prefixes(value),
+    help='Keep only records of prefixes overlapping this prefix, e.g. 192.0.2.0/24.',
+)
+@click.option(
+    '--origin-asn',
+    type=click.IntRange(
+        min=0,
+        max=0xffffffff,
+    ),
+    multiple=True,
+    help='Keep only records announced by this origin AS.',
+)
+@click.option(
+    '--as-path-contains',
+    type=click.IntRange(
+        min=0,
+        max=0xffffffff,
+    ),
+    multiple=True,
+    help='Keep only records whose AS path contains this AS.',
+)
+@click.option(
+    '--verify',
+    is_flag=True,
+    default=False,
+    help='Verify the MRT files before appending them and skip corrupt files.',
+)
+@click.option(
+    '--stats',
+    is_flag=True,
+    default=False,
+    help='Compute the statistics of the new scenario files, collected in the same pass if they are trimmed, merged or filtered.',
+)
+def append(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], bgp_type: list[str], strategy: str, jobs: int, checksum: bool, trim: bool, merge: bool, seek_index: bool, codec: Optional[str], synthesize_rib: bool, prefix: tuple[str, ...], origin_asn: tuple[int, ...], as_path_contains: tuple[int, ...], verify: bool, stats: bool):
     """ Append MRT data to an existing scenario.
 
         Author:
@@ -165,10 +498,23 @@ def append(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor:
             vendor (list[str]): The vendor(s).
             peer_name (list[str]): The peer name(s).
             bgp_type (list[str]): The BGP type(s).
+            strategy (str): The transfer strategy.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums to skip files already in the scenario.
+            trim (bool): Trim the boundary update files to the exact window.
+            merge (bool): Merge the update files of all peers into one file.
+            seek_index (bool): Build the seek indexes of the scenario files.
+            codec (Optional[str]): The codec MRT files are transcoded to.
+            synthesize_rib (bool): Synthesize the RIBs at the window start.
+            prefix (tuple[str, ...]): The prefixes records are filtered by.
+            origin_asn (tuple[int, ...]): The origin ASNs records are filtered by.
+            as_path_contains (tuple[int, ...]): The ASNs the AS path of records has to contain.
+            verify (bool): Verify the MRT files before appending them.
+            stats (bool): Compute the statistics of the new scenario files.
     """
     append_command(
         mrt_input_path=Path(obj['mrt_input_path']),
-        scenario_output_path=Path(obj['scenario_output_path']),
+        scenario_output_path=get_scenario_output_path(obj),
         request=QueryRequest(
             start_datetime=start_datetime,
             end_datetime=end_datetime,
@@ -176,6 +522,130 @@ def append(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor:
             peer_name=peer_name,
             bgp_type=bgp_type,
         ),
+        layout=obj['archive_layout'],
+        snapshot=obj['snapshot'],
+        strategy=strategy,
+        jobs=jobs,
+        checksum=checksum,
+        store_path=Path(obj['store_path']) if obj['store_path'] else None,
+        trim=trim,
+        merge=merge,
+        seek_index=seek_index,
+        codec=codec,
+        synthesize_rib=synthesize_rib,
+        record_filter=RecordFilter(
+            prefixes=prefix,
+            origin_asns=origin_asn,
+            as_path_contains=as_path_contains,
+        ) if prefix or origin_asn or as_path_contains else None,
+        verify=verify,
+        stats=stats,
+    )
+
+@cli.command(
+    'watch',
+)
+@click.pass_obj
+@click.option(
+    '--window',
+    '-w',
+    type=click.FloatRange(
+        min=0.25,
+    ),
+    required=True,
+    help='Length of the rolling window in hours, ending with the newest matching update file.',
+)
+@click.option(
+    '--interval',
+    type=click.FloatRange(
+        min=1,
+    ),
+    default=60,
+    show_default=True,
+    help='Seconds between two polls of the archive.',
+)
+@click.option(
+    '--vendor',
+    '-v',
+    type=click.Choice(
+        choices=VENDOR_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['lw'],
+    show_default=True,
+)
+@click.option(
+    '--peer-name',
+    '-p',
+    type=click.Choice(
+        choices=PEER_NAME_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['decix'],
+    show_default=True,
+)
+@click.option(
+    '--strategy',
+    '-t',
+    type=click.Choice(
+        choices=TRANSFER_STRATEGY_CHOICES,
+    ),
+    default='copy',
+    show_default=True,
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--checksum',
+    is_flag=True,
+    default=False,
+    help='Compare checksums instead of size and mtime to skip files already in the scenario.',
+)
+@click.option(
+    '--once',
+    is_flag=True,
+    default=False,
+    help='Run a single cycle and exit, e.g. from cron.',
+)
+def watch(obj: dict, window: float, interval: float, vendor: list[str], peer_name: list[str], strategy: str, jobs: int, checksum: bool, once: bool):
+    """ Keep a rolling window scenario up to date with a growing MRT archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            window (float): The length of the rolling window in hours.
+            interval (float): The seconds between two polls of the archive.
+            vendor (list[str]): The vendors.
+            peer_name (list[str]): The peer names.
+            strategy (str): The transfer strategy.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            once (bool): Run a single cycle and exit.
+    """
+    watch_command(
+        mrt_input_path=Path(obj['mrt_input_path']),
+        scenario_output_path=get_scenario_output_path(obj),
+        vendor=vendor,
+        peer_name=peer_name,
+        window=timedelta(hours=window),
+        interval=interval,
+        layout=obj['archive_layout'],
+        strategy=strategy,
+        jobs=jobs,
+        checksum=checksum,
+        store_path=Path(obj['store_path']) if obj['store_path'] else None,
+        once=once,
     )
 
 @cli.command(
@@ -239,7 +709,18 @@ def append(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor:
     default=['update'],
     show_default=True,
 )
-def query(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], bgp_type: list[str]):
+@click.option(
+    '--format',
+    '-f',
+    'output_format',
+    type=click.Choice(
+        choices=OUTPUT_FORMAT_CHOICES,
+    ),
+    default='text',
+    show_default=True,
+    help='ndjson streams one JSON line per MRT file to stdout in timestamp order.',
+)
+def query(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], bgp_type: list[str], output_format: str):
     """ Query the MRT archive for a subset of MRTs.
 
         Author:
@@ -252,6 +733,7 @@ def query(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: l
             vendor (list[str]): The vendor(s).
             peer_name (list[str]): The peer name(s).
             bgp_type (list[str]): The BGP type(s).
+            output_format (str): The output format.
     """
     query_command(
         mrt_input_path=Path(obj['mrt_input_path']),
@@ -262,4 +744,609 @@ def query(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: l
             peer_name=peer_name,
             bgp_type=bgp_type,
         ),
+        layout=obj['archive_layout'],
+        snapshot=obj['snapshot'],
+        output_format=output_format,
+    )
+
+@cli.command(
+    'export',
+)
+@click.pass_obj
+@click.option(
+    '--export-path',
+    '-d',
+    type=click.Path(
+        dir_okay=True,
+        file_okay=False,
+        resolve_path=True,
+    ),
+    required=True,
+    help='Directory the columns are written to, re-running with the same directory only exports new or changed files.',
+)
+@click.option(
+    '--start-datetime',
+    '-s',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    required=True,
+)
+@click.option(
+    '--end-datetime',
+    '-e',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    required=True,
+)
+@click.option(
+    '--vendor',
+    '-v',
+    type=click.Choice(
+        choices=VENDOR_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['lw'],
+    show_default=True,
+)
+@click.option(
+    '--peer-name',
+    '-p',
+    type=click.Choice(
+        choices=PEER_NAME_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['decix'],
+    show_default=True,
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Export files that are already exported again.',
+)
+def export(obj: dict, export_path: str, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], jobs: int, force: bool):
+    """ Export the BGP updates of a subset of MRTs to columnar arrays.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            export_path (str): The path to the export directory.
+            start_datetime (datetime): The start datetime.
+            end_datetime (datetime): The end datetime.
+            vendor (list[str]): The vendor(s).
+            peer_name (list[str]): The peer name(s).
+            jobs (int): The number of worker processes.
+            force (bool): Export files that are already exported again.
+    """
+    export_command(
+        mrt_input_path=Path(obj['mrt_input_path']),
+        export_path=Path(export_path),
+        request=QueryRequest(
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            vendor=vendor,
+            peer_name=peer_name,
+            bgp_type=['update'],
+        ),
+        layout=obj['archive_layout'],
+        snapshot=obj['snapshot'],
+        jobs=jobs,
+        force=force,
+    )
+
+@cli.command(
+    'hotspots',
+)
+@click.pass_obj
+@click.option(
+    '--start-datetime',
+    '-s',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    required=True,
+)
+@click.option(
+    '--end-datetime',
+    '-e',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    required=True,
+)
+@click.option(
+    '--vendor',
+    '-v',
+    type=click.Choice(
+        choices=VENDOR_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['lw'],
+    show_default=True,
+)
+@click.option(
+    '--peer-name',
+    '-p',
+    type=click.Choice(
+        choices=PEER_NAME_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['decix'],
+    show_default=True,
+)
+@click.option(
+    '--records',
+    is_flag=True,
+    default=False,
+    help='Count the records of the update files instead of using their sizes, counts are cached in the archive.',
+)
+@click.option(
+    '--window',
+    type=click.IntRange(
+        min=4,
+    ),
+    default=96,
+    show_default=True,
+    help='Number of preceding update files the baseline is computed from.',
+)
+@click.option(
+    '--threshold',
+    type=click.FloatRange(
+        min=0,
+    ),
+    default=3.5,
+    show_default=True,
+    help='Robust z-score above which an update file is anomalous.',
+)
+@click.option(
+    '--top',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=10,
+    show_default=True,
+    help='Number of windows to print.',
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+def hotspots(obj: dict, start_datetime: datetime, end_datetime: datetime, vendor: list[str], peer_name: list[str], records: bool, window: int, threshold: float, top: int, jobs: int):
+    """ Rank candidate anomaly windows by bursts in the update rates of the peers.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            start_datetime (datetime): The start datetime.
+            end_datetime (datetime): The end datetime.
+            vendor (list[str]): The vendor(s).
+            peer_name (list[str]): The peer name(s).
+            records (bool): Count the records instead of using the file sizes.
+            window (int): The number of preceding update files of the baseline.
+            threshold (float): The robust z-score above which an update file is anomalous.
+            top (int): The number of windows to print.
+            jobs (int): The number of worker processes counting records.
+    """
+    hotspots_command(
+        mrt_input_path=Path(obj['mrt_input_path']),
+        request=QueryRequest(
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            vendor=vendor,
+            peer_name=peer_name,
+            bgp_type=['update'],
+        ),
+        layout=obj['archive_layout'],
+        snapshot=obj['snapshot'],
+        records=records,
+        window=window,
+        threshold=threshold,
+        top=top,
+        jobs=jobs,
+    )
+
+@cli.command(
+    'verify',
+)
+@click.pass_obj
+@click.option(
+    '--start-datetime',
+    '-s',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    default=None,
+    help='Verify the archive files of the query instead of the scenario files.',
+)
+@click.option(
+    '--end-datetime',
+    '-e',
+    type=click.DateTime(
+        formats=[
+            '%Y-%m-%dT%H:%M:%S',
+            '%Y-%m-%dT%H:%M',
+            '%Y-%m-%d',
+        ],
+    ),
+    default=None,
+)
+@click.option(
+    '--vendor',
+    '-v',
+    type=click.Choice(
+        choices=VENDOR_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['lw'],
+    show_default=True,
+)
+@click.option(
+    '--peer-name',
+    '-p',
+    type=click.Choice(
+        choices=PEER_NAME_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['decix'],
+    show_default=True,
+)
+@click.option(
+    '--bgp-type',
+    '-b',
+    type=click.Choice(
+        choices=BGP_TYPE_CHOICES,
+    ),
+    multiple=True,
+    required=True,
+    default=['update'],
+    show_default=True,
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Verify files with a cached result again.',
+)
+def verify(obj: dict, start_datetime: Optional[datetime], end_datetime: Optional[datetime], vendor: list[str], peer_name: list[str], bgp_type: list[str], jobs: int, force: bool):
+    """ Verify the MRT files of a scenario or of a query.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            start_datetime (Optional[datetime]): The start datetime of the query.
+            end_datetime (Optional[datetime]): The end datetime of the query.
+            vendor (list[str]): The vendor(s).
+            peer_name (list[str]): The peer name(s).
+            bgp_type (list[str]): The BGP type(s).
+            jobs (int): The number of worker processes.
+            force (bool): Verify files with a cached result again.
+    """
+    if (start_datetime is None) != (end_datetime is None):
+        raise click.UsageError('Options \'--start-datetime\' / \'-s\' and \'--end-datetime\' / \'-e\' have to be given together.')
+
+    verify_command(
+        mrt_input_path=Path(obj['mrt_input_path']),
+        scenario_output_path=get_scenario_output_path(obj) if start_datetime is None else None,
+        request=QueryRequest(
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            vendor=vendor,
+            peer_name=peer_name,
+            bgp_type=bgp_type,
+        ) if start_datetime is not None else None,
+        layout=obj['archive_layout'],
+        snapshot=obj['snapshot'],
+        jobs=jobs,
+        force=force,
+    )
+
+@cli.command(
+    'serve',
+)
+@click.pass_obj
+@click.option(
+    '--interval',
+    type=click.FloatRange(
+        min=0.1,
+    ),
+    default=2.0,
+    show_default=True,
+    help='Seconds between two rescans of the archive for new files.',
+)
+def serve(obj: dict, interval: float):
+    """ Serve queries from an in-memory catalogue of the MRT archive on a Unix socket.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            interval (float): The seconds between two archive rescans.
+    """
+    serve_command(
+        mrt_input_path=Path(obj['mrt_input_path']),
+        socket_path=Path(obj['daemon_socket']) if obj['daemon_socket'] else None,
+        interval=interval,
+        layout=obj['archive_layout'],
+    )
+
+@cli.command(
+    'index',
+)
+@click.pass_obj
+@click.argument(
+    'action',
+    type=click.Choice(
+        choices=INDEX_ACTION_CHOICES,
+    ),
+)
+def index(obj: dict, action: str):
+    """ Build or update the persistent index of the MRT archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            action (str): The index action, either build or update.
+    """
+    for mrt_input_path in obj['mrt_input_paths']:
+        index_command(
+            mrt_input_path=Path(mrt_input_path),
+            action=action,
+        )
+
+@cli.command(
+    'gc',
+)
+@click.pass_obj
+def gc(obj: dict):
+    """ Remove blobs from the MRT store that are no longer referenced by any scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+    """
+    if not obj['store_path']:
+        raise click.UsageError('Missing option \'--store-path\' / \'-S\'.')
+
+    gc_command(
+        store_path=Path(obj['store_path']),
+    )
+
+@cli.command(
+    'compile',
+)
+@click.pass_obj
+@click.option(
+    '--interval',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=None,
+    help='Bucket interval in seconds, defaults to the RabbitMQ grouped interval of the scenario.',
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Compile even if the compiled file is up to date.',
+)
+def compile(obj: dict, interval: Optional[int], force: bool):
+    """ Compile the MRT files of a scenario into time buckets for playback.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            interval (Optional[int]): The bucket interval in seconds.
+            force (bool): Compile even if the compiled file is up to date.
+    """
+    compile_command(
+        scenario_output_path=get_scenario_output_path(obj),
+        interval=interval,
+        force=force,
+    )
+
+@cli.command(
+    'seek-index',
+)
+@click.pass_obj
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--force',
+    is_flag=True,
+    default=False,
+    help='Rebuild seek indexes that are up to date.',
+)
+def seek_index(obj: dict, jobs: int, force: bool):
+    """ Build the seek indexes of the MRT files of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            jobs (int): The number of worker processes.
+            force (bool): Rebuild up to date seek indexes.
+    """
+    seek_index_command(
+        scenario_output_path=get_scenario_output_path(obj),
+        jobs=jobs,
+        force=force,
+    )
+
+@cli.command(
+    'stats',
+)
+@click.pass_obj
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--files',
+    is_flag=True,
+    default=False,
+    help='Print the statistics of every MRT file.',
+)
+@click.option(
+    '--top',
+    type=click.IntRange(
+        min=0,
+    ),
+    default=10,
+    show_default=True,
+    help='Number of busiest minutes to print.',
+)
+def stats(obj: dict, jobs: int, files: bool, top: int):
+    """ Show the statistics and the estimated replay duration of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            jobs (int): The number of worker processes.
+            files (bool): Print the statistics of every MRT file.
+            top (int): The number of busiest minutes to print.
+    """
+    stats_command(
+        scenario_output_path=get_scenario_output_path(obj),
+        jobs=jobs,
+        files=files,
+        top=top,
+    )
+
+@cli.command(
+    'build',
+)
+@click.pass_obj
+@click.argument(
+    'manifest',
+    type=click.Path(
+        dir_okay=False,
+        file_okay=True,
+        resolve_path=True,
+        exists=True,
+    ),
+)
+@click.option(
+    '--strategy',
+    '-t',
+    type=click.Choice(
+        choices=TRANSFER_STRATEGY_CHOICES,
+    ),
+    default='copy',
+    show_default=True,
+)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(
+        min=1,
+    ),
+    default=4,
+    show_default=True,
+)
+@click.option(
+    '--checksum',
+    is_flag=True,
+    default=False,
+    help='Compare checksums instead of size and mtime to skip files already in the scenarios.',
+)
+def build(obj: dict, manifest: str, strategy: str, jobs: int, checksum: bool):
+    """ Build all scenarios of a YAML or JSON manifest without interaction.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            obj (dict): The dictionary containing the CLI arguments.
+            manifest (str): The path to the manifest.
+            strategy (str): The transfer strategy.
+            jobs (int): The maximum number of concurrent transfers over all scenarios.
+            checksum (bool): Compare checksums to skip files already in the scenarios.
+    """
+    build_command(
+        manifest_path=Path(manifest),
+        scenario_output_path=get_scenario_output_path(obj),
+        snapshot=obj['snapshot'],
+        strategy=strategy,
+        jobs=jobs,
+        checksum=checksum,
+        store_path=Path(obj['store_path']) if obj['store_path'] else None,
     )
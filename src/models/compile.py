@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import NamedTuple
+from pydantic import BaseModel
+from pathlib import Path
+
+class Bucket(NamedTuple):
+    """ Bucket of the compiled playback file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int
+    records: int
+    offset: int
+    length: int
+
+class CompileResult(BaseModel):
+    """ Compile result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    target: Path
+    interval: int
+    buckets: int
+    records: int
+    output_bytes: int
+    duration: float
+    failed_files: list[str] = []
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from typing import Optional
+
+class DaemonResponse(BaseModel):
+    """ Query daemon response model.
+        Each file is sent as [timestamp, vendor, peer name, BGP type, path] in timestamp order.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    files: list[tuple[int, str, str, str, str]] = []
+    catalogue_files: int = 0
+    duration: float = 0
+    error: Optional[str] = None
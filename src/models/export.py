@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from pathlib import Path
+
+# Column name and NumPy dtype of the exported arrays, one row per announced or withdrawn prefix
+EXPORT_COLUMNS = {
+    'timestamp': '<u4',
+    'microsecond': '<u4',
+    'peer': '<u2', # index into the peers of the manifest
+    'afi': '|u1',
+    'prefix_high': '<u8', # upper 64 bits of the network address, 0 for IPv4
+    'prefix_low': '<u8', # lower 64 bits of the network address
+    'prefix_length': '|u1',
+    'origin_asn': '<u4', # 0 for withdrawals
+    'as_path_length': '<u2', # 0 for withdrawals
+    'announce': '|b1',
+}
+
+class ExportPeer(BaseModel):
+    """ BGP peer of the exported updates.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    collector: str # peer name of the MRT file, e.g. decix
+    ip: str
+    asn: int
+
+class ExportChunk(BaseModel):
+    """ Exported columns of a single MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    name: str # directory of the column files
+    source: Path
+    size: int # size of the source file when it was exported
+    mtime_ns: int # mtime of the source file when it was exported
+    timestamp: int # epoch timestamp of the source file
+    rows: int
+
+class ExportManifest(BaseModel):
+    """ Manifest of an export directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    columns: dict[str, str] = EXPORT_COLUMNS
+    peers: list[ExportPeer] = []
+    chunks: list[ExportChunk] = []
+    failed_files: list[Path] = [] # MRT files that could not be read or decoded and have no chunk
+
+class ExportResult(BaseModel):
+    """ Export result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    exported_files: int
+    skipped_files: int
+    rows: int
+    input_bytes: int
+    output_bytes: int
+    duration: float
+    failed_files: list[str] = []
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+
+class RecordFilter(BaseModel):
+    """ Record filter model.
+        Values of one kind are alternatives, different kinds must all match.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    prefixes: list[str] = [] # CIDR notation, e.g. 192.0.2.0/24
+    origin_asns: list[int] = []
+    as_path_contains: list[int] = []
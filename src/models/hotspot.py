@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+
+class Hotspot(BaseModel):
+    """ Candidate anomaly window of a peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    peer_name: str
+    start: int # epoch seconds
+    end: int # epoch seconds, exclusive
+    score: float # highest robust z-score of the window
+    peak: int # highest bytes or records per update file of the window
+    baseline: float # median bytes or records per update file before the peak
+
+class HotspotResult(BaseModel):
+    """ Hotspot result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    metric: str # bytes or records
+    series: int
+    points: int
+    cached_files: int
+    counted_files: int
+    hotspots: list[Hotspot]
+    duration: float
+    skipped_files: list[str] = [] # update files whose records could not be counted
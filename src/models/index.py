@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+
+INDEX_ACTION_CHOICES = ['build', 'update']
+
+class IndexResult(BaseModel):
+    """ Index result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    scanned_directories: int
+    skipped_directories: int
+    removed_directories: int
+    indexed_files: int
+    removed_files: int
+    unparseable_files: int
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.query import QueryRequest
+from pydantic import BaseModel
+from typing import Optional
+
+class ManifestQuery(QueryRequest):
+    """ Query of a manifest scenario, with the same defaults as the CLI options.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    vendor: list[str] = ['lw']
+    peer_name: list[str] = ['decix']
+    bgp_type: list[str] = ['update']
+
+class ManifestScenario(BaseModel):
+    """ Scenario definition of a manifest, with the same defaults as the init command.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    path: str # relative to the scenario output path
+    name: Optional[str] = None
+    description: str = ''
+    no_rabbitmq_direct: bool = False
+    rabbitmq_grouped: Optional[int] = None
+    no_mongodb_log: bool = True
+    no_mongodb_state: bool = True
+    no_mongodb_statistics: bool = True
+    clear_mongodb: bool = True
+    playback_speed: Optional[int] = None
+    queries: list[ManifestQuery]
+
+class Manifest(BaseModel):
+    """ Manifest model describing many scenarios to build at once.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    scenarios: list[ManifestScenario]
+
+class BuildResult(BaseModel):
+    """ Build result model of a single scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    path: str
+    mrt_files: int
+    transferred_files: int
+    skipped_files: int
+    failed_files: int
+    transferred_bytes: int
+    duration: float
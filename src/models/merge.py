@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.stats import FileStats
+from pydantic import BaseModel
+from typing import Optional
+from pathlib import Path
+
+class MergeResult(BaseModel):
+    """ Merge result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    target: Path
+    input_files: int
+    input_streams: int
+    input_records: int
+    records: int
+    input_bytes: int
+    output_bytes: int
+    duration: float
+    failed_files: list[str] = []
+    stats: Optional[FileStats] = None # statistics of the merged file if collected
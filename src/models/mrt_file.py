@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import NamedTuple
+
+class MRTFileName(NamedTuple):
+    """ Parsed MRT file name.
+        This is a slotted tuple instead of a pydantic model as it is created for every file in the archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int # epoch seconds
+    vendor: str # lw, ...
+    peer_name: str # amsix, decix, chinatel, ...
+    bgp_type: str # rib, update, ...
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import NamedTuple, Optional
+
+# Prefixes are plain (afi, network, length) tuples with the network as integer
+Prefix = tuple[int, int, int]
+
+class MRTRecord(NamedTuple):
+    """ Raw MRT record.
+        The data is a memoryview of the whole record including the header, so it can be written out without copies.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int # epoch seconds
+    microsecond: int # 0 for non extended timestamp types
+    type: int # 13 TABLE_DUMP_V2, 16 BGP4MP, 17 BGP4MP_ET, ...
+    subtype: int
+    header_length: int # 12 or 16 for extended timestamp types
+    data: memoryview
+
+class BGPUpdate(NamedTuple):
+    """ Decoded BGP UPDATE message of a BGP4MP record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int
+    microsecond: int
+    peer_as: int
+    peer_ip: tuple[int, int] # (afi, address)
+    withdrawn: list[Prefix]
+    announced: list[Prefix]
+    attributes: memoryview
+    as4: bool # AS numbers in the attributes are 4 bytes long
+
+class RIBEntry(NamedTuple):
+    """ Decoded TABLE_DUMP_V2 RIB record of a single prefix.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int
+    sequence: int
+    prefix: Prefix
+    entries: list[tuple[int, int, memoryview]] # (peer index, originated time, attributes)
+
+class Peer(NamedTuple):
+    """ Peer of a TABLE_DUMP_V2 PEER_INDEX_TABLE.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    bgp_id: int
+    ip: tuple[int, int] # (afi, address)
+    asn: int
@@ -28,3 +28,9 @@ class MRTScenario(BaseModel):
     clear_mongodb: bool
     playback_speed: Optional[int]
     mrt_files: list[str]
+    mrt_file_codecs: dict[str, str] = {}
+    rib_files: list[str] = []
+    compiled_file: Optional[str] = None
+    compiled_interval: Optional[int] = None
+    compiled_digest: Optional[str] = None
+    stats_file: Optional[str] = None
@@ -19,6 +19,7 @@ PEER_NAME_CHOICES = [
     'chinatel', 'cogent', 'dtag', 'gtt', 'hurricane', 'level3', 'ntt', 'pccw', 'rostel', 'seabone', 'swisscom', 'telia',
 ]
 BGP_TYPE_CHOICES = ['rib', 'update']
+OUTPUT_FORMAT_CHOICES = ['text', 'ndjson']
 
 class QueryRequest(BaseModel):
     """ Query request model.
@@ -32,6 +33,17 @@ class QueryRequest(BaseModel):
     peer_name: list[str] # amsix, decix, chinatel, ...
     bgp_type: list[str] # rib, update, ...
 
+class QueryRootResult(BaseModel):
+    """ Query result of one archive root model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    mrt_input_path: Path
+    files: int
+    duplicate_files: int
+    scan_duration: float
+
 class QueryResponse(BaseModel):
     """ Query response model.
 
@@ -40,3 +52,6 @@ class QueryResponse(BaseModel):
     """
     rib_file: Optional[Path]
     mrt_files: list[Path]
+    scan_duration: float = 0
+    filter_duration: float = 0
+    roots: list[QueryRootResult] = []
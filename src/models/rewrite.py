@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.filter import RecordFilter
+from src.models.stats import FileStats
+from pydantic import BaseModel
+from typing import Optional
+from pathlib import Path
+
+CODEC_CHOICES = ['bz2', 'zstd', 'gzip', 'none']
+
+class RewriteTask(BaseModel):
+    """ Rewrite task model of a single MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    source: Path
+    target: Path
+    start: Optional[int] = None # epoch seconds, records before are dropped
+    end: Optional[int] = None # epoch seconds, records at or after are dropped
+    record_filter: Optional[RecordFilter] = None
+    stats: bool = False # collect the statistics of the written records
+    seed_files: list[Path] = [] # RIB dump and update files before the stream of the task the filter is seeded with
+
+class RewriteResult(BaseModel):
+    """ Rewrite result model of a single MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    source: Path
+    target: Path
+    input_records: int
+    output_records: int
+    input_bytes: int # size of the source file on disk
+    output_bytes: int # size of the target file on disk
+    duration: float
+    skipped: bool = False
+    failed: bool = False # the source could not be read or decoded, nothing is written
+    error: Optional[str] = None # the error of a failed file
+    stats: Optional[FileStats] = None # statistics of the target if collected and written
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from pathlib import Path
+
+class RIBSynthesisTask(BaseModel):
+    """ RIB synthesis task model of a single peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    peer_name: str
+    rib_file: Path
+    update_files: list[Path]
+    timestamp: int # epoch seconds of the synthetic RIB
+    target: Path
+
+class RIBSynthesisResult(BaseModel):
+    """ RIB synthesis result model of a single peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    peer_name: str
+    rib_file: Path
+    target: Path
+    update_files: int
+    updates: int
+    peers: int
+    prefixes: int
+    attributes: int # distinct interned path attributes
+    largest_peer_prefixes: int
+    largest_peer_bytes: int
+    trie_bytes: int
+    attribute_bytes: int
+    duration: float
+    failed: bool = False # the RIB dump or an update file could not be read or decoded, nothing is written
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import NamedTuple
+from pydantic import BaseModel
+
+class SeekBlock(NamedTuple):
+    """ Independently decodable block of an MRT file.
+        For bz2 files the bit range of the block, for uncompressed files the whole file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    bit_offset: int
+    bit_end: int
+    uncompressed_offset: int
+
+class SeekEntry(NamedTuple):
+    """ First record of an MRT file with a timestamp greater than all earlier records.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int
+    block: int
+    offset: int # offset of the record within the uncompressed block
+
+class SeekIndexResult(BaseModel):
+    """ Seek index result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    indexed_files: int
+    skipped_files: int
+    failed_files: list[str]
+    blocks: int
+    entries: int
+    duration: float
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from typing import NamedTuple
+
+class MinuteStats(NamedTuple):
+    """ Statistics of one minute of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    timestamp: int # epoch seconds of the start of the minute
+    records: int
+    announcements: int
+    withdrawals: int
+    prefixes: int # unique prefixes, summed over files
+
+class FileStats(BaseModel):
+    """ Statistics of a single MRT file of a scenario.
+        The per-minute counts are stored as parallel lists to keep the sidecar compact.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    size: int # size of the file when the statistics were computed
+    mtime_ns: int # mtime of the file when the statistics were computed
+    records: int
+    announcements: int # announced prefixes
+    withdrawals: int # withdrawn prefixes
+    prefixes: int # unique announced or withdrawn prefixes
+    start: int # epoch seconds of the first record
+    end: int # epoch seconds of the last record
+    minutes: list[int] = [] # epoch seconds of the minutes with records
+    minute_records: list[int] = []
+    minute_announcements: list[int] = []
+    minute_withdrawals: list[int] = []
+    minute_prefixes: list[int] = []
+
+class ScenarioStats(BaseModel):
+    """ Statistics sidecar of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    files: dict[str, FileStats] = {}
+
+class StatsResult(BaseModel):
+    """ Stats update result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    computed_files: int
+    cached_files: int
+    failed_files: list[str]
+    collected_files: int = 0 # statistics collected while the files were rewritten or merged
+    missing_files: list[str] = [] # scenario files that no longer exist
+    duration: float
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+
+class GarbageCollectionResult(BaseModel):
+    """ Garbage collection result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    removed_references: int
+    removed_blobs: int
+    removed_bytes: int
+    remaining_blobs: int
+    remaining_bytes: int
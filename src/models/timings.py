@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from datetime import datetime
+
+class StageTiming(BaseModel):
+    """ Timing of a stage summed over all of its calls model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    name: str # nested stages are joined with a slash, e.g. append/transfer
+    depth: int
+    calls: int = 0
+    wall: float = 0
+    cpu: float = 0
+    files: int = 0
+    bytes: int = 0
+
+class StageEvent(BaseModel):
+    """ Single call of a stage in the timings trace model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    name: str
+    thread: str
+    start: float # seconds since timings were enabled
+    wall: float
+    cpu: float
+    files: int
+    bytes: int
+
+class TimingsTrace(BaseModel):
+    """ Timings trace model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    created: datetime
+    argv: list[str]
+    stages: list[StageTiming]
+    events: list[StageEvent]
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+
+TRANSFER_STRATEGY_CHOICES = ['copy', 'hardlink', 'reflink', 'symlink']
+
+class TransferResult(BaseModel):
+    """ Transfer result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    transferred_files: list[str]
+    skipped_files: list[str]
+    failed_files: list[str]
+    transferred_bytes: int
+    duration: float
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from typing import Optional
+from pathlib import Path
+
+class VerifyFileResult(BaseModel):
+    """ Verify result model of a single MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    path: Path
+    size: int
+    mtime_ns: int
+    records: int
+    error: Optional[str] = None # None if the file is intact
+
+class VerifyResult(BaseModel):
+    """ Verify result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    verified_files: int
+    cached_files: int
+    bad_files: list[VerifyFileResult]
+    verified_bytes: int
+    duration: float
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class WatchResult(BaseModel):
+    """ Watch cycle result model.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    window_start: Optional[datetime]
+    window_end: Optional[datetime]
+    scanned_directories: int
+    added_files: list[str]
+    expired_files: list[str]
+    failed_files: list[str]
+    duration: float
@@ -0,0 +1,548 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.mrt import TABLE_DUMP_V2, BGP4MP, BGP4MP_ET, MRTDecodeError, encode_record
+from src.models.mrt_record import MRTRecord, BGPUpdate, RIBEntry, Peer, Prefix
+from typing import Iterator, Optional
+import struct
+
+AFI_IPV4 = 1
+AFI_IPV6 = 2
+ADDRESS_LENGTH = {AFI_IPV4: 4, AFI_IPV6: 16}
+
+# BGP4MP subtypes
+BGP4MP_MESSAGE = 1
+BGP4MP_MESSAGE_AS4 = 4
+BGP4MP_MESSAGE_LOCAL = 6
+BGP4MP_MESSAGE_AS4_LOCAL = 7
+BGP4MP_MESSAGE_ADDPATH = 8
+BGP4MP_MESSAGE_AS4_ADDPATH = 9
+BGP4MP_MESSAGE_LOCAL_ADDPATH = 10
+BGP4MP_MESSAGE_AS4_LOCAL_ADDPATH = 11
+BGP4MP_MESSAGE_SUBTYPES = {1, 4, 6, 7, 8, 9, 10, 11}
+BGP4MP_AS4_SUBTYPES = {4, 7, 9, 11}
+BGP4MP_ADDPATH_SUBTYPES = {8, 9, 10, 11}
+
+# TABLE_DUMP_V2 subtypes
+PEER_INDEX_TABLE = 1
+RIB_IPV4_UNICAST = 2
+RIB_IPV6_UNICAST = 4
+RIB_SUBTYPES = {2: AFI_IPV4, 3: AFI_IPV4, 4: AFI_IPV6, 5: AFI_IPV6}
+
+# BGP message types and path attributes
+BGP_UPDATE = 2
+ORIGIN = 1
+AS_PATH = 2
+NEXT_HOP = 3
+MP_REACH_NLRI = 14
+MP_UNREACH_NLRI = 15
+AS4_PATH = 17
+AS_SET = 1
+AS_SEQUENCE = 2
+EXTENDED_LENGTH = 0x10
+
+BGP_MARKER = b'\xff' * 16
+UINT16 = struct.Struct('>H')
+UINT32 = struct.Struct('>I')
+
+def decode_prefixes(data: memoryview, afi: int, addpath: bool = False) -> list[Prefix]:
+    """ Decode a list of NLRI encoded prefixes.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            data (memoryview): The encoded prefixes.
+            afi (int): The address family of the prefixes.
+            addpath (bool): Each prefix is preceded by a 4 byte path identifier.
+
+        Returns:
+            list[Prefix]: The decoded prefixes.
+    """
+    prefixes = []
+    width = ADDRESS_LENGTH[afi]
+    offset = 0
+    end = len(data)
+
+    while offset < end:
+        if addpath:
+            offset += 4
+
+        length = data[offset]
+        size = (length + 7) >> 3
+        offset += 1
+
+        if length > width * 8 or offset + size > end:
+            raise MRTDecodeError(f'Invalid prefix of length {length}')
+
+        network = int.from_bytes(data[offset:offset + size], 'big') << ((width - size) << 3)
+        prefixes.append((afi, network, length))
+        offset += size
+
+    return prefixes
+
+def encode_prefix(prefix: Prefix) -> bytes:
+    """ Encode a prefix in NLRI format.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            prefix (Prefix): The prefix.
+
+        Returns:
+            bytes: The encoded prefix.
+    """
+    afi, network, length = prefix
+    width = ADDRESS_LENGTH[afi]
+    size = (length + 7) >> 3
+
+    return bytes([length]) + (network >> ((width - size) << 3)).to_bytes(size, 'big')
+
+def iter_attributes(attributes: memoryview) -> Iterator[tuple[int, int, memoryview]]:
+    """ Iterate the path attributes of an UPDATE message or RIB entry.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            attributes (memoryview): The encoded path attributes.
+
+        Returns:
+            Iterator[tuple[int, int, memoryview]]: The flags, type code and value of each attribute.
+    """
+    offset = 0
+    end = len(attributes)
+
+    while offset + 3 <= end:
+        flags = attributes[offset]
+        type_code = attributes[offset + 1]
+
+        if flags & EXTENDED_LENGTH:
+            length = UINT16.unpack_from(attributes, offset + 2)[0]
+            offset += 4
+        else:
+            length = attributes[offset + 2]
+            offset += 3
+
+        if offset + length > end:
+            raise MRTDecodeError(f'Invalid path attribute {type_code} of length {length}')
+
+        yield flags, type_code, attributes[offset:offset + length]
+        offset += length
+
+def decode_as_path(value: memoryview, as4: bool = True) -> list[int]:
+    """ Decode the AS numbers of an AS_PATH attribute, AS_SET segments are flattened.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            value (memoryview): The AS_PATH attribute value.
+            as4 (bool): AS numbers are 4 bytes long.
+
+        Returns:
+            list[int]: The AS numbers.
+
+        Raises:
+            MRTDecodeError: If a segment exceeds the attribute value.
+    """
+    as_path = []
+    size = 4 if as4 else 2
+    unpack = struct.Struct(f'>{"I" if as4 else "H"}').unpack_from
+    offset = 0
+    end = len(value)
+
+    while offset < end:
+        if offset + 2 > end:
+            raise MRTDecodeError(f'Truncated AS_PATH segment header at offset {offset}')
+
+        count = value[offset + 1]
+        offset += 2
+
+        if offset + count * size > end:
+            raise MRTDecodeError(f'Invalid AS_PATH segment of {count} AS numbers at offset {offset - 2}')
+
+        for index in range(count):
+            as_path.append(unpack(value, offset + index * size)[0])
+        offset += count * size
+
+    return as_path
+
+def get_as_path(attributes: memoryview, as4: bool = True) -> list[int]:
+    """ Get the AS path of path attributes, merging AS4_PATH for 2 byte AS sessions.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            attributes (memoryview): The encoded path attributes.
+            as4 (bool): AS numbers in AS_PATH are 4 bytes long.
+
+        Returns:
+            list[int]: The AS numbers.
+    """
+    as_path = []
+    as4_path = None
+
+    for _, type_code, value in iter_attributes(attributes):
+        if type_code == AS_PATH:
+            as_path = decode_as_path(value, as4)
+        elif type_code == AS4_PATH and not as4:
+            as4_path = decode_as_path(value, True)
+
+    # RFC 6793: the leading AS numbers of AS_PATH are followed by the AS4_PATH
+    if as4_path is not None and len(as4_path) <= len(as_path):
+        return as_path[:len(as_path) - len(as4_path)] + as4_path
+
+    return as_path
+
+def decode_bgp4mp_update(record: MRTRecord) -> Optional[BGPUpdate]:
+    """ Decode the BGP UPDATE message of a BGP4MP record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            record (MRTRecord): The MRT record.
+
+        Returns:
+            Optional[BGPUpdate]: The decoded update or None if the record is not a BGP UPDATE message.
+
+        Raises:
+            MRTDecodeError: If the record is corrupt.
+    """
+    if record.type not in (BGP4MP, BGP4MP_ET) or record.subtype not in BGP4MP_MESSAGE_SUBTYPES:
+        return None
+
+    data = record.data
+    offset = record.header_length
+
+    try:
+        if record.subtype in BGP4MP_AS4_SUBTYPES:
+            as4 = True
+            peer_as = UINT32.unpack_from(data, offset)[0]
+            offset += 8
+        else:
+            as4 = False
+            peer_as = UINT16.unpack_from(data, offset)[0]
+            offset += 4
+
+        afi = UINT16.unpack_from(data, offset + 2)[0]
+        width = ADDRESS_LENGTH[afi]
+        offset += 4
+        peer_ip = (afi, int.from_bytes(data[offset:offset + width], 'big'))
+        offset += 2 * width
+
+        # BGP message header: marker, length, type
+        if data[offset + 18] != BGP_UPDATE:
+            return None
+        message_end = offset + UINT16.unpack_from(data, offset + 16)[0]
+        offset += 19
+
+        addpath = record.subtype in BGP4MP_ADDPATH_SUBTYPES
+
+        withdrawn_length = UINT16.unpack_from(data, offset)[0]
+        offset += 2
+        withdrawn = decode_prefixes(data[offset:offset + withdrawn_length], AFI_IPV4, addpath)
+        offset += withdrawn_length
+
+        attributes_length = UINT16.unpack_from(data, offset)[0]
+        offset += 2
+        attributes = data[offset:offset + attributes_length]
+        offset += attributes_length
+
+        announced = decode_prefixes(data[offset:message_end], AFI_IPV4, addpath)
+
+        for _, type_code, value in iter_attributes(attributes):
+            if type_code == MP_REACH_NLRI:
+                mp_afi = UINT16.unpack_from(value, 0)[0]
+                if mp_afi in ADDRESS_LENGTH:
+                    next_hop_length = value[3]
+                    announced.extend(decode_prefixes(value[5 + next_hop_length:], mp_afi, addpath))
+            elif type_code == MP_UNREACH_NLRI:
+                mp_afi = UINT16.unpack_from(value, 0)[0]
+                if mp_afi in ADDRESS_LENGTH:
+                    withdrawn.extend(decode_prefixes(value[3:], mp_afi, addpath))
+    except (struct.error, IndexError, KeyError) as error:
+        raise MRTDecodeError(f'Corrupt BGP4MP record at {record.timestamp}: {error}') from error
+
+    return BGPUpdate(record.timestamp, record.microsecond, peer_as, peer_ip, withdrawn, announced, attributes, as4)
+
+def decode_peer_index_table(record: MRTRecord) -> Optional[list[Peer]]:
+    """ Decode the peers of a TABLE_DUMP_V2 PEER_INDEX_TABLE record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            record (MRTRecord): The MRT record.
+
+        Returns:
+            Optional[list[Peer]]: The peers or None if the record is not a PEER_INDEX_TABLE.
+    """
+    if record.type != TABLE_DUMP_V2 or record.subtype != PEER_INDEX_TABLE:
+        return None
+
+    data = record.data
+    peers = []
+
+    try:
+        offset = record.header_length + 4
+        offset += 2 + UINT16.unpack_from(data, offset)[0]
+        count = UINT16.unpack_from(data, offset)[0]
+        offset += 2
+
+        for _ in range(count):
+            peer_type = data[offset]
+            bgp_id = UINT32.unpack_from(data, offset + 1)[0]
+            offset += 5
+
+            afi = AFI_IPV6 if peer_type & 1 else AFI_IPV4
+            width = ADDRESS_LENGTH[afi]
+            ip = (afi, int.from_bytes(data[offset:offset + width], 'big'))
+            offset += width
+
+            if peer_type & 2:
+                asn = UINT32.unpack_from(data, offset)[0]
+                offset += 4
+            else:
+                asn = UINT16.unpack_from(data, offset)[0]
+                offset += 2
+
+            peers.append(Peer(bgp_id, ip, asn))
+    except (struct.error, IndexError) as error:
+        raise MRTDecodeError(f'Corrupt PEER_INDEX_TABLE record: {error}') from error
+
+    return peers
+
+def decode_rib_entry(record: MRTRecord) -> Optional[RIBEntry]:
+    """ Decode a TABLE_DUMP_V2 RIB record of a unicast or multicast prefix.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            record (MRTRecord): The MRT record.
+
+        Returns:
+            Optional[RIBEntry]: The decoded RIB entry or None if the record is not an AFI specific RIB record.
+    """
+    if record.type != TABLE_DUMP_V2 or record.subtype not in RIB_SUBTYPES:
+        return None
+
+    data = record.data
+    afi = RIB_SUBTYPES[record.subtype]
+    entries = []
+
+    try:
+        offset = record.header_length
+        sequence = UINT32.unpack_from(data, offset)[0]
+        length = data[offset + 4]
+        size = (length + 7) >> 3
+        offset += 5
+        prefix = (afi, int.from_bytes(data[offset:offset + size], 'big') << ((ADDRESS_LENGTH[afi] - size) << 3), length)
+        offset += size
+
+        count = UINT16.unpack_from(data, offset)[0]
+        offset += 2
+
+        for _ in range(count):
+            peer_index, originated_time = struct.unpack_from('>HI', data, offset)
+            attributes_length = UINT16.unpack_from(data, offset + 6)[0]
+            offset += 8
+            entries.append((peer_index, originated_time, data[offset:offset + attributes_length]))
+            offset += attributes_length
+    except (struct.error, IndexError) as error:
+        raise MRTDecodeError(f'Corrupt RIB record: {error}') from error
+
+    return RIBEntry(record.timestamp, sequence, prefix, entries)
+
+def encode_attribute(type_code: int, value: bytes, flags: int = 0x40) -> bytes:
+    """ Encode a path attribute, the extended length flag is set if necessary.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            type_code (int): The attribute type code.
+            value (bytes): The attribute value.
+            flags (int): The attribute flags, well-known transitive by default.
+
+        Returns:
+            bytes: The encoded attribute.
+    """
+    if len(value) > 255:
+        return bytes([flags | EXTENDED_LENGTH, type_code]) + UINT16.pack(len(value)) + value
+
+    return bytes([flags & ~EXTENDED_LENGTH, type_code, len(value)]) + value
+
+def encode_as_path(as_path: list[int]) -> bytes:
+    """ Encode an AS_PATH attribute with 4 byte AS numbers as AS_SEQUENCE segments.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            as_path (list[int]): The AS numbers.
+
+        Returns:
+            bytes: The encoded attribute.
+    """
+    value = b''
+    for index in range(0, len(as_path), 255):
+        segment = as_path[index:index + 255]
+        value += bytes([AS_SEQUENCE, len(segment)]) + struct.pack(f'>{len(segment)}I', *segment)
+
+    return encode_attribute(AS_PATH, value)
+
+def get_rib_attributes(attributes: memoryview, as4: bool = True) -> bytes:
+    """ Convert the path attributes of an UPDATE message into the form used in TABLE_DUMP_V2 RIB entries.
+        MP_UNREACH_NLRI is dropped, MP_REACH_NLRI only keeps the next hop (RFC 6396) and
+        2 byte AS paths are merged with AS4_PATH into a 4 byte AS_PATH.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            attributes (memoryview): The encoded path attributes of the UPDATE message.
+            as4 (bool): AS numbers in AS_PATH are 4 bytes long.
+
+        Returns:
+            bytes: The encoded path attributes of the RIB entry.
+    """
+    result = b''
+
+    for flags, type_code, value in iter_attributes(attributes):
+        if type_code == MP_UNREACH_NLRI or (type_code == AS4_PATH and not as4):
+            continue
+
+        if type_code == MP_REACH_NLRI:
+            next_hop_length = value[3]
+            result += encode_attribute(type_code, bytes(value[3:4 + next_hop_length]), flags)
+        elif type_code == AS_PATH and not as4:
+            result += encode_as_path(get_as_path(attributes, as4))
+        else:
+            result += encode_attribute(type_code, bytes(value), flags)
+
+    return result
+
+def encode_bgp4mp_update(timestamp: int, peer_as: int, local_as: int, peer_ip: tuple[int, int], local_ip: tuple[int, int], withdrawn: list[Prefix], announced: list[Prefix], attributes: bytes, microsecond: Optional[int] = None) -> bytes:
+    """ Encode a BGP4MP(_ET) MESSAGE_AS4 record of a BGP UPDATE message.
+        IPv4 prefixes are encoded in the message, IPv6 prefixes in MP_REACH_NLRI and MP_UNREACH_NLRI attributes.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds.
+            peer_as (int): The AS number of the peer.
+            local_as (int): The local AS number.
+            peer_ip (tuple[int, int]): The (afi, address) of the peer.
+            local_ip (tuple[int, int]): The (afi, address) of the collector.
+            withdrawn (list[Prefix]): The withdrawn prefixes.
+            announced (list[Prefix]): The announced prefixes.
+            attributes (bytes): The encoded path attributes without MP_REACH_NLRI and MP_UNREACH_NLRI.
+            microsecond (Optional[int]): The microseconds, a BGP4MP_ET record is written if given.
+
+        Returns:
+            bytes: The encoded record.
+    """
+    ipv6_announced = [prefix for prefix in announced if prefix[0] == AFI_IPV6]
+    ipv6_withdrawn = [prefix for prefix in withdrawn if prefix[0] == AFI_IPV6]
+
+    if ipv6_announced:
+        next_hop = peer_ip[1].to_bytes(16, 'big') if peer_ip[0] == AFI_IPV6 else bytes(16)
+        attributes += encode_attribute(
+            MP_REACH_NLRI,
+            UINT16.pack(AFI_IPV6) + bytes([1, 16]) + next_hop + b'\x00' + b''.join(map(encode_prefix, ipv6_announced)),
+            0x80,
+        )
+    if ipv6_withdrawn:
+        attributes += encode_attribute(
+            MP_UNREACH_NLRI,
+            UINT16.pack(AFI_IPV6) + bytes([1]) + b''.join(map(encode_prefix, ipv6_withdrawn)),
+            0x80,
+        )
+
+    withdrawn_routes = b''.join(encode_prefix(prefix) for prefix in withdrawn if prefix[0] == AFI_IPV4)
+    nlri = b''.join(encode_prefix(prefix) for prefix in announced if prefix[0] == AFI_IPV4)
+    payload = UINT16.pack(len(withdrawn_routes)) + withdrawn_routes + UINT16.pack(len(attributes)) + attributes + nlri
+    message = BGP_MARKER + UINT16.pack(19 + len(payload)) + bytes([BGP_UPDATE]) + payload
+
+    width = ADDRESS_LENGTH[peer_ip[0]]
+    body = (
+        struct.pack('>IIHH', peer_as, local_as, 0, peer_ip[0])
+        + peer_ip[1].to_bytes(width, 'big')
+        + local_ip[1].to_bytes(width, 'big')
+        + message
+    )
+
+    return encode_record(
+        timestamp=timestamp,
+        mrt_type=BGP4MP if microsecond is None else BGP4MP_ET,
+        subtype=BGP4MP_MESSAGE_AS4,
+        body=body,
+        microsecond=microsecond,
+    )
+
+def encode_peer_index_table(timestamp: int, collector_bgp_id: int, peers: list[Peer]) -> bytes:
+    """ Encode a TABLE_DUMP_V2 PEER_INDEX_TABLE record with 4 byte AS numbers.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds.
+            collector_bgp_id (int): The BGP identifier of the collector.
+            peers (list[Peer]): The peers.
+
+        Returns:
+            bytes: The encoded record.
+    """
+    body = UINT32.pack(collector_bgp_id) + UINT16.pack(0) + UINT16.pack(len(peers))
+
+    for peer in peers:
+        afi, address = peer.ip
+        body += bytes([(afi == AFI_IPV6) | 2]) + UINT32.pack(peer.bgp_id) + address.to_bytes(ADDRESS_LENGTH[afi], 'big') + UINT32.pack(peer.asn)
+
+    return encode_record(
+        timestamp=timestamp,
+        mrt_type=TABLE_DUMP_V2,
+        subtype=PEER_INDEX_TABLE,
+        body=body,
+    )
+
+def encode_rib_entry(timestamp: int, sequence: int, prefix: Prefix, entries: list[tuple[int, int, bytes]]) -> bytes:
+    """ Encode a TABLE_DUMP_V2 RIB_IPV4_UNICAST or RIB_IPV6_UNICAST record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds.
+            sequence (int): The sequence number of the record.
+            prefix (Prefix): The prefix.
+            entries (list[tuple[int, int, bytes]]): The (peer index, originated time, attributes) of each entry.
+
+        Returns:
+            bytes: The encoded record.
+    """
+    body = UINT32.pack(sequence) + encode_prefix(prefix) + UINT16.pack(len(entries))
+
+    for peer_index, originated_time, attributes in entries:
+        body += struct.pack('>HIH', peer_index, originated_time, len(attributes)) + bytes(attributes)
+
+    return encode_record(
+        timestamp=timestamp,
+        mrt_type=TABLE_DUMP_V2,
+        subtype=RIB_IPV4_UNICAST if prefix[0] == AFI_IPV4 else RIB_IPV6_UNICAST,
+        body=body,
+    )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.manifest import Manifest, ManifestScenario, BuildResult
+from src.services.scenario import SCENARIO_FILE, load_scenario, save_scenario
+from concurrent.futures import Executor, ThreadPoolExecutor
+from src.services.transfer import transfer_files
+from src.services.snapshot import ArchiveSnapshot
+from src.models.mrt_scenario import MRTScenario
+from src.services.store import store_files
+from typing import Optional
+from pathlib import Path
+from uuid import uuid4
+import json
+import time
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+YAML_SUFFIXES = ['.yaml', '.yml']
+
+def load_manifest(manifest_path: Path) -> Manifest:
+    """ Load a YAML or JSON manifest file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            manifest_path (Path): The path to the manifest file.
+
+        Returns:
+            Manifest: The manifest.
+
+        Raises:
+            ValueError: If the manifest is a YAML file and PyYAML is not installed.
+    """
+    if manifest_path.suffix in YAML_SUFFIXES:
+        if not yaml:
+            raise ValueError('PyYAML is required to read YAML manifests, install it with pip3 install pyyaml')
+
+        data = yaml.safe_load(manifest_path.read_text())
+    else:
+        data = json.loads(manifest_path.read_text())
+
+    return Manifest.model_validate(data)
+
+def _build_scenario(definition: ManifestScenario, scenario_path: Path, mrt_files: list[Path], executor: Executor, strategy: str, checksum: bool, store_path: Optional[Path]) -> BuildResult:
+    """ Create or update a single scenario of a manifest and transfer its MRT files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            definition (ManifestScenario): The scenario definition.
+            scenario_path (Path): The path to the scenario directory.
+            mrt_files (list[Path]): The resolved MRT files of the scenario.
+            executor (Executor): The executor shared by all scenarios limiting concurrent I/O.
+            strategy (str): The transfer strategy.
+            checksum (bool): Compare checksums to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store.
+
+        Returns:
+            BuildResult: The build result of the scenario.
+    """
+    start_time = time.perf_counter()
+
+    scenario_path.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    settings = definition.model_dump(
+        exclude={'path', 'queries', 'name'},
+    )
+
+    # Keep the existing scenario, so the build can be re-run incrementally
+    if (scenario_path / SCENARIO_FILE).exists():
+        scenario = load_scenario(scenario_path).model_copy(
+            update=settings,
+        )
+        scenario.name = definition.name or scenario.name
+    else:
+        scenario = MRTScenario(
+            name=definition.name or f'Scenario {str(uuid4())}',
+            mrt_files=[],
+            **settings,
+        )
+
+    if store_path:
+        transfer_result = store_files(
+            store_path=store_path,
+            sources=mrt_files,
+            target_directory=scenario_path,
+            executor=executor,
+            show_progress=False,
+        )
+    else:
+        transfer_result = transfer_files(
+            sources=mrt_files,
+            target_directory=scenario_path,
+            strategy=strategy,
+            checksum=checksum,
+            executor=executor,
+            show_progress=False,
+        )
+
+    scenario.mrt_files.extend(transfer_result.transferred_files)
+    scenario.mrt_files.extend(transfer_result.skipped_files)
+
+    save_scenario(
+        scenario_output_path=scenario_path,
+        scenario=scenario,
+    )
+
+    return BuildResult(
+        path=definition.path,
+        mrt_files=len(mrt_files),
+        transferred_files=len(transfer_result.transferred_files),
+        skipped_files=len(transfer_result.skipped_files),
+        failed_files=len(transfer_result.failed_files),
+        transferred_bytes=transfer_result.transferred_bytes,
+        duration=time.perf_counter() - start_time,
+    )
+
+def build_scenarios(manifest: Manifest, scenario_output_path: Path, snapshot: ArchiveSnapshot, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None) -> list[BuildResult]:
+    """ Build all scenarios of a manifest.
+        The archive is scanned once for all queries and the scenarios are materialized concurrently,
+        sharing one executor so that at most jobs files are transferred at the same time.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            manifest (Manifest): The manifest.
+            scenario_output_path (Path): The directory scenario paths are relative to.
+            snapshot (ArchiveSnapshot): The archive snapshot to resolve the queries against.
+            strategy (str): The transfer strategy.
+            jobs (int): The maximum number of concurrent transfers over all scenarios.
+            checksum (bool): Compare checksums to skip files already in the scenarios.
+            store_path (Optional[Path]): The path to the shared MRT store.
+
+        Returns:
+            list[BuildResult]: The build result of each scenario.
+    """
+    snapshot.prepare(
+        requests=[query for definition in manifest.scenarios for query in definition.queries],
+    )
+
+    resolved = []
+    for definition in manifest.scenarios:
+        mrt_files = {}
+
+        for query in definition.queries:
+            for mrt_file in snapshot.query(query).mrt_files:
+                mrt_files[mrt_file] = None
+
+        resolved.append((definition, list(mrt_files)))
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as io_executor, ThreadPoolExecutor(max_workers=max(len(resolved), 1)) as scenario_executor:
+        futures = [
+            scenario_executor.submit(
+                _build_scenario,
+                definition,
+                scenario_output_path / definition.path,
+                mrt_files,
+                io_executor,
+                strategy,
+                checksum,
+                store_path,
+            )
+            for definition, mrt_files in resolved
+        ]
+
+        return [future.result() for future in futures]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import Optional
+from pathlib import Path
+from rich import print
+import hashlib
+import os
+
+# Cache files that cannot be written next to a read-only archive go to the cache directory of the user
+USER_CACHE_DIRECTORY = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'mrtawk'
+
+def get_fallback_path(path: Path) -> Path:
+    """ Get the path in the user cache directory a cache file is written to if its directory is read-only.
+        The name is keyed by the absolute path of the cache file, so the caches of different archives do not collide.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the cache file.
+
+        Returns:
+            Path: The fallback path.
+    """
+    digest = hashlib.blake2b(str(path.absolute()).encode(), digest_size=8).hexdigest()
+
+    return USER_CACHE_DIRECTORY / f'{digest}-{path.name}'
+
+def load_cache_files(path: Path) -> list[str]:
+    """ Read a cache file and its fallback in the user cache directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the cache file.
+
+        Returns:
+            list[str]: The contents of the readable files, the fallback last as it is written after the cache file failed.
+    """
+    contents = []
+
+    for candidate in (path, get_fallback_path(path)):
+        try:
+            contents.append(candidate.read_text())
+        except OSError:
+            continue
+
+    return contents
+
+def save_cache_file(path: Path, data: str) -> Optional[Path]:
+    """ Write a cache file atomically, falling back to the user cache directory if it cannot be written, e.g. in a read-only archive.
+        A cache that cannot be written at all only costs the work again and is reported instead of raised.
+        The data is expected to include the contents of the fallback, which is removed once the cache file is written.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the cache file.
+            data (str): The contents.
+
+        Returns:
+            Optional[Path]: The path the cache was written to or None.
+    """
+    for target in (path, get_fallback_path(path)):
+        try:
+            target.parent.mkdir(
+                parents=True,
+                exist_ok=True,
+            )
+
+            temporary = target.with_name(f'.{target.name}.tmp')
+            temporary.write_text(data)
+            os.replace(temporary, target)
+
+            # The merged contents of the fallback are now in the cache file
+            if target == path:
+                get_fallback_path(path).unlink(missing_ok=True)
+
+            return target
+        except OSError as error:
+            last_error = error
+
+    print(f'[red]\[warning][/] Cannot write the cache [purple]{path}[/]: {last_error}')
+
+    return None
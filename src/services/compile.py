@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.compile import Bucket, CompileResult
+from src.services.merge import iter_merged_records
+from src.models.mrt_scenario import MRTScenario
+from typing import Iterator
+from pathlib import Path
+from rich import print
+import hashlib
+import struct
+import mmap
+import time
+import os
+
+COMPILED_FILE = 'scenario.buckets'
+
+# Layout: header, the raw MRT records of all buckets, the bucket table and a footer pointing to the table
+MAGIC = b'MRTAWKB1'
+HEADER = struct.Struct('<8sI')
+BUCKET = struct.Struct('<IIQQ')
+FOOTER = struct.Struct('<QQ8s')
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+def get_mrt_files_digest(mrt_files: list[str]) -> str:
+    """ Get a digest of the MRT files of a scenario, used to detect stale compiled files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[str]): The MRT file names.
+
+        Returns:
+            str: The hex digest.
+    """
+    return hashlib.blake2b(
+        '\n'.join(sorted(mrt_files)).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+def is_compiled_fresh(scenario_output_path: Path, scenario: MRTScenario, interval: int) -> bool:
+    """ Check whether the compiled file of a scenario exists and matches its MRT files and interval.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            scenario (MRTScenario): The scenario.
+            interval (int): The bucket interval in seconds.
+
+        Returns:
+            bool: True if the compiled file can be replayed as is.
+    """
+    return (
+        scenario.compiled_file is not None
+        and scenario.compiled_interval == interval
+        and scenario.compiled_digest == get_mrt_files_digest(scenario.mrt_files)
+        and (scenario_output_path / scenario.compiled_file).exists()
+    )
+
+def compile_scenario(scenario_output_path: Path, scenario: MRTScenario, interval: int) -> CompileResult:
+    """ Compile the MRT files of a scenario into a file of time buckets.
+        Each bucket holds the raw MRT records of one interval in timestamp order, so playback
+        reads the buckets sequentially instead of decompressing, parsing and grouping the records.
+        Files that cannot be read or decoded are skipped and reported in the result.
+        The scenario is updated with the compiled file but not saved.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            scenario (MRTScenario): The scenario.
+            interval (int): The bucket interval in seconds.
+
+        Returns:
+            CompileResult: The compile result.
+    """
+    start_time = time.perf_counter()
+    target = scenario_output_path / COMPILED_FILE
+    temporary = target.with_name(f'.{target.name}.tmp')
+    failed_files = []
+    buckets = []
+    records = 0
+
+    with open(temporary, 'wb', buffering=WRITE_BUFFER_SIZE) as file:
+        file.write(HEADER.pack(MAGIC, interval))
+        offset = HEADER.size
+
+        bucket_timestamp = None
+        bucket_offset = offset
+        bucket_records = 0
+
+        for timestamp, _, data in iter_merged_records(
+            mrt_files=[scenario_output_path / mrt_file for mrt_file in scenario.mrt_files],
+            failed_files=failed_files,
+        ):
+            timestamp -= timestamp % interval
+
+            if timestamp != bucket_timestamp:
+                if bucket_records:
+                    buckets.append(Bucket(bucket_timestamp, bucket_records, bucket_offset, offset - bucket_offset))
+
+                bucket_timestamp = timestamp
+                bucket_offset = offset
+                bucket_records = 0
+
+            file.write(data)
+            offset += len(data)
+            bucket_records += 1
+            records += 1
+
+        if bucket_records:
+            buckets.append(Bucket(bucket_timestamp, bucket_records, bucket_offset, offset - bucket_offset))
+
+        for bucket in buckets:
+            file.write(BUCKET.pack(*bucket))
+        file.write(FOOTER.pack(offset, len(buckets), MAGIC))
+
+    os.replace(temporary, target)
+
+    for path, error in failed_files:
+        print(f'[red]\[warning][/] Cannot compile [purple]{path}[/]: {error}')
+
+    scenario.compiled_file = target.name
+    scenario.compiled_interval = interval
+    scenario.compiled_digest = get_mrt_files_digest(scenario.mrt_files)
+
+    return CompileResult(
+        target=target,
+        interval=interval,
+        buckets=len(buckets),
+        records=records,
+        output_bytes=target.stat().st_size,
+        duration=time.perf_counter() - start_time,
+        failed_files=[Path(path).name for path, _ in failed_files],
+    )
+
+def read_buckets(path: Path) -> tuple[int, list[Bucket]]:
+    """ Read the interval and bucket table of a compiled file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the compiled file.
+
+        Returns:
+            tuple[int, list[Bucket]]: The bucket interval in seconds and the buckets.
+
+        Raises:
+            ValueError: If the file is not a compiled file.
+    """
+    with open(path, 'rb') as file:
+        magic, interval = HEADER.unpack(file.read(HEADER.size))
+        file.seek(-FOOTER.size, os.SEEK_END)
+        table_offset, count, footer_magic = FOOTER.unpack(file.read(FOOTER.size))
+
+        if magic != MAGIC or footer_magic != MAGIC:
+            raise ValueError(f'{path} is not a compiled playback file')
+
+        file.seek(table_offset)
+        table = file.read(count * BUCKET.size)
+
+    return interval, [Bucket(*fields) for fields in BUCKET.iter_unpack(table)]
+
+def iter_buckets(path: Path) -> Iterator[tuple[Bucket, bytes]]:
+    """ Iterate the buckets of a compiled file in timestamp order.
+        The records of each bucket are read from the memory mapped file in one slice and can be sent as one batch.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the compiled file.
+
+        Returns:
+            Iterator[tuple[Bucket, bytes]]: The buckets and their raw MRT records.
+    """
+    _, buckets = read_buckets(path)
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        if hasattr(mapped, 'madvise'):
+            mapped.madvise(mmap.MADV_SEQUENTIAL)
+
+        for bucket in buckets:
+            yield bucket, mapped[bucket.offset:bucket.offset + bucket.length]
@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.filename import parse_mrt_file_name
+from src.services.snapshot import ArchiveSnapshot
+from src.services.index import INDEX_DIRECTORY
+from src.services.walk import compile_layout, _can_intersect
+from src.services.filename import to_epoch
+from src.models.query import QueryRequest
+from src.models.mrt_file import MRTFileName
+from src.models.daemon import DaemonResponse
+from pydantic import ValidationError
+from typing import Iterator, Optional
+from pathlib import Path
+from rich import print
+import asyncio
+import signal
+import socket
+import time
+import os
+
+DAEMON_SOCKET_FILE = 'daemon.sock'
+DAEMON_REFRESH_INTERVAL = 2.0
+
+def get_socket_path(mrt_input_path: Path) -> Path:
+    """ Get the path of the query daemon socket of an MRT input directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            Path: The path to the Unix domain socket.
+    """
+    return mrt_input_path / INDEX_DIRECTORY / DAEMON_SOCKET_FILE
+
+class ArchiveCatalogue(ArchiveSnapshot):
+    """ Complete in-memory catalogue of the MRT archive kept by the query daemon.
+        The mtime of every directory is remembered, so a refresh only lists directories
+        whose entries changed and unchanged subtrees are descended into from memory.
+        With an archive layout, only directories matching the layout are catalogued.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, mrt_input_path: Path, layout: Optional[str] = None):
+        """ Initialize an empty archive catalogue.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                mrt_input_path (Path): The path to the MRT input directory.
+                layout (Optional[str]): The archive layout template used to prune rescans.
+        """
+        super().__init__(
+            mrt_input_path=mrt_input_path,
+            layout=layout,
+        )
+        self.use_index = False
+        # The mtime, subdirectories, MRT files and number of unparseable MRT file names of every directory
+        self.directories: dict[str, tuple[int, list[str], dict[Path, MRTFileName], int]] = {}
+        self.listed_directories = 0
+
+    @property
+    def unparseable_files(self) -> int:
+        """ Get the number of MRT files whose names cannot be parsed as of the last scan.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Returns:
+                int: The number of unparseable MRT file names.
+        """
+        return sum(directory[3] for directory in self.directories.values())
+
+    def rescan(self, request: Optional[QueryRequest] = None) -> Optional[dict[Path, MRTFileName]]:
+        """ Rescan the directories of the archive whose mtime changed since the last scan.
+            Only touches the directory state, so it can run in a worker thread while queries are answered.
+            With an archive layout, directories not matching the layout are skipped,
+            and if a request is given too, directories that cannot intersect the request are dropped.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (Optional[QueryRequest]): The query request used for pruning.
+
+            Returns:
+                Optional[dict[Path, MRTFileName]]: All MRT files of the catalogue or None if nothing changed.
+        """
+        segments = compile_layout(self.layout) if self.layout else []
+        start = to_epoch(request.start_datetime) if request else 0
+        end = to_epoch(request.end_datetime) if request else 0
+
+        def descend(subdirectories: list[str], depth: int, fields: dict[str, str]):
+            for subdirectory in subdirectories:
+                if depth < len(segments):
+                    match = segments[depth].fullmatch(os.path.basename(subdirectory))
+                    if not match:
+                        continue
+
+                    child_fields = {**fields, **match.groupdict()}
+                    if request and not _can_intersect(child_fields, request, start, end):
+                        continue
+                else:
+                    child_fields = fields
+
+                pending.append((subdirectory, depth + 1, child_fields))
+
+        directories = {}
+        changed = not self.directories
+        pending = [('', 0, {})]
+        self.listed_directories = 0
+
+        while pending:
+            relative_directory, depth, fields = pending.pop()
+
+            try:
+                mtime_ns = os.stat(self.mrt_input_path / relative_directory).st_mtime_ns
+            except FileNotFoundError:
+                changed = True
+                continue
+
+            known = self.directories.get(relative_directory)
+
+            # The directory entries did not change, descend using the known subdirectories
+            if known and known[0] == mtime_ns:
+                directories[relative_directory] = known
+                descend(known[1], depth, fields)
+                continue
+
+            changed = True
+            subdirectories = []
+            files = {}
+            unparseable_files = 0
+            self.listed_directories += 1
+
+            try:
+                with os.scandir(self.mrt_input_path / relative_directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if entry.name != INDEX_DIRECTORY:
+                                subdirectories.append(os.path.join(relative_directory, entry.name))
+                            continue
+
+                        if not entry.name.endswith('.bz2'):
+                            continue
+
+                        mrt_file_name = parse_mrt_file_name(entry.name)
+                        if not mrt_file_name:
+                            unparseable_files += 1
+                            continue
+
+                        files[Path(entry.path)] = mrt_file_name
+            except FileNotFoundError:
+                continue
+
+            directories[relative_directory] = (mtime_ns, subdirectories, files, unparseable_files)
+            descend(subdirectories, depth, fields)
+
+        # Directories that disappeared are only noticed by their missing entry
+        changed = changed or directories.keys() != self.directories.keys()
+        self.directories = directories
+
+        if not changed:
+            return None
+
+        return {
+            path: mrt_file_name
+            for _, _, files, _ in directories.values()
+            for path, mrt_file_name in files.items()
+        }
+
+    def apply(self, records: dict[Path, MRTFileName]):
+        """ Replace the MRT files of the catalogue with the result of a rescan.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                records (dict[Path, MRTFileName]): All MRT files of the archive.
+        """
+        self.records = records
+        self.sorted_records = sorted((mrt_file_name, path) for path, mrt_file_name in records.items())
+        self.timestamps = [mrt_file_name.timestamp for mrt_file_name, _ in self.sorted_records]
+        self.complete = True
+
+    def _scan(self, request: QueryRequest):
+        """ Scan the whole archive, the request is not used for pruning, only the archive layout is.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+        """
+        records = self.rescan()
+        if records is not None:
+            self.apply(records)
+
+        self.complete = True
+
+class DaemonSnapshot(ArchiveSnapshot):
+    """ Archive snapshot answering all queries through a running query daemon.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, mrt_input_path: Path, connection: socket.socket):
+        """ Initialize a snapshot on top of a connected daemon socket.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                mrt_input_path (Path): The path to the MRT input directory.
+                connection (socket.socket): The connected Unix domain socket.
+        """
+        super().__init__(
+            mrt_input_path=mrt_input_path,
+        )
+        self.use_index = False
+        self.complete = True
+        self.connection = connection
+        self.stream = connection.makefile('rwb')
+
+    def request(self, request: QueryRequest) -> DaemonResponse:
+        """ Send a query request to the daemon and wait for its response.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                DaemonResponse: The daemon response.
+
+            Raises:
+                ValueError: If the daemon closed the connection or rejected the request.
+        """
+        self.stream.write(request.model_dump_json().encode() + b'\n')
+        self.stream.flush()
+
+        line = self.stream.readline()
+        if not line:
+            raise ValueError('Query daemon closed the connection')
+
+        response = DaemonResponse.model_validate_json(line)
+        if response.error:
+            raise ValueError(f'Query daemon rejected the request: {response.error}')
+
+        return response
+
+    def iterate(self, request: QueryRequest) -> Iterator[tuple[MRTFileName, Path]]:
+        """ Iterate the MRT files matching a request in timestamp order as answered by the daemon.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the matching MRT files.
+        """
+        for timestamp, vendor, peer_name, bgp_type, path in self.request(request).files:
+            yield MRTFileName(timestamp, vendor, peer_name, bgp_type), Path(path)
+
+def connect_daemon(mrt_input_path: Path, socket_path: Optional[Path] = None) -> Optional[DaemonSnapshot]:
+    """ Connect to the query daemon of an MRT input directory if it is running.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            socket_path (Optional[Path]): The path to the Unix domain socket, defaults to .mrtawk/daemon.sock of the archive.
+
+        Returns:
+            Optional[DaemonSnapshot]: The snapshot answering queries through the daemon or None if no daemon is running.
+    """
+    socket_path = socket_path or get_socket_path(mrt_input_path)
+
+    if not socket_path.exists():
+        return None
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        connection.connect(str(socket_path))
+    except OSError:
+        # A stale socket file of a daemon that did not shut down cleanly
+        connection.close()
+        return None
+
+    return DaemonSnapshot(
+        mrt_input_path=mrt_input_path,
+        connection=connection,
+    )
+
+async def _handle_client(catalogue: ArchiveCatalogue, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """ Answer the query requests of one client, one JSON line per request and response, until it disconnects.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            catalogue (ArchiveCatalogue): The archive catalogue.
+            reader (asyncio.StreamReader): The client stream reader.
+            writer (asyncio.StreamWriter): The client stream writer.
+    """
+    try:
+        while line := await reader.readline():
+            start_time = time.perf_counter()
+
+            try:
+                request = QueryRequest.model_validate_json(line)
+            except ValidationError as error:
+                response = DaemonResponse(
+                    error=str(error),
+                )
+            else:
+                response = DaemonResponse(
+                    files=[
+                        (*mrt_file_name, str(path))
+                        for mrt_file_name, path in catalogue.iterate(request)
+                    ],
+                    catalogue_files=len(catalogue.sorted_records),
+                )
+
+            response.duration = time.perf_counter() - start_time
+
+            writer.write(response.model_dump_json().encode() + b'\n')
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+async def _refresh(catalogue: ArchiveCatalogue, interval: float):
+    """ Periodically pick up new and removed MRT files of the archive.
+        Directories are rescanned in a worker thread and the result is applied in the event loop,
+        so queries never see a partially updated catalogue.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            catalogue (ArchiveCatalogue): The archive catalogue.
+            interval (float): The seconds between two rescans.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        await asyncio.sleep(interval)
+
+        records = await loop.run_in_executor(None, catalogue.rescan)
+        if records is None:
+            continue
+
+        catalogue.apply(records)
+        print(f'[yellow]\[info][/] Archive changed, catalogue has [red]{len(catalogue.sorted_records)}[/] MRT files')
+
+async def _serve(catalogue: ArchiveCatalogue, socket_path: Path, interval: float):
+    """ Serve query requests on a Unix domain socket until cancelled.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            catalogue (ArchiveCatalogue): The archive catalogue.
+            socket_path (Path): The path to the Unix domain socket.
+            interval (float): The seconds between two archive rescans.
+    """
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: _handle_client(catalogue, reader, writer),
+        path=str(socket_path),
+    )
+    refresh = asyncio.create_task(_refresh(catalogue, interval))
+
+    # Stop like on an interrupt, so the socket file is removed
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    print(f'[yellow]\[info][/] Listening on [purple]{socket_path}[/]')
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        refresh.cancel()
+
+def serve(mrt_input_path: Path, socket_path: Optional[Path] = None, interval: float = DAEMON_REFRESH_INTERVAL, layout: Optional[str] = None) -> ArchiveCatalogue:
+    """ Load the archive catalogue and serve query requests on a Unix domain socket until interrupted.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            socket_path (Optional[Path]): The path to the Unix domain socket, defaults to .mrtawk/daemon.sock of the archive.
+            interval (float): The seconds between two archive rescans.
+            layout (Optional[str]): The archive layout template, directories not matching it are not catalogued.
+
+        Returns:
+            ArchiveCatalogue: The archive catalogue after the daemon stopped.
+
+        Raises:
+            ValueError: If a daemon is already listening on the socket.
+    """
+    socket_path = socket_path or get_socket_path(mrt_input_path)
+    socket_path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    if socket_path.exists():
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+        try:
+            probe.connect(str(socket_path))
+        except OSError:
+            socket_path.unlink()
+        else:
+            raise ValueError(f'A query daemon is already listening on {socket_path}')
+        finally:
+            probe.close()
+
+    catalogue = ArchiveCatalogue(
+        mrt_input_path=mrt_input_path,
+        layout=layout,
+    )
+    catalogue.apply(catalogue.rescan())
+
+    if catalogue.unparseable_files:
+        print(f'[red]\[warning][/] Cannot parse [red]{catalogue.unparseable_files}[/] MRT file names')
+
+    print(
+        f'[yellow]\[info][/] Catalogue loaded\n',
+        f'   directories [red]{len(catalogue.directories)}[/]\n',
+        f'   mrt files [red]{len(catalogue.sorted_records)}[/]\n',
+    )
+
+    try:
+        asyncio.run(_serve(catalogue, socket_path, interval))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    finally:
+        socket_path.unlink(missing_ok=True)
+
+    return catalogue
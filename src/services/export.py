@@ -0,0 +1,456 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+from src.models.export import EXPORT_COLUMNS, ExportPeer, ExportChunk, ExportManifest, ExportResult
+from src.services.bgp import AFI_IPV4, decode_bgp4mp_update, get_as_path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.services.filename import parse_mrt_file_name
+from src.services.mrt import CODEC_SUFFIXES, MRTDecodeError, iter_records
+from typing import Iterator, Optional
+from pathlib import Path
+from array import array
+from rich import print
+import ipaddress
+import shutil
+import struct
+import time
+import sys
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+EXPORT_MANIFEST = 'export.json'
+
+NPY_MAGIC = b'\x93NUMPY\x01\x00'
+NPY_HEADER_LENGTH = struct.Struct('<H')
+# array typecodes of the column dtypes
+NPY_TYPECODES = {
+    '<u4': 'I',
+    '<u2': 'H',
+    '|u1': 'B',
+    '<u8': 'Q',
+    '|b1': 'B',
+}
+
+def _require_numpy():
+    """ Make sure the optional numpy package is installed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Raises:
+            ValueError: If numpy is not installed.
+    """
+    if not numpy:
+        raise ValueError('numpy is required to load exported columns, install it with pip3 install numpy')
+
+def _write_npy(path: Path, dtype: str, values: array):
+    """ Write a one-dimensional array in the NumPy .npy format, so it can be memory-mapped with numpy.load.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the .npy file.
+            dtype (str): The NumPy dtype of the values.
+            values (array): The values.
+    """
+    header = f"{{'descr': '{dtype}', 'fortran_order': False, 'shape': ({len(values)},), }}"
+    # The data starts 64 byte aligned, the header is padded with spaces and ends with a newline
+    header += ' ' * (-(len(NPY_MAGIC) + NPY_HEADER_LENGTH.size + len(header) + 1) % 64) + '\n'
+
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values = array(values.typecode, values)
+        values.byteswap()
+
+    with path.open('wb') as file:
+        file.write(NPY_MAGIC + NPY_HEADER_LENGTH.pack(len(header)) + header.encode('latin1'))
+        values.tofile(file)
+
+def _read_npy(path: Path, dtype: str) -> array:
+    """ Read a one-dimensional array written by _write_npy.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the .npy file.
+            dtype (str): The NumPy dtype of the values.
+
+        Returns:
+            array: The values.
+    """
+    data = path.read_bytes()
+    offset = len(NPY_MAGIC) + NPY_HEADER_LENGTH.size + NPY_HEADER_LENGTH.unpack_from(data, len(NPY_MAGIC))[0]
+
+    values = array(NPY_TYPECODES[dtype])
+    values.frombytes(data[offset:])
+
+    if sys.byteorder == 'big' and values.itemsize > 1:
+        values.byteswap()
+
+    return values
+
+def get_chunk_name(mrt_file: Path) -> str:
+    """ Get the name of the export chunk of an MRT file, the file name without the codec suffix.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_file (Path): The MRT file.
+
+        Returns:
+            str: The chunk name.
+    """
+    return mrt_file.name.removesuffix(mrt_file.suffix) if mrt_file.suffix in CODEC_SUFFIXES else mrt_file.name
+
+def export_file(source: Path, target: Path) -> tuple[ExportChunk, list[ExportPeer]]:
+    """ Decode the BGP updates of an MRT file into one row per announced or withdrawn prefix and write the columns as .npy files.
+        The peer column refers to the returned peers of this file and is remapped to the peers of the manifest afterwards.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            source (Path): The MRT file.
+            target (Path): The chunk directory the column files are written to.
+
+        Returns:
+            tuple[ExportChunk, list[ExportPeer]]: The chunk and its peers.
+    """
+    columns = {
+        name: array(NPY_TYPECODES[dtype])
+        for name, dtype in EXPORT_COLUMNS.items()
+    }
+    timestamps, microseconds, peers, afis, prefix_highs, prefix_lows, prefix_lengths, origin_asns, as_path_lengths, announces = columns.values()
+
+    mrt_file_name = parse_mrt_file_name(source.name)
+    collector = mrt_file_name.peer_name if mrt_file_name else ''
+    peer_indexes = {}
+
+    for record in iter_records(source):
+        update = decode_bgp4mp_update(record)
+        if not update:
+            continue
+
+        peer_key = (update.peer_ip, update.peer_as)
+        peer = peer_indexes.setdefault(peer_key, len(peer_indexes))
+
+        as_path = get_as_path(update.attributes, update.as4) if update.announced else []
+
+        for prefixes, announce, origin_asn, as_path_length in (
+            (update.withdrawn, 0, 0, 0),
+            (update.announced, 1, as_path[-1] if as_path else 0, len(as_path)),
+        ):
+            for afi, network, length in prefixes:
+                timestamps.append(update.timestamp)
+                microseconds.append(update.microsecond)
+                peers.append(peer)
+                afis.append(afi)
+                prefix_highs.append(network >> 64)
+                prefix_lows.append(network & 0xffffffffffffffff)
+                prefix_lengths.append(length)
+                origin_asns.append(origin_asn)
+                as_path_lengths.append(min(as_path_length, 0xffff))
+                announces.append(announce)
+
+    target.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    for name, values in columns.items():
+        _write_npy(target / f'{name}.npy', EXPORT_COLUMNS[name], values)
+
+    stat = source.stat()
+
+    return ExportChunk(
+        name=target.name,
+        source=source,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        timestamp=mrt_file_name.timestamp if mrt_file_name else 0,
+        rows=len(timestamps),
+    ), [
+        ExportPeer(
+            collector=collector,
+            ip=str(ipaddress.IPv4Address(address) if afi == AFI_IPV4 else ipaddress.IPv6Address(address)),
+            asn=asn,
+        )
+        for (afi, address), asn in peer_indexes
+    ]
+
+def load_manifest(export_path: Path) -> ExportManifest:
+    """ Load the manifest of an export directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            export_path (Path): The path to the export directory.
+
+        Returns:
+            ExportManifest: The manifest, empty if the directory has not been exported to yet.
+    """
+    if not (export_path / EXPORT_MANIFEST).exists():
+        return ExportManifest()
+
+    return ExportManifest.model_validate_json(
+        json_data=(export_path / EXPORT_MANIFEST).read_text(),
+    )
+
+def save_manifest(export_path: Path, manifest: ExportManifest):
+    """ Write the manifest of an export directory atomically.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            export_path (Path): The path to the export directory.
+            manifest (ExportManifest): The manifest.
+    """
+    manifest.chunks.sort(key=lambda chunk: (chunk.timestamp, chunk.name))
+
+    temporary = export_path / f'.{EXPORT_MANIFEST}.tmp'
+    temporary.write_text(
+        data=manifest.model_dump_json(
+            indent=4,
+        ),
+    )
+    os.replace(temporary, export_path / EXPORT_MANIFEST)
+
+def is_chunk_fresh(export_path: Path, chunk: Optional[ExportChunk], mrt_file: Path) -> bool:
+    """ Check whether the chunk of an MRT file was exported from the current version of the file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            export_path (Path): The path to the export directory.
+            chunk (Optional[ExportChunk]): The chunk of the manifest.
+            mrt_file (Path): The MRT file.
+
+        Returns:
+            bool: True if the chunk is up to date.
+    """
+    if not chunk or not (export_path / chunk.name).is_dir():
+        return False
+
+    stat = mrt_file.stat()
+
+    return chunk.size == stat.st_size and chunk.mtime_ns == stat.st_mtime_ns
+
+def export_files(mrt_files: list[Path], export_path: Path, jobs: int = 4, force: bool = False) -> ExportResult:
+    """ Export the BGP updates of MRT files to columnar .npy files in parallel worker processes.
+        Every MRT file becomes a chunk directory with one file per column, chunks of unchanged files are kept.
+        Files that cannot be read or decoded are reported as failed and lose their outdated chunk, the other files are still exported.
+        The manifest is saved even if the export is aborted, so the exported chunks are kept.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The MRT files.
+            export_path (Path): The path to the export directory.
+            jobs (int): The number of worker processes.
+            force (bool): Export files with an up to date chunk again.
+
+        Returns:
+            ExportResult: The export result.
+
+        Raises:
+            ValueError: If the export has more peers than the peer column can refer to.
+    """
+    start_time = time.perf_counter()
+
+    export_path.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    manifest = load_manifest(export_path)
+    chunks = {chunk.name: chunk for chunk in manifest.chunks}
+    peer_indexes = {
+        (peer.collector, peer.ip, peer.asn): index
+        for index, peer in enumerate(manifest.peers)
+    }
+
+    pending = [
+        mrt_file
+        for mrt_file in mrt_files
+        if force or not is_chunk_fresh(export_path, chunks.get(get_chunk_name(mrt_file)), mrt_file)
+    ]
+    result = ExportResult(
+        exported_files=0,
+        skipped_files=len(mrt_files) - len(pending),
+        rows=0,
+        input_bytes=0,
+        output_bytes=0,
+        duration=0,
+    )
+
+    try:
+        _export_pending(pending, export_path, manifest, chunks, peer_indexes, result, jobs)
+    finally:
+        # Files exported now replace their earlier failures, failures of other files are kept
+        failed_files = set(manifest.failed_files) - set(mrt_files)
+        failed_files.update(mrt_file for mrt_file in pending if mrt_file.name in result.failed_files)
+
+        manifest.chunks = list(chunks.values())
+        manifest.failed_files = sorted(failed_files)
+        save_manifest(export_path, manifest)
+
+    result.duration = time.perf_counter() - start_time
+
+    return result
+
+def _export_pending(pending: list[Path], export_path: Path, manifest: ExportManifest, chunks: dict[str, ExportChunk], peer_indexes: dict[tuple, int], result: ExportResult, jobs: int):
+    """ Export MRT files in parallel worker processes and move their chunks into place, updating the manifest and the result.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            pending (list[Path]): The MRT files to export.
+            export_path (Path): The path to the export directory.
+            manifest (ExportManifest): The manifest the new peers are added to.
+            chunks (dict[str, ExportChunk]): The chunks of the manifest by name.
+            peer_indexes (dict[tuple, int]): The manifest index of each peer.
+            result (ExportResult): The export result.
+            jobs (int): The number of worker processes.
+
+        Raises:
+            ValueError: If the export has more peers than the peer column can refer to.
+    """
+    if pending:
+        with Progress(
+            '[progress.description]{task.description}',
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeRemainingColumn(),
+        ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(pending)), 1)) as executor:
+            progress_task = progress.add_task(
+                description='Export',
+                total=len(pending),
+            )
+            futures = {
+                executor.submit(export_file, mrt_file, export_path / f'.{get_chunk_name(mrt_file)}.tmp'): mrt_file
+                for mrt_file in pending
+            }
+
+            for future in as_completed(futures):
+                mrt_file = futures[future]
+
+                try:
+                    chunk, peers = future.result()
+                except (MRTDecodeError, OSError) as error:
+                    print(f'[red]\[warning][/] Cannot export [purple]{mrt_file}[/]: {error}')
+
+                    # The chunk of an earlier version of the file no longer matches it
+                    chunks.pop(get_chunk_name(mrt_file), None)
+                    shutil.rmtree(export_path / get_chunk_name(mrt_file), ignore_errors=True)
+                    shutil.rmtree(export_path / f'.{get_chunk_name(mrt_file)}.tmp', ignore_errors=True)
+
+                    result.failed_files.append(mrt_file.name)
+                    progress.advance(progress_task)
+                    continue
+
+                temporary = export_path / chunk.name
+                chunk.name = chunk.name[1:-len('.tmp')]
+
+                # Remap the peers of the file to the peers of the manifest
+                mapping = []
+                for peer in peers:
+                    key = (peer.collector, peer.ip, peer.asn)
+                    if key not in peer_indexes:
+                        peer_indexes[key] = len(manifest.peers)
+                        manifest.peers.append(peer)
+                    mapping.append(peer_indexes[key])
+
+                if len(manifest.peers) > 0x10000:
+                    raise ValueError(f'Too many peers for the peer column: {len(manifest.peers)}')
+
+                if any(index != position for position, index in enumerate(mapping)):
+                    path = temporary / 'peer.npy'
+                    _write_npy(path, EXPORT_COLUMNS['peer'], array(NPY_TYPECODES[EXPORT_COLUMNS['peer']], (
+                        mapping[peer] for peer in _read_npy(path, EXPORT_COLUMNS['peer'])
+                    )))
+
+                shutil.rmtree(export_path / chunk.name, ignore_errors=True)
+                os.replace(temporary, export_path / chunk.name)
+                chunks[chunk.name] = chunk
+
+                result.exported_files += 1
+                result.rows += chunk.rows
+                result.input_bytes += chunk.size
+                result.output_bytes += sum(path.stat().st_size for path in (export_path / chunk.name).iterdir())
+                progress.advance(progress_task)
+
+def iter_export_chunks(export_path: Path, columns: Optional[list[str]] = None) -> Iterator[dict[str, 'numpy.ndarray']]:
+    """ Iterate the non-empty chunks of an export directory as memory-mapped NumPy arrays.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            export_path (Path): The path to the export directory.
+            columns (Optional[list[str]]): The columns to load, all columns if not given.
+
+        Returns:
+            Iterator[dict[str, numpy.ndarray]]: The columns of each chunk in timestamp order.
+
+        Raises:
+            ValueError: If numpy is not installed.
+    """
+    _require_numpy()
+
+    for chunk in load_manifest(export_path).chunks:
+        if chunk.rows:
+            yield {
+                column: numpy.load(export_path / chunk.name / f'{column}.npy', mmap_mode='r')
+                for column in columns or EXPORT_COLUMNS
+            }
+
+def load_export(export_path: Path, columns: Optional[list[str]] = None) -> dict[str, 'numpy.ndarray']:
+    """ Load the columns of an export directory as NumPy arrays.
+        A single chunk stays memory-mapped, multiple chunks are concatenated into memory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            export_path (Path): The path to the export directory.
+            columns (Optional[list[str]]): The columns to load, all columns if not given.
+
+        Returns:
+            dict[str, numpy.ndarray]: The columns.
+
+        Raises:
+            ValueError: If numpy is not installed.
+    """
+    _require_numpy()
+
+    chunks = list(iter_export_chunks(export_path, columns))
+    arrays = {}
+
+    for column in columns or EXPORT_COLUMNS:
+        if not chunks:
+            arrays[column] = numpy.empty(0, dtype=EXPORT_COLUMNS[column])
+        elif len(chunks) == 1:
+            arrays[column] = chunks[0][column]
+        else:
+            arrays[column] = numpy.concatenate([chunk[column] for chunk in chunks])
+
+    return arrays
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.mrt_file import MRTFileName
+from functools import lru_cache
+from datetime import datetime, timezone
+from typing import Optional
+import calendar
+import re
+
+# YYYYMMDD_HHMM_<...>_<...>_<vendor>_<...>_<peer name>_<bgp type>.bz2
+MRT_FILE_NAME_PATTERN = re.compile(
+    r'(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})_[^_]*_[^_]*_([^_]*)_[^_]*_([^_]*)_([^_.]*)',
+)
+DAYS_IN_MONTH = (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+def to_epoch(value: datetime) -> int:
+    """ Convert a datetime to epoch seconds, naive datetimes are treated as UTC.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            value (datetime): The datetime to convert.
+
+        Returns:
+            int: The epoch seconds.
+    """
+    if value.tzinfo is not None:
+        return int(value.timestamp())
+
+    return calendar.timegm(value.timetuple())
+
+def from_epoch(timestamp: int) -> datetime:
+    """ Convert epoch seconds to a naive datetime in UTC, the inverse of to_epoch.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds.
+
+        Returns:
+            datetime: The naive datetime.
+    """
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+def _days_from_civil(year: int, month: int, day: int) -> int:
+    """ Get the number of days since 1970-01-01 of a proleptic gregorian date.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            year (int): The year.
+            month (int): The month.
+            day (int): The day.
+
+        Returns:
+            int: The days since the epoch.
+    """
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month - 3 if month > 2 else month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+
+    return era * 146097 + day_of_era - 719468
+
+@lru_cache(maxsize=1 << 20)
+def parse_mrt_file_name(name: str) -> Optional[MRTFileName]:
+    """ Parse the timestamp, vendor, peer name and BGP type of an MRT file name in a single pass.
+        Results are memoized, so repeated scans of the same archive only pay the parsing cost once.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The MRT file name.
+
+        Returns:
+            Optional[MRTFileName]: The parsed file name or None if the name cannot be parsed.
+    """
+    match = MRT_FILE_NAME_PATTERN.match(name)
+    if not match:
+        return None
+
+    year, month, day, hour, minute, vendor, peer_name, bgp_type = match.groups()
+    year, month, day, hour, minute = int(year), int(month), int(day), int(hour), int(minute)
+
+    if not (1 <= month <= 12 and 1 <= day <= DAYS_IN_MONTH[month] and hour < 24 and minute < 60):
+        return None
+    if month == 2 and day == 29 and not (year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)):
+        return None
+
+    return MRTFileName(
+        _days_from_civil(year, month, day) * 86400 + hour * 3600 + minute * 60,
+        vendor,
+        peer_name,
+        bgp_type,
+    )
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.bgp import AFI_IPV4, AFI_IPV6, ADDRESS_LENGTH, decode_bgp4mp_update, decode_peer_index_table, decode_rib_entry, encode_rib_entry, get_as_path
+from src.services.mrt import MRTDecodeError, iter_records
+from src.services.filename import parse_mrt_file_name
+from src.models.mrt_record import MRTRecord, Prefix
+from src.models.filter import RecordFilter
+from src.services.trie import PrefixTrie
+from typing import Optional
+from pathlib import Path
+from rich import print
+import ipaddress
+import hashlib
+
+def parse_prefix(value: str) -> Prefix:
+    """ Parse a prefix in CIDR notation.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            value (str): The prefix, e.g. 192.0.2.0/24 or 2001:db8::/32.
+
+        Returns:
+            Prefix: The prefix.
+
+        Raises:
+            ValueError: If the value is not a valid prefix.
+    """
+    network = ipaddress.ip_network(value, strict=False)
+
+    return (AFI_IPV4 if network.version == 4 else AFI_IPV6, int(network.network_address), network.prefixlen)
+
+def get_filter_digest(record_filter: RecordFilter) -> str:
+    """ Get a short digest of a record filter, used to name filtered files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            record_filter (RecordFilter): The record filter.
+
+        Returns:
+            str: The hex digest.
+    """
+    return hashlib.blake2b(
+        record_filter.model_dump_json().encode(),
+        digest_size=4,
+    ).hexdigest()
+
+class CompiledFilter:
+    """ Record filter compiled to prefix tries and ASN sets.
+        A prefix matches if it overlaps a filter prefix, i.e. it is a filter prefix, one of its more specifics or a covering less specific.
+        Records are kept or dropped as a whole, so kept records are byte-identical to the source.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, record_filter: RecordFilter):
+        """ Compile a record filter.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                record_filter (RecordFilter): The record filter.
+        """
+        self.tries = None
+        self.origin_asns = frozenset(record_filter.origin_asns)
+        self.as_path_contains = frozenset(record_filter.as_path_contains)
+        # Prefixes last announced with a matching AS path, so their withdrawals and path changes are kept
+        self.announced = set()
+        # Peers of the last PEER_INDEX_TABLE a RIB dump seeded the announced prefixes from
+        self.peers = []
+
+        if record_filter.prefixes:
+            self.tries = {
+                afi: PrefixTrie(ADDRESS_LENGTH[afi] * 8)
+                for afi in (AFI_IPV4, AFI_IPV6)
+            }
+            for afi, network, length in map(parse_prefix, record_filter.prefixes):
+                self.tries[afi].insert(network, length, 0)
+
+    @property
+    def is_stateful(self) -> bool:
+        """ Check whether the filter tracks the announced prefixes, which is the case if AS paths are filtered.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Returns:
+                bool: True if records have to pass the filter in timestamp order.
+        """
+        return bool(self.origin_asns or self.as_path_contains)
+
+    def match_prefix(self, prefix: Prefix) -> bool:
+        """ Check whether a prefix overlaps a filter prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                prefix (Prefix): The prefix.
+
+            Returns:
+                bool: True if the prefix matches or no prefixes are filtered.
+        """
+        if self.tries is None:
+            return True
+
+        afi, network, length = prefix
+        trie = self.tries.get(afi)
+
+        return trie is not None and (trie.longest_match(network, length) is not None or next(trie.covered(network, length), None) is not None)
+
+    def match_attributes(self, attributes: memoryview, as4: bool = True) -> bool:
+        """ Check whether the AS path of path attributes matches the origin and transit ASNs.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                attributes (memoryview): The path attributes.
+                as4 (bool): AS numbers are 4 bytes long.
+
+            Returns:
+                bool: True if the AS path matches or no ASNs are filtered.
+        """
+        if not self.origin_asns and not self.as_path_contains:
+            return True
+
+        as_path = get_as_path(attributes, as4)
+
+        if self.origin_asns and not (as_path and as_path[-1] in self.origin_asns):
+            return False
+
+        return not self.as_path_contains or not self.as_path_contains.isdisjoint(as_path)
+
+    def filter(self, record: MRTRecord) -> Optional[bytes]:
+        """ Filter an MRT record.
+            BGP UPDATE messages are kept if they announce a matching prefix with a matching AS path,
+            or withdraw or re-announce a prefix that was announced with a matching AS path before.
+            Without AS path filters, all withdrawals of matching prefixes are kept.
+            The announced prefixes are tracked across all filtered records, so records have to be filtered in timestamp order per peer.
+            RIB records are reduced to the entries with a matching AS path.
+            Other records like state changes are kept.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                record (MRTRecord): The MRT record.
+
+            Returns:
+                Optional[bytes]: The record to write or None if it is dropped.
+        """
+        update = decode_bgp4mp_update(record)
+
+        if update:
+            keep = False
+            path_filtered = self.origin_asns or self.as_path_contains
+            path_match = None
+
+            for prefix in update.announced:
+                if not self.match_prefix(prefix):
+                    continue
+
+                if path_match is None:
+                    path_match = self.match_attributes(update.attributes, update.as4)
+
+                if not path_filtered or path_match:
+                    keep = True
+                    if path_filtered:
+                        self.announced.add((update.peer_ip, prefix))
+                elif (update.peer_ip, prefix) in self.announced:
+                    # The prefix moved away from a matching path, which replaces the earlier announcement
+                    keep = True
+                    self.announced.discard((update.peer_ip, prefix))
+
+            # The matching announcement of a withdrawn prefix may precede the window, the filter is seeded with the state before
+            for prefix in update.withdrawn:
+                if not self.match_prefix(prefix):
+                    continue
+
+                if not path_filtered:
+                    keep = True
+                elif (update.peer_ip, prefix) in self.announced:
+                    keep = True
+                    self.announced.discard((update.peer_ip, prefix))
+
+            return record.data if keep else None
+
+        entry = decode_rib_entry(record)
+
+        if entry:
+            if not self.match_prefix(entry.prefix):
+                return None
+
+            entries = [
+                (peer_index, originated_time, attributes)
+                for peer_index, originated_time, attributes in entry.entries
+                if self.match_attributes(attributes)
+            ]
+
+            if not entries:
+                return None
+            if len(entries) == len(entry.entries):
+                return record.data
+
+            return encode_rib_entry(entry.timestamp, entry.sequence, entry.prefix, [
+                (peer_index, originated_time, bytes(attributes))
+                for peer_index, originated_time, attributes in entries
+            ])
+
+        return record.data
+
+    def seed(self, record: MRTRecord):
+        """ Update the announced prefixes with a record before the filtered range without keeping it.
+            RIB entries with a matching prefix and AS path are announced by their peers, BGP UPDATE messages pass the filter.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                record (MRTRecord): The MRT record.
+        """
+        peers = decode_peer_index_table(record)
+        if peers is not None:
+            self.peers = peers
+            return
+
+        entry = decode_rib_entry(record)
+        if not entry:
+            self.filter(record)
+            return
+
+        if not self.match_prefix(entry.prefix):
+            return
+
+        for peer_index, _, attributes in entry.entries:
+            if peer_index < len(self.peers) and self.match_attributes(attributes):
+                self.announced.add((self.peers[peer_index].ip, entry.prefix))
+
+    def seed_files(self, paths: list[Path], end: int):
+        """ Seed the announced prefixes from a RIB dump and the update files up to the start of the filtered range.
+            The RIB dump is seeded as a whole and update records before it are skipped, since the dump already reflects them.
+            Files that cannot be read or decoded only leave the state incomplete and are reported.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                paths (list[Path]): The RIB dump followed by the update files in timestamp order.
+                end (int): The epoch start of the filtered range, later records are not seeded.
+        """
+        start = -1
+
+        for path in paths:
+            mrt_file_name = parse_mrt_file_name(path.name)
+            is_rib = mrt_file_name is not None and mrt_file_name.bgp_type == 'rib'
+            if is_rib:
+                start = mrt_file_name.timestamp
+
+            try:
+                for record in iter_records(path):
+                    if is_rib or start <= record.timestamp < end:
+                        self.seed(record)
+            except (MRTDecodeError, OSError) as error:
+                print(f'[red]\\[warning][/] Cannot seed the filter from [purple]{path}[/]: {error}')
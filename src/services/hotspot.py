@@ -0,0 +1,339 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.services.index import INDEX_DIRECTORY, is_index_fresh, iter_index_stats
+from src.services.rewrite import UPDATE_FILE_INTERVAL
+from src.services.snapshot import ArchiveSnapshot
+from src.services.query import iter_query
+from src.services.mrt import MRTDecodeError, iter_records
+from src.services.cache import load_cache_files, save_cache_file
+from src.models.hotspot import Hotspot, HotspotResult
+from src.models.query import QueryRequest
+from typing import Optional
+from pathlib import Path
+from rich import print
+import statistics
+import json
+import time
+import os
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+RECORD_COUNTS_FILE = 'record_counts.json'
+
+# Scale of the median absolute deviation to the standard deviation of a normal distribution
+MAD_SCALE = 1.4826
+
+def count_records(path: Path) -> int:
+    """ Count the records of an MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            int: The number of records.
+    """
+    return sum(1 for _ in iter_records(path))
+
+def _load_record_counts(mrt_input_path: Path) -> dict[str, list[int]]:
+    """ Load the cached record counts of an archive, including those written to the user cache directory if the archive is read-only.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            dict[str, list[int]]: The size, mtime in nanoseconds and record count by path relative to the archive.
+    """
+    record_counts = {}
+
+    for data in load_cache_files(mrt_input_path / INDEX_DIRECTORY / RECORD_COUNTS_FILE):
+        record_counts.update(json.loads(data))
+
+    return record_counts
+
+def _save_record_counts(mrt_input_path: Path, record_counts: dict[str, list[int]]):
+    """ Write the cached record counts of an archive atomically, to the user cache directory if the archive is read-only.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            record_counts (dict[str, list[int]]): The size, mtime in nanoseconds and record count by path relative to the archive.
+    """
+    save_cache_file(mrt_input_path / INDEX_DIRECTORY / RECORD_COUNTS_FILE, json.dumps(record_counts))
+
+def get_series(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, records: bool = False, jobs: int = 4) -> tuple[dict[str, list[tuple[int, int]]], int, int, list[str]]:
+    """ Get the update rate time series of every peer, one point per update file.
+        By default the rate is the compressed size of the update files, taken from the archive index if it is up to date.
+        With records, the records of every file are counted in parallel worker processes and cached by path, size and mtime,
+        so repeated runs over the same range only count new or changed files.
+        Files whose records cannot be counted are skipped and left out of the series.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the date range.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            records (bool): Count the records instead of using the file sizes.
+            jobs (int): The number of worker processes counting records.
+
+        Returns:
+            tuple[dict[str, list[tuple[int, int]]], int, int, list[str]]: The timestamp and value series by peer name, the number of cached and of counted files and the skipped files.
+    """
+    request = request.model_copy(
+        update={
+            'bgp_type': ['update'],
+        },
+    )
+
+    if is_index_fresh(mrt_input_path, request):
+        files = list(iter_index_stats(
+            mrt_input_path=mrt_input_path,
+            request=request,
+        ))
+    else:
+        files = [
+            (mrt_file_name, path, (stat := path.stat()).st_size, stat.st_mtime_ns)
+            for mrt_file_name, path in iter_query(
+                mrt_input_path=mrt_input_path,
+                request=request,
+                layout=layout,
+                snapshot=snapshot,
+            )
+        ]
+
+    values = [size for _, _, size, _ in files]
+    cached_files = 0
+    counted_files = 0
+    skipped_files = []
+
+    if records:
+        record_counts = _load_record_counts(mrt_input_path)
+        pending = []
+
+        for position, (_, path, size, mtime_ns) in enumerate(files):
+            cached = record_counts.get(os.path.relpath(path, mrt_input_path))
+
+            if cached and cached[0] == size and cached[1] == mtime_ns:
+                values[position] = cached[2]
+                cached_files += 1
+            else:
+                pending.append(position)
+
+        if pending:
+            with Progress(
+                '[progress.description]{task.description}',
+                BarColumn(),
+                MofNCompleteColumn(),
+                TimeRemainingColumn(),
+            ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(pending)), 1)) as executor:
+                progress_task = progress.add_task(
+                    description='Count records',
+                    total=len(pending),
+                )
+                futures = {
+                    executor.submit(count_records, files[position][1]): position
+                    for position in pending
+                }
+
+                for future in as_completed(futures):
+                    position = futures[future]
+                    _, path, size, mtime_ns = files[position]
+                    progress.advance(progress_task)
+
+                    try:
+                        values[position] = future.result()
+                    except (MRTDecodeError, OSError) as error:
+                        print(f'[red]\[warning][/] Cannot count the records of [purple]{path}[/]: {error}')
+                        values[position] = None
+                        skipped_files.append(path.name)
+                        continue
+
+                    record_counts[os.path.relpath(path, mrt_input_path)] = [size, mtime_ns, values[position]]
+
+            counted_files = len(pending) - len(skipped_files)
+            _save_record_counts(mrt_input_path, record_counts)
+
+    series = {}
+
+    for (mrt_file_name, _, _, _), value in zip(files, values):
+        if value is None:
+            continue
+
+        series.setdefault(mrt_file_name.peer_name, []).append((mrt_file_name.timestamp, value))
+
+    for points in series.values():
+        points.sort()
+
+    return series, cached_files, counted_files, skipped_files
+
+def get_scores(values: list[int], window: int) -> tuple[list[float], list[float]]:
+    """ Get the robust z-score of every point against the median and median absolute deviation of the preceding points.
+        The baseline is a trailing window, so a burst does not raise its own baseline.
+        Points with less than a quarter window of history get a score of 0.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            values (list[int]): The values of the series.
+            window (int): The number of preceding points of the baseline.
+
+        Returns:
+            tuple[list[float], list[float]]: The scores and baseline medians of the points.
+    """
+    minimum = max(window // 4, 2)
+    count = len(values)
+
+    if numpy is not None:
+        array = numpy.asarray(values, dtype=numpy.float64)
+        medians = numpy.zeros(count)
+        deviations = numpy.zeros(count)
+
+        for position in range(minimum, min(window, count)):
+            medians[position] = numpy.median(array[:position])
+            deviations[position] = numpy.median(numpy.abs(array[:position] - medians[position]))
+
+        # Full windows are computed at once over a strided view of the preceding points
+        if count > window:
+            history = numpy.lib.stride_tricks.sliding_window_view(array[:-1], window)
+            medians[window:] = numpy.median(history, axis=1)
+            deviations[window:] = numpy.median(numpy.abs(history - medians[window:, None]), axis=1)
+
+        # A flat history would give infinite scores, so the deviation is at least 1% of the median and 1
+        scores = (array - medians) / numpy.maximum(MAD_SCALE * deviations, numpy.maximum(0.01 * medians, 1))
+        scores[:minimum] = 0
+
+        return scores.tolist(), medians.tolist()
+
+    scores = [0.0] * count
+    medians = [0.0] * count
+
+    for position in range(minimum, count):
+        history = values[max(position - window, 0):position]
+        median = statistics.median(history)
+        deviation = statistics.median(abs(value - median) for value in history)
+        scores[position] = (values[position] - median) / max(MAD_SCALE * deviation, 0.01 * median, 1)
+        medians[position] = median
+
+    return scores, medians
+
+def find_hotspots(series: dict[str, list[tuple[int, int]]], window: int, threshold: float, top: int) -> list[Hotspot]:
+    """ Rank candidate anomaly windows.
+        Consecutive update files of a peer with a score above the threshold form a window, windows are ranked by their highest score.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            series (dict[str, list[tuple[int, int]]]): The timestamp and value series by peer name.
+            window (int): The number of preceding points of the baseline.
+            threshold (float): The score above which a point is anomalous.
+            top (int): The number of windows to return.
+
+        Returns:
+            list[Hotspot]: The highest ranked windows.
+    """
+    interval = int(UPDATE_FILE_INTERVAL.total_seconds())
+    hotspots = []
+
+    for peer_name, points in series.items():
+        scores, medians = get_scores([value for _, value in points], window)
+        hotspot = None
+
+        for (timestamp, value), score, median in zip(points, scores, medians):
+            if score < threshold:
+                hotspot = None
+                continue
+
+            # Extend the current window if the update file directly follows it
+            if hotspot and hotspot.end == timestamp:
+                hotspot.end = timestamp + interval
+                if score > hotspot.score:
+                    hotspot.score = score
+                    hotspot.peak = value
+                    hotspot.baseline = median
+                continue
+
+            hotspot = Hotspot(
+                peer_name=peer_name,
+                start=timestamp,
+                end=timestamp + interval,
+                score=score,
+                peak=value,
+                baseline=median,
+            )
+            hotspots.append(hotspot)
+
+    hotspots.sort(key=lambda hotspot: -hotspot.score)
+
+    return hotspots[:top]
+
+def get_hotspots(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, records: bool = False, window: int = 96, threshold: float = 3.5, top: int = 10, jobs: int = 4) -> HotspotResult:
+    """ Find candidate anomaly windows of the update rates of the archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the date range.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            records (bool): Count the records instead of using the file sizes.
+            window (int): The number of preceding update files of the baseline.
+            threshold (float): The score above which an update file is anomalous.
+            top (int): The number of windows to return.
+            jobs (int): The number of worker processes counting records.
+
+        Returns:
+            HotspotResult: The hotspot result.
+    """
+    start_time = time.perf_counter()
+
+    series, cached_files, counted_files, skipped_files = get_series(
+        mrt_input_path=mrt_input_path,
+        request=request,
+        layout=layout,
+        snapshot=snapshot,
+        records=records,
+        jobs=jobs,
+    )
+
+    return HotspotResult(
+        metric='records' if records else 'bytes',
+        series=len(series),
+        points=sum(map(len, series.values())),
+        cached_files=cached_files,
+        counted_files=counted_files,
+        skipped_files=skipped_files,
+        hotspots=find_hotspots(
+            series=series,
+            window=window,
+            threshold=threshold,
+            top=top,
+        ),
+        duration=time.perf_counter() - start_time,
+    )
@@ -0,0 +1,435 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.query import QueryRequest, QueryResponse
+from src.services.filename import parse_mrt_file_name, to_epoch
+from src.models.index import IndexResult
+from src.models.mrt_file import MRTFileName
+from src.services.timings import timed
+from typing import Iterator, Optional
+from pathlib import Path
+import sqlite3
+import os
+
+INDEX_DIRECTORY = '.mrtawk'
+INDEX_FILE = 'index.sqlite'
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS directories (
+        path TEXT PRIMARY KEY,
+        parent TEXT,
+        mtime_ns INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS files (
+        path TEXT PRIMARY KEY,
+        directory TEXT NOT NULL,
+        timestamp INTEGER NOT NULL,
+        vendor TEXT NOT NULL,
+        peer_name TEXT NOT NULL,
+        bgp_type TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS directories_parent ON directories (parent);
+    CREATE INDEX IF NOT EXISTS files_directory ON files (directory);
+    CREATE INDEX IF NOT EXISTS files_lookup ON files (peer_name, timestamp);
+'''
+
+def get_index_path(mrt_input_path: Path) -> Path:
+    """ Get the path of the archive index of an MRT input directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            Path: The path to the index file.
+    """
+    return mrt_input_path / INDEX_DIRECTORY / INDEX_FILE
+
+def _connect(mrt_input_path: Path) -> sqlite3.Connection:
+    """ Open the archive index and make sure the schema exists.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            sqlite3.Connection: The index database connection.
+    """
+    index_path = get_index_path(mrt_input_path)
+    index_path.parent.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    connection = sqlite3.connect(index_path)
+    # A rollback journal lets lookups open the index read-only without creating shared-memory files in the archive
+    connection.execute('PRAGMA journal_mode = DELETE')
+    connection.execute('PRAGMA synchronous = NORMAL')
+    connection.executescript(SCHEMA)
+
+    return connection
+
+def _connect_readonly(mrt_input_path: Path) -> sqlite3.Connection:
+    """ Open the archive index read-only, so lookups neither write to nor lock the archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+
+        Returns:
+            sqlite3.Connection: The index database connection.
+
+        Raises:
+            sqlite3.Error: If the index cannot be opened.
+    """
+    return sqlite3.connect(
+        f'{get_index_path(mrt_input_path).absolute().as_uri()}?mode=ro',
+        uri=True,
+    )
+
+def _get_parent(relative_directory: str) -> Optional[str]:
+    """ Get the parent of a directory relative to the archive root.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            relative_directory (str): The relative directory.
+
+        Returns:
+            Optional[str]: The relative parent directory or None for the archive root.
+    """
+    if relative_directory == '':
+        return None
+
+    return os.path.dirname(relative_directory)
+
+@timed('index.build', files=lambda result: result.indexed_files)
+def build_index(mrt_input_path: Path, rebuild: bool = False) -> IndexResult:
+    """ Build or update the archive index.
+        Only directories whose mtime changed since the last run are listed again,
+        unchanged directories are descended into using their indexed subdirectories.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            rebuild (bool): Drop the existing index and scan the whole archive.
+
+        Returns:
+            IndexResult: The index result.
+    """
+    result = IndexResult(
+        scanned_directories=0,
+        skipped_directories=0,
+        removed_directories=0,
+        indexed_files=0,
+        removed_files=0,
+        unparseable_files=0,
+    )
+
+    connection = _connect(mrt_input_path)
+
+    with connection:
+        if rebuild:
+            connection.execute('DELETE FROM files')
+            connection.execute('DELETE FROM directories')
+
+        known_directories = {
+            path: (parent, mtime_ns)
+            for path, parent, mtime_ns in connection.execute('SELECT path, parent, mtime_ns FROM directories')
+        }
+        children = {}
+        for path, (parent, _) in known_directories.items():
+            children.setdefault(parent, []).append(path)
+
+        visited = set()
+        pending = ['']
+
+        while pending:
+            relative_directory = pending.pop()
+            visited.add(relative_directory)
+
+            try:
+                mtime_ns = os.stat(mrt_input_path / relative_directory).st_mtime_ns
+            except FileNotFoundError:
+                continue
+
+            known = known_directories.get(relative_directory)
+
+            # The directory entries did not change, descend using the indexed subdirectories
+            if known and known[1] == mtime_ns:
+                result.skipped_directories += 1
+                pending.extend(children.get(relative_directory, []))
+                continue
+
+            result.scanned_directories += 1
+
+            indexed_files = {
+                path for path, in connection.execute(
+                    'SELECT path FROM files WHERE directory = ?',
+                    (relative_directory,),
+                )
+            }
+            files = []
+
+            with os.scandir(mrt_input_path / relative_directory) as entries:
+                for entry in entries:
+                    relative_path = os.path.join(relative_directory, entry.name)
+
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name != INDEX_DIRECTORY:
+                            pending.append(relative_path)
+                        continue
+
+                    if not entry.name.endswith('.bz2'):
+                        continue
+
+                    indexed_files.discard(relative_path)
+
+                    mrt_file_name = parse_mrt_file_name(entry.name)
+                    if not mrt_file_name:
+                        result.unparseable_files += 1
+                        continue
+
+                    stat = entry.stat()
+                    files.append((relative_path, relative_directory, *mrt_file_name, stat.st_size, stat.st_mtime_ns))
+
+            # Files still left in the set have been removed from the directory
+            connection.executemany(
+                'DELETE FROM files WHERE path = ?',
+                ((path,) for path in indexed_files),
+            )
+            connection.executemany(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                files,
+            )
+            connection.execute(
+                'INSERT OR REPLACE INTO directories VALUES (?, ?, ?)',
+                (relative_directory, _get_parent(relative_directory), mtime_ns),
+            )
+
+            result.indexed_files += len(files)
+            result.removed_files += len(indexed_files)
+
+        # Drop directories (and their files) that no longer exist
+        for relative_directory in known_directories.keys() - visited:
+            connection.execute('DELETE FROM files WHERE directory = ?', (relative_directory,))
+            connection.execute('DELETE FROM directories WHERE path = ?', (relative_directory,))
+            result.removed_directories += 1
+
+    connection.close()
+
+    return result
+
+def _get_request_directories(connection: sqlite3.Connection, request: QueryRequest) -> set[str]:
+    """ Get the indexed directories a request can touch.
+        These are the directories holding matching files, the directories of the nearest files before and after the time range of each peer,
+        where a new file of the range would be added, and all their ancestors, whose mtime changes when a new subdirectory is created.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            connection (sqlite3.Connection): The index database connection.
+            request (QueryRequest): The query request.
+
+        Returns:
+            set[str]: The relative directories.
+    """
+    peer_names = ', '.join('?' * len(request.peer_name))
+    bgp_types = ', '.join('?' * len(request.bgp_type))
+    start = to_epoch(request.start_datetime)
+    end = to_epoch(request.end_datetime)
+
+    directories = {
+        directory for directory, in connection.execute(
+            f'''
+                SELECT DISTINCT directory FROM files
+                WHERE peer_name IN ({peer_names}) AND bgp_type IN ({bgp_types})
+                AND timestamp >= ? AND timestamp < ?
+                UNION
+                SELECT directory FROM (
+                    SELECT directory, MAX(timestamp) FROM files
+                    WHERE peer_name IN ({peer_names}) AND bgp_type IN ({bgp_types}) AND timestamp < ?
+                    GROUP BY peer_name, bgp_type
+                )
+                UNION
+                SELECT directory FROM (
+                    SELECT directory, MIN(timestamp) FROM files
+                    WHERE peer_name IN ({peer_names}) AND bgp_type IN ({bgp_types}) AND timestamp >= ?
+                    GROUP BY peer_name, bgp_type
+                )
+            ''',
+            (
+                *request.peer_name, *request.bgp_type, start, end,
+                *request.peer_name, *request.bgp_type, start,
+                *request.peer_name, *request.bgp_type, end,
+            ),
+        )
+    }
+    directories.add('')
+
+    for directory in list(directories):
+        while directory := _get_parent(directory):
+            directories.add(directory)
+
+    return directories
+
+def is_index_fresh(mrt_input_path: Path, request: Optional[QueryRequest] = None) -> bool:
+    """ Check whether the archive index exists and the indexed directories are unchanged.
+        The index is opened read-only, and with a request only the directories its time range can touch are checked,
+        so the check works on read-only archives and its cost does not grow with the archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (Optional[QueryRequest]): The query request, all indexed directories are checked if not given.
+
+        Returns:
+            bool: True if the index can be used to answer queries.
+    """
+    if not get_index_path(mrt_input_path).exists():
+        return False
+
+    try:
+        connection = _connect_readonly(mrt_input_path)
+
+        try:
+            if request:
+                paths = sorted(_get_request_directories(connection, request))
+                directories = []
+
+                # Stay below the SQLite limit of bound parameters
+                for offset in range(0, len(paths), 500):
+                    chunk = paths[offset:offset + 500]
+                    directories.extend(connection.execute(
+                        f'SELECT path, mtime_ns FROM directories WHERE path IN ({", ".join("?" * len(chunk))})',
+                        chunk,
+                    ))
+
+                # A directory missing from the index cannot be checked
+                if len(directories) != len(paths):
+                    return False
+            else:
+                directories = connection.execute('SELECT path, mtime_ns FROM directories').fetchall()
+        finally:
+            connection.close()
+    except sqlite3.Error:
+        return False
+
+    if not directories:
+        return False
+
+    for relative_directory, mtime_ns in directories:
+        try:
+            if os.stat(mrt_input_path / relative_directory).st_mtime_ns != mtime_ns:
+                return False
+        except FileNotFoundError:
+            return False
+
+    return True
+
+def iter_index_stats(mrt_input_path: Path, request: QueryRequest) -> Iterator[tuple[MRTFileName, Path, int, int]]:
+    """ Iterate the MRT files of the archive index matching a request in timestamp order, with their indexed size and mtime.
+        Rows are streamed from the database cursor, so results are available before the lookup is complete.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request.
+
+        Returns:
+            Iterator[tuple[MRTFileName, Path, int, int]]: The parsed file names, paths, sizes and mtimes in nanoseconds of the matching MRT files.
+    """
+    connection = _connect_readonly(mrt_input_path)
+
+    try:
+        for relative_path, timestamp, vendor, peer_name, bgp_type, size, mtime_ns in connection.execute(
+            f'''
+                SELECT path, timestamp, vendor, peer_name, bgp_type, size, mtime_ns FROM files
+                WHERE peer_name IN ({', '.join('?' * len(request.peer_name))})
+                AND timestamp >= ? AND timestamp < ?
+                AND vendor IN ({', '.join('?' * len(request.vendor))})
+                AND bgp_type IN ({', '.join('?' * len(request.bgp_type))})
+                ORDER BY timestamp, path
+            ''',
+            (
+                *request.peer_name,
+                to_epoch(request.start_datetime),
+                to_epoch(request.end_datetime),
+                *request.vendor,
+                *request.bgp_type,
+            ),
+        ):
+            yield MRTFileName(timestamp, vendor, peer_name, bgp_type), mrt_input_path / relative_path, size, mtime_ns
+    finally:
+        connection.close()
+
+def iter_index(mrt_input_path: Path, request: QueryRequest) -> Iterator[tuple[MRTFileName, Path]]:
+    """ Iterate the MRT files of the archive index matching a request in timestamp order.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request.
+
+        Returns:
+            Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the matching MRT files.
+    """
+    for mrt_file_name, path, _, _ in iter_index_stats(
+        mrt_input_path=mrt_input_path,
+        request=request,
+    ):
+        yield mrt_file_name, path
+
+def query_index(mrt_input_path: Path, request: QueryRequest) -> QueryResponse:
+    """ Query the archive index for a subset of MRTs.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request.
+
+        Returns:
+            QueryResponse: The query response.
+    """
+    response = QueryResponse(
+        mrt_files=[],
+        rib_file=None,
+    )
+
+    for mrt_file_name, path in iter_index(
+        mrt_input_path=mrt_input_path,
+        request=request,
+    ):
+        if mrt_file_name.bgp_type == 'rib':
+            response.rib_file = path
+        if mrt_file_name.bgp_type == 'update':
+            response.mrt_files.append(path)
+
+    return response
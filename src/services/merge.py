@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, SpinnerColumn, TextColumn, TimeElapsedColumn
+from src.services.filename import parse_mrt_file_name, from_epoch
+from src.services.mrt import MRTDecodeError, MRTWriter, iter_records
+from src.services.filter import CompiledFilter
+from src.models.filter import RecordFilter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from src.models.merge import MergeResult
+from src.services.stats import StatsCounter, get_record_counts
+from src.services.timings import timed
+from operator import itemgetter
+from typing import Iterator, Optional
+from pathlib import Path
+from queue import Empty
+from rich import print
+import multiprocessing
+import hashlib
+import heapq
+import time
+
+BATCH_SIZE = 1024 * 1024
+READ_AHEAD = 4
+# Seconds to wait for a batch before checking whether the worker is still alive
+WORKER_TIMEOUT = 1
+
+def get_merge_streams(mrt_files: list[Path]) -> list[list[Path]]:
+    """ Group MRT files into streams that can be read one file after another in timestamp order.
+        Files of the same vendor and peer do not overlap in time, so each peer becomes one stream.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The MRT files.
+
+        Returns:
+            list[list[Path]]: The files of each stream in timestamp order.
+    """
+    streams = {}
+
+    for mrt_file in mrt_files:
+        mrt_file_name = parse_mrt_file_name(mrt_file.name)
+        key = (mrt_file_name.vendor, mrt_file_name.peer_name) if mrt_file_name else mrt_file
+        streams.setdefault(key, []).append((mrt_file_name.timestamp if mrt_file_name else 0, mrt_file))
+
+    return [
+        [mrt_file for _, mrt_file in sorted(stream)]
+        for stream in streams.values()
+    ]
+
+def get_stream_seed_files(stream: list[Path], seed_files: Optional[dict[str, list[Path]]]) -> Optional[list[Path]]:
+    """ Get the files the filter of a stream is seeded with.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            stream (list[Path]): The files of the stream.
+            seed_files (Optional[dict[str, list[Path]]]): The seed files of each peer name.
+
+        Returns:
+            Optional[list[Path]]: The seed files of the peer of the stream or None.
+    """
+    mrt_file_name = parse_mrt_file_name(stream[0].name)
+
+    return seed_files.get(mrt_file_name.peer_name) if seed_files and mrt_file_name else None
+
+def get_merged_file_name(mrt_files: list[Path], start: int) -> str:
+    """ Get the name of the merged MRT file.
+        The peer field is a digest of the merged files, so different selections do not overwrite each other.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The merged MRT files.
+            start (int): The epoch start of the merged window.
+
+        Returns:
+            str: The file name.
+    """
+    vendors = sorted({
+        mrt_file_name.vendor
+        for mrt_file in mrt_files
+        if (mrt_file_name := parse_mrt_file_name(mrt_file.name))
+    })
+    digest = hashlib.blake2b(
+        '\n'.join(sorted(mrt_file.name for mrt_file in mrt_files)).encode(),
+        digest_size=4,
+    ).hexdigest()
+
+    return f'{from_epoch(start):%Y%m%d_%H%M}_{start}_bgp_{"-".join(vendors) or "lw"}_ixp_merged-{digest}_update.bz2'
+
+def _iter_stream_records(mrt_files: list[Path], start: int, end: int, record_filter: Optional[RecordFilter], input_records: list[int], failed_files: list[tuple[str, str]], stats: bool = False, seed_files: Optional[list[Path]] = None) -> Iterator[tuple]:
+    """ Iterate the records of a stream within a time range that pass a filter.
+        A file that cannot be read or decoded ends early and is reported as failed, the stream continues with the next file.
+        A filter on AS paths is seeded with the seed files and the records before the time range, so withdrawals of earlier announcements are kept.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The files of the stream in timestamp order.
+            start (int): The epoch start, earlier records are dropped.
+            end (int): The epoch end, records at or after are dropped.
+            record_filter (Optional[RecordFilter]): The filter records are reduced to, its state is carried across the files of the stream.
+            input_records (list[int]): A single counter of the read records.
+            failed_files (list[tuple[str, str]]): The paths and errors of failed files are appended.
+            stats (bool): Also yield the counts of each record, None if the record cannot be counted.
+            seed_files (Optional[list[Path]]): The RIB dump and update files before the stream the filter is seeded with.
+
+        Returns:
+            Iterator[tuple]: The timestamp, microsecond and raw bytes of each record, and the counts of the record if stats are collected.
+    """
+    compiled_filter = CompiledFilter(record_filter) if record_filter else None
+    seeded = compiled_filter is not None and compiled_filter.is_stateful
+
+    if seeded and seed_files:
+        mrt_file_name = parse_mrt_file_name(mrt_files[0].name)
+        compiled_filter.seed_files(seed_files, mrt_file_name.timestamp if mrt_file_name else start)
+
+    for mrt_file in mrt_files:
+        try:
+            for record in iter_records(mrt_file):
+                input_records[0] += 1
+
+                if record.timestamp < start:
+                    if seeded:
+                        compiled_filter.seed(record)
+                    continue
+                if record.timestamp >= end:
+                    continue
+
+                data = compiled_filter.filter(record) if compiled_filter else record.data
+                if data is None:
+                    continue
+
+                if not stats:
+                    yield record.timestamp, record.microsecond, bytes(data)
+                    continue
+
+                try:
+                    counts = get_record_counts(record)
+                except MRTDecodeError:
+                    counts = None
+
+                yield record.timestamp, record.microsecond, bytes(data), counts
+        except (MRTDecodeError, OSError) as error:
+            failed_files.append((str(mrt_file), str(error)))
+
+def _read_streams(streams: list[list[Path]], queue: multiprocessing.Queue, start: Optional[int], end: Optional[int], record_filter: Optional[RecordFilter] = None, stats: bool = False, seed_files: Optional[dict[str, list[Path]]] = None):
+    """ Decompress, decode, filter and merge the records of several streams in a worker process.
+        Records are sent in batches of raw bytes, the bounded queue limits the read-ahead.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            streams (list[list[Path]]): The files of each stream in timestamp order.
+            queue (multiprocessing.Queue): The queue batches are sent to, the number of read records and the failed files mark the end.
+            start (Optional[int]): The epoch start, earlier records are dropped.
+            end (Optional[int]): The epoch end, records at or after are dropped.
+            record_filter (Optional[RecordFilter]): The filter records are reduced to.
+            stats (bool): Send the counts of each record along with it.
+            seed_files (Optional[dict[str, list[Path]]]): The files the filter of each peer name is seeded with.
+    """
+    start = start if start is not None else -1
+    end = end if end is not None else 1 << 32
+
+    try:
+        batch = []
+        batch_size = 0
+        input_records = [0]
+        failed_files = []
+
+        for record in heapq.merge(*(
+            _iter_stream_records(stream, start, end, record_filter, input_records, failed_files, stats, get_stream_seed_files(stream, seed_files))
+            for stream in streams
+        ), key=itemgetter(0, 1)):
+            batch.append(record)
+            batch_size += len(record[2])
+
+            if batch_size >= BATCH_SIZE:
+                queue.put(batch)
+                batch = []
+                batch_size = 0
+
+        if batch:
+            queue.put(batch)
+        queue.put((input_records[0], failed_files))
+    except Exception as error:
+        queue.put(error)
+
+def _iter_worker(queue: multiprocessing.Queue, worker: multiprocessing.Process, streams: list[list[Path]], input_records: list[int], failed_files: list[tuple[str, str]]) -> Iterator[tuple[int, int, bytes]]:
+    """ Iterate the records sent by a stream worker.
+        A worker that exits without marking the end of its streams, e.g. killed for running out of memory,
+        is detected while waiting and all files of its streams are reported as failed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            queue (multiprocessing.Queue): The queue of the stream worker.
+            worker (multiprocessing.Process): The stream worker.
+            streams (list[list[Path]]): The streams of the worker.
+            input_records (list[int]): The number of records read by the worker is appended at the end of its streams.
+            failed_files (list[tuple[str, str]]): The paths and errors of the files the worker failed to read are appended.
+
+        Returns:
+            Iterator[tuple[int, int, bytes]]: The timestamp, microsecond and raw bytes of each record.
+
+        Raises:
+            Exception: The error raised in the stream worker.
+    """
+    while True:
+        try:
+            batch = queue.get(timeout=WORKER_TIMEOUT)
+        except Empty:
+            if worker.is_alive():
+                continue
+
+            # The worker may have sent its last batches just before exiting
+            try:
+                batch = queue.get(timeout=WORKER_TIMEOUT)
+            except Empty:
+                failed_files.extend(
+                    (str(mrt_file), f'Worker exited with code {worker.exitcode}')
+                    for stream in streams
+                    for mrt_file in stream
+                )
+                return
+
+        if isinstance(batch, tuple):
+            break
+        if isinstance(batch, Exception):
+            raise batch
+
+        yield from batch
+
+    input_records.append(batch[0])
+    failed_files.extend(batch[1])
+
+def get_worker_streams(streams: list[list[Path]], jobs: int) -> list[list[list[Path]]]:
+    """ Split streams into contiguous groups, one per worker process.
+        Groups are contiguous, so records with equal timestamps keep the order of their streams.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            streams (list[list[Path]]): The files of each stream.
+            jobs (int): The maximum number of worker processes.
+
+        Returns:
+            list[list[list[Path]]]: The streams of each worker.
+    """
+    workers = max(min(jobs, len(streams)), 1)
+    size, remainder = divmod(len(streams), workers)
+    groups = []
+    offset = 0
+
+    for index in range(workers):
+        count = size + (index < remainder)
+        groups.append(streams[offset:offset + count])
+        offset += count
+
+    return groups
+
+def iter_merged_records(mrt_files: list[Path], start: Optional[int] = None, end: Optional[int] = None, record_filter: Optional[RecordFilter] = None, input_records: Optional[list[int]] = None, jobs: int = 4, failed_files: Optional[list[tuple[str, str]]] = None, stats: bool = False, seed_files: Optional[dict[str, list[Path]]] = None) -> Iterator[tuple]:
+    """ Iterate the records of MRT files in timestamp order.
+        The streams are decompressed in at most jobs worker processes, each merging its streams,
+        and the records of the workers are merged with a k-way heap merge.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The MRT files.
+            start (Optional[int]): The epoch start, earlier records are dropped.
+            end (Optional[int]): The epoch end, records at or after are dropped.
+            record_filter (Optional[RecordFilter]): The filter records are reduced to.
+            input_records (Optional[list[int]]): The number of records read by each worker is appended once it is exhausted.
+            jobs (int): The maximum number of worker processes.
+            failed_files (Optional[list[tuple[str, str]]]): The paths and errors of files that cannot be read are appended,
+                the first failed file raises an error once its worker is exhausted if not given.
+            stats (bool): Also yield the counts of each record, decoded in the worker processes.
+            seed_files (Optional[dict[str, list[Path]]]): The RIB dump and update files before the window the filter of each peer name is seeded with.
+
+        Returns:
+            Iterator[tuple]: The timestamp, microsecond and raw bytes of each record, and the counts of the record if stats are collected.
+
+        Raises:
+            MRTDecodeError: If a file cannot be read and no failed files are collected.
+    """
+    input_records = input_records if input_records is not None else []
+    collected_files = failed_files if failed_files is not None else []
+    groups = get_worker_streams(get_merge_streams(mrt_files), jobs)
+    queues = [multiprocessing.Queue(maxsize=READ_AHEAD) for _ in groups]
+    workers = [
+        multiprocessing.Process(
+            target=_read_streams,
+            args=(streams, queue, start, end, record_filter, stats, seed_files),
+            daemon=True,
+        )
+        for streams, queue in zip(groups, queues)
+    ]
+
+    for worker in workers:
+        worker.start()
+
+    def iter_worker(queue: multiprocessing.Queue, worker: multiprocessing.Process, streams: list[list[Path]]) -> Iterator[tuple[int, int, bytes]]:
+        yield from _iter_worker(queue, worker, streams, input_records, collected_files)
+
+        if failed_files is None and collected_files:
+            path, error = collected_files[0]
+            raise MRTDecodeError(f'Cannot read {path}: {error}')
+
+    try:
+        yield from heapq.merge(*(iter_worker(queue, worker, streams) for queue, worker, streams in zip(queues, workers, groups)), key=itemgetter(0, 1))
+    finally:
+        for worker in workers:
+            worker.terminate()
+            worker.join()
+
+def split_jobs(jobs: int) -> tuple[int, int]:
+    """ Split the worker processes of a merge between decompression and compression.
+        With a single job, the output is compressed in the merging process itself.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            jobs (int): The number of worker processes.
+
+        Returns:
+            tuple[int, int]: The number of decompression and of compression worker processes.
+    """
+    decoders = max((jobs + 1) // 2, 1)
+
+    return decoders, max(jobs - decoders, 0)
+
+@timed('merge', files=lambda result: result.input_files, bytes=lambda result: result.input_bytes)
+def merge_files(mrt_files: list[Path], target: Path, start: Optional[int] = None, end: Optional[int] = None, jobs: int = 4, record_filter: Optional[RecordFilter] = None, stats: bool = False, seed_files: Optional[dict[str, list[Path]]] = None) -> MergeResult:
+    """ Merge the records of MRT files into a single MRT file in timestamp order.
+        The streams are decompressed in worker processes, records are merged with a k-way heap merge
+        and the output is compressed in parallel chunks, so the merge is bound by I/O rather than CPU.
+        Files that cannot be read are reported as failed, their records up to the error are kept.
+        No file is written if no records are left, e.g. because all files failed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The MRT files.
+            target (Path): The path to the merged MRT file.
+            start (Optional[int]): The epoch start, earlier records are dropped.
+            end (Optional[int]): The epoch end, records at or after are dropped.
+            jobs (int): The number of worker processes, shared by decompression and compression.
+            record_filter (Optional[RecordFilter]): The filter records are reduced to.
+            stats (bool): Collect the statistics of the merged file.
+            seed_files (Optional[dict[str, list[Path]]]): The RIB dump and update files before the window the filter of each peer name is seeded with.
+
+        Returns:
+            MergeResult: The merge result.
+    """
+    start_time = time.perf_counter()
+    input_records = []
+    failed_files = []
+    counter = StatsCounter() if stats else None
+    decoders, compressors = split_jobs(jobs)
+
+    with Progress(
+        SpinnerColumn(),
+        '[progress.description]{task.description}',
+        TextColumn('{task.completed:,} records'),
+        TimeElapsedColumn(),
+    ) as progress, (ProcessPoolExecutor(max_workers=compressors) if compressors else nullcontext()) as executor, MRTWriter(target, executor=executor) as writer:
+        progress_task = progress.add_task(
+            description='Merge',
+            total=None,
+        )
+        records = iter_merged_records(
+            mrt_files=mrt_files,
+            start=start,
+            end=end,
+            record_filter=record_filter,
+            input_records=input_records,
+            jobs=decoders,
+            failed_files=failed_files,
+            stats=stats,
+            seed_files=seed_files,
+        )
+
+        try:
+            for record in records:
+                writer.write(record[2])
+
+                # A record the statistics cannot decode leaves them to the stats command, which reports the file
+                if counter and record[3] is None:
+                    counter = None
+                elif counter:
+                    counter.add(record[0], *record[3])
+
+                if not writer.records & 0xffff:
+                    progress.update(progress_task, completed=writer.records)
+        finally:
+            records.close()
+
+        progress.update(progress_task, completed=writer.records)
+
+    for path, error in failed_files:
+        print(f'[red]\[warning][/] Cannot merge [purple]{path}[/]: {error}')
+
+    # Like empty rewrites, an empty merge is not kept
+    if not writer.records:
+        target.unlink()
+
+    return MergeResult(
+        target=target,
+        input_files=len(mrt_files),
+        input_streams=len(get_merge_streams(mrt_files)),
+        input_records=sum(input_records),
+        records=writer.records,
+        input_bytes=sum(mrt_file.stat().st_size for mrt_file in mrt_files),
+        output_bytes=target.stat().st_size if writer.records else 0,
+        duration=time.perf_counter() - start_time,
+        failed_files=[Path(path).name for path, _ in failed_files],
+        stats=counter.finish(target) if counter and writer.records else None,
+    )
@@ -0,0 +1,396 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.mrt_record import MRTRecord
+from concurrent.futures import Executor
+from typing import Iterator, Optional, Union
+from collections import deque
+from pathlib import Path
+import struct
+import zlib
+import bz2
+import os
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+TABLE_DUMP_V2 = 13
+BGP4MP = 16
+BGP4MP_ET = 17
+EXTENDED_TIMESTAMP_TYPES = {17, 33, 49}
+
+CHUNK_SIZE = 1024 * 1024
+HEADER = struct.Struct('>IHHI')
+MICROSECOND = struct.Struct('>I')
+
+CODEC_SUFFIXES = {
+    '.bz2': 'bz2',
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+    '.mrt': 'none',
+}
+DECOMPRESSION_ERRORS = (OSError, EOFError, zlib.error) + ((zstandard.ZstdError,) if zstandard else ())
+
+class MRTDecodeError(ValueError):
+    """ Raised if an MRT file is truncated or corrupt.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+
+def get_codec(path: Path) -> str:
+    """ Get the compression codec of an MRT file from its suffix.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            str: The codec, none for uncompressed files.
+    """
+    return CODEC_SUFFIXES.get(path.suffix, 'none')
+
+def get_codec_suffix(codec: str) -> str:
+    """ Get the file suffix of a compression codec.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            codec (str): The codec.
+
+        Returns:
+            str: The suffix including the dot.
+    """
+    for suffix, suffix_codec in CODEC_SUFFIXES.items():
+        if suffix_codec == codec:
+            return suffix
+
+    raise ValueError(f'Unknown codec {codec}')
+
+def _require_zstandard():
+    """ Make sure the optional zstandard package is installed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Raises:
+            ValueError: If zstandard is not installed.
+    """
+    if not zstandard:
+        raise ValueError('zstandard is required for zstd MRT files, install it with pip3 install zstandard')
+
+def _get_decompressor(codec: str):
+    """ Create a streaming decompressor for a codec.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            codec (str): The codec.
+
+        Returns:
+            The decompressor with decompress, eof and unused_data.
+    """
+    if codec == 'bz2':
+        return bz2.BZ2Decompressor()
+    if codec == 'gzip':
+        return zlib.decompressobj(wbits=31)
+    if codec == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    raise ValueError(f'Unknown codec {codec}')
+
+def _get_compressor(codec: str):
+    """ Create a streaming compressor for a codec.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            codec (str): The codec.
+
+        Returns:
+            The compressor with compress and flush.
+    """
+    if codec == 'bz2':
+        return bz2.BZ2Compressor(9)
+    if codec == 'gzip':
+        return zlib.compressobj(6, zlib.DEFLATED, 31)
+    if codec == 'zstd':
+        _require_zstandard()
+        return zstandard.ZstdCompressor(level=3).compressobj()
+
+    raise ValueError(f'Unknown codec {codec}')
+
+def compress_chunk(codec: str, data: bytes) -> bytes:
+    """ Compress a chunk into a complete, independently decodable stream.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            codec (str): The codec.
+            data (bytes): The uncompressed chunk.
+
+        Returns:
+            bytes: The compressed stream.
+    """
+    compressor = _get_compressor(codec)
+
+    return compressor.compress(data) + compressor.flush()
+
+def iter_chunks(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """ Read and decompress an MRT file incrementally.
+        Concatenated streams, as written by parallel compressors, are decompressed one after another.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+            chunk_size (int): The number of compressed bytes read at once.
+
+        Returns:
+            Iterator[bytes]: The decompressed chunks.
+
+        Raises:
+            MRTDecodeError: If the compressed stream is truncated or corrupt.
+    """
+    codec = get_codec(path)
+
+    with open(path, 'rb') as file:
+        if codec == 'none':
+            while chunk := file.read(chunk_size):
+                yield chunk
+            return
+
+        decompressor = _get_decompressor(codec)
+
+        while data := file.read(chunk_size):
+            while data:
+                if decompressor.eof:
+                    decompressor = _get_decompressor(codec)
+
+                try:
+                    chunk = decompressor.decompress(data)
+                except DECOMPRESSION_ERRORS as error:
+                    raise MRTDecodeError(f'Corrupt {codec} stream: {error}') from error
+
+                if chunk:
+                    yield chunk
+
+                data = decompressor.unused_data if decompressor.eof else b''
+
+        if not decompressor.eof:
+            raise MRTDecodeError(f'Truncated {codec} stream')
+
+def iter_records(path: Path, chunk_size: int = CHUNK_SIZE) -> Iterator[MRTRecord]:
+    """ Decode the records of an MRT file incrementally.
+        Records are memoryview slices of the decompressed chunks, so no record data is copied.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+            chunk_size (int): The number of compressed bytes read at once.
+
+        Returns:
+            Iterator[MRTRecord]: The MRT records.
+
+        Raises:
+            MRTDecodeError: If the file is truncated or corrupt.
+    """
+    yield from iter_buffer_records(iter_chunks(path, chunk_size))
+
+def iter_buffer_records(chunks: Iterator[bytes]) -> Iterator[MRTRecord]:
+    """ Decode MRT records from a stream of decompressed chunks.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            chunks (Iterator[bytes]): The decompressed chunks.
+
+        Returns:
+            Iterator[MRTRecord]: The MRT records.
+
+        Raises:
+            MRTDecodeError: If the last record is truncated.
+    """
+    unpack_header = HEADER.unpack_from
+    unpack_microsecond = MICROSECOND.unpack_from
+    remainder = b''
+
+    for chunk in chunks:
+        buffer = remainder + chunk if remainder else chunk
+        view = memoryview(buffer)
+        end = len(buffer)
+        offset = 0
+
+        while end - offset >= 12:
+            timestamp, mrt_type, subtype, length = unpack_header(buffer, offset)
+            record_end = offset + 12 + length
+            if record_end > end:
+                break
+
+            if mrt_type in EXTENDED_TIMESTAMP_TYPES:
+                if length < 4:
+                    raise MRTDecodeError(f'Invalid extended timestamp record at offset {offset}')
+                yield MRTRecord(timestamp, unpack_microsecond(buffer, offset + 12)[0], mrt_type, subtype, 16, view[offset:record_end])
+            else:
+                yield MRTRecord(timestamp, 0, mrt_type, subtype, 12, view[offset:record_end])
+
+            offset = record_end
+
+        remainder = buffer[offset:]
+
+    if remainder:
+        raise MRTDecodeError(f'Truncated MRT record, {len(remainder)} trailing bytes')
+
+def encode_record(timestamp: int, mrt_type: int, subtype: int, body: bytes, microsecond: Optional[int] = None) -> bytes:
+    """ Encode an MRT record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timestamp (int): The epoch seconds.
+            mrt_type (int): The MRT type.
+            subtype (int): The MRT subtype.
+            body (bytes): The record body.
+            microsecond (Optional[int]): The microseconds of extended timestamp types.
+
+        Returns:
+            bytes: The encoded record.
+    """
+    if mrt_type in EXTENDED_TIMESTAMP_TYPES:
+        return HEADER.pack(timestamp, mrt_type, subtype, len(body) + 4) + MICROSECOND.pack(microsecond or 0) + body
+
+    return HEADER.pack(timestamp, mrt_type, subtype, len(body)) + body
+
+class MRTWriter:
+    """ Streaming writer of compressed MRT files.
+        Records are buffered and compressed in chunks, the file is moved into place when the writer is closed.
+        If an executor is given, chunks are compressed in parallel as concatenated streams.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, path: Path, codec: Optional[str] = None, chunk_size: int = CHUNK_SIZE, executor: Optional[Executor] = None, max_pending: int = 8):
+        """ Open an MRT file for writing.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                path (Path): The path to the MRT file.
+                codec (Optional[str]): The codec, derived from the suffix if not given.
+                chunk_size (int): The number of uncompressed bytes buffered before compressing.
+                executor (Optional[Executor]): The executor chunks are compressed in, preferably a process pool.
+                max_pending (int): The maximum number of chunks compressed at once.
+        """
+        self.path = path
+        self.codec = codec or get_codec(path)
+        self.chunk_size = chunk_size
+        self.temporary = path.with_name(f'.{path.name}.tmp')
+        self.file = open(self.temporary, 'wb')
+        self.compressor = _get_compressor(self.codec) if self.codec != 'none' and not executor else None
+        self.executor = executor if self.codec != 'none' else None
+        self.max_pending = max_pending
+        self.pending = deque()
+        self.buffer = []
+        self.buffered = 0
+        self.records = 0
+        self.bytes = 0
+
+    def write(self, data: Union[bytes, memoryview]):
+        """ Write an encoded MRT record.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                data (Union[bytes, memoryview]): The encoded MRT record.
+        """
+        self.buffer.append(data)
+        self.buffered += len(data)
+        self.records += 1
+        self.bytes += len(data)
+
+        if self.buffered >= self.chunk_size:
+            self._flush()
+
+    def _flush(self, final: bool = False):
+        """ Compress and write the buffered records.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                final (bool): Whether this is the last flush, an empty file still gets a valid stream.
+        """
+        data = b''.join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+
+        if not self.executor:
+            self.file.write(self.compressor.compress(data) if self.compressor else data)
+            return
+
+        if data or (final and not self.bytes):
+            self.pending.append(self.executor.submit(compress_chunk, self.codec, data))
+
+        # Chunks are written in submission order, waiting bounds the memory held by pending chunks
+        while len(self.pending) > self.max_pending:
+            self.file.write(self.pending.popleft().result())
+
+    def close(self):
+        """ Finish the compressed stream and move the file into place.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        self._flush(final=True)
+        while self.pending:
+            self.file.write(self.pending.popleft().result())
+        if self.compressor:
+            self.file.write(self.compressor.flush())
+        self.file.close()
+
+        os.replace(self.temporary, self.path)
+
+    def abort(self):
+        """ Discard the partially written file.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        for future in self.pending:
+            future.cancel()
+        self.pending.clear()
+
+        self.file.close()
+        self.temporary.unlink(missing_ok=True)
+
+    def __enter__(self) -> 'MRTWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            self.abort()
+        else:
+            self.close()
@@ -8,12 +8,16 @@ It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
 
 Author Benedikt SCHWERING <mail@bschwer.ing>
 """
+from src.services.index import is_index_fresh, iter_index
 from src.models.query import QueryRequest, QueryResponse
-from datetime import datetime
+from src.services.walk import iter_archive_ordered
+from src.services.snapshot import ArchiveSnapshot
+from src.services.filename import to_epoch
+from src.models.mrt_file import MRTFileName
+from typing import Iterator, Optional
 from pathlib import Path
-from rich import print
 
-def query(mrt_input_path: Path, request: QueryRequest) -> QueryResponse:
+def query(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None) -> QueryResponse:
     """ Query the MRT archive for a subset of MRTs.
 
         Author:
@@ -22,51 +26,76 @@ def query(mrt_input_path: Path, request: QueryRequest) -> QueryResponse:
         Params:
             mrt_input_path (Path): The path to the MRT input directory.
             request (QueryRequest): The query request.
+            layout (Optional[str]): The archive layout template used to prune the live scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared with other queries of this invocation.
 
         Returns:
             QueryResponse: The query response.
     """
-    response = QueryResponse(
-        mrt_files=[],
-        rib_file=None,
+    if not snapshot:
+        snapshot = ArchiveSnapshot(
+            mrt_input_path=mrt_input_path,
+            layout=layout,
+        )
+
+    return snapshot.query(
+        request=request,
     )
 
-    for path in mrt_input_path.glob('**/*.bz2'):
-        try:
-            # Extract the timestamp from the MRT file name
-            # Only consider MRT files within the selected time range
-            timestamp = datetime.strptime(
-                '_'.join(path.name.split('_')[0:2]),
-                '%Y%m%d_%H%M'
-            )
-            if not request.start_datetime <= timestamp < request.end_datetime:
-                continue
-
-            # Extract the vendor from the MRT file name
-            # Only consider MRT files from the selected vendor
-            vendor = path.name.split('_')[4]
-            if vendor not in request.vendor:
-                continue
-
-            # Extract the peer name from the MRT file name
-            # Only consider MRT files from the selected peer
-            peer_name = path.name.split('_')[6]
-            if peer_name not in request.peer_name:
-                continue
-
-            # Extract the BGP type from the MRT file name
-            # Only consider MRT files of the selected BGP type
-            bgp_type = path.name.split('_')[7].split('.')[0]
-            if bgp_type not in request.bgp_type:
-                continue
-
-            if bgp_type == 'rib':
-                response.rib_file = path
-            if bgp_type == 'update':
-                response.mrt_files.append(path)
-        except:
-            print(f'[red]\[warning][/] Cannot parse MRT file [purple]{path}[/]')
-
-    response.mrt_files.sort()
-
-    return response
+def iter_query(mrt_input_path: Path, request: QueryRequest, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None) -> Iterator[tuple[MRTFileName, Path]]:
+    """ Query the MRT archive for a subset of MRTs and yield matches in timestamp order as soon as they are known.
+        The archive index or the ordered archive layout is used to avoid collecting and sorting all matches first.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request.
+            layout (Optional[str]): The archive layout template used to walk the archive in order.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot, used if it can answer the request without a scan.
+
+        Returns:
+            Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the matching MRT files.
+    """
+    if snapshot and (snapshot.use_index or snapshot.is_scanned(request)):
+        yield from snapshot.iterate(request)
+        return
+
+    if is_index_fresh(mrt_input_path, request):
+        yield from iter_index(
+            mrt_input_path=mrt_input_path,
+            request=request,
+        )
+        return
+
+    # Without an ordered layout all matches have to be collected and sorted first
+    if not layout:
+        yield from (snapshot or ArchiveSnapshot(mrt_input_path)).iterate(request)
+        return
+
+    start = to_epoch(request.start_datetime)
+    end = to_epoch(request.end_datetime)
+    vendors = set(request.vendor)
+    peer_names = set(request.peer_name)
+    bgp_types = set(request.bgp_type)
+
+    for mrt_file_name, path in iter_archive_ordered(
+        mrt_input_path=mrt_input_path,
+        request=request,
+        layout=layout,
+    ):
+        # Files are ordered, so nothing after the end of the time range can match
+        if mrt_file_name.timestamp >= end:
+            break
+
+        if mrt_file_name.timestamp < start:
+            continue
+        if mrt_file_name.vendor not in vendors:
+            continue
+        if mrt_file_name.peer_name not in peer_names:
+            continue
+        if mrt_file_name.bgp_type not in bgp_types:
+            continue
+
+        yield mrt_file_name, path
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.models.rewrite import RewriteTask, RewriteResult
+from src.services.filter import CompiledFilter, get_filter_digest
+from src.models.filter import RecordFilter
+from src.services.filename import from_epoch, parse_mrt_file_name
+from src.services.mrt import MRTDecodeError, MRTWriter, get_codec, get_codec_suffix, iter_records
+from src.services.stats import StatsCounter
+from src.services.timings import timed
+from datetime import timedelta
+from typing import Optional
+from pathlib import Path
+from rich import print
+import time
+
+# LW update files cover 15 minutes starting at the timestamp in their name
+UPDATE_FILE_INTERVAL = timedelta(minutes=15)
+
+def _is_up_to_date(task: RewriteTask) -> bool:
+    """ Check whether the target of a rewrite task is newer than its source.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            task (RewriteTask): The rewrite task.
+
+        Returns:
+            bool: True if the target does not have to be rewritten.
+    """
+    return task.target.exists() and task.target.stat().st_mtime_ns >= task.source.stat().st_mtime_ns
+
+def rewrite_file(task: RewriteTask, record_filter: Optional[CompiledFilter] = None) -> RewriteResult:
+    """ Stream-decode an MRT file and write the records of the task window that pass the task filter to a new compressed file.
+        Memory is bounded by the read and write chunk sizes, independent of the file size.
+        Empty outputs are not written and targets newer than their source are skipped.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            task (RewriteTask): The rewrite task.
+            record_filter (Optional[CompiledFilter]): The compiled task filter carrying the state of earlier files, compiled from the task if not given.
+
+        Returns:
+            RewriteResult: The rewrite result.
+    """
+    start_time = time.perf_counter()
+
+    if _is_up_to_date(task):
+        return RewriteResult(
+            source=task.source,
+            target=task.target,
+            input_records=0,
+            output_records=0,
+            input_bytes=task.source.stat().st_size,
+            output_bytes=task.target.stat().st_size,
+            duration=time.perf_counter() - start_time,
+            skipped=True,
+        )
+
+    start = task.start if task.start is not None else -1
+    end = task.end if task.end is not None else 1 << 32
+    if not record_filter and task.record_filter:
+        record_filter = CompiledFilter(task.record_filter)
+    counter = StatsCounter() if task.stats else None
+    seeded = record_filter is not None and record_filter.is_stateful
+    input_records = 0
+
+    with MRTWriter(task.target) as writer:
+        for record in iter_records(task.source):
+            input_records += 1
+
+            # Records before the window still carry announcements whose withdrawals are kept
+            if record.timestamp < start:
+                if seeded:
+                    record_filter.seed(record)
+                continue
+            if record.timestamp >= end:
+                continue
+
+            data = record_filter.filter(record) if record_filter else record.data
+            if data is not None:
+                writer.write(data)
+
+                # A record the statistics cannot decode leaves them to the stats command, which reports the file
+                if counter:
+                    try:
+                        counter.add_record(record)
+                    except MRTDecodeError:
+                        counter = None
+
+    if not writer.records:
+        task.target.unlink()
+
+    return RewriteResult(
+        source=task.source,
+        target=task.target,
+        input_records=input_records,
+        output_records=writer.records,
+        input_bytes=task.source.stat().st_size,
+        output_bytes=task.target.stat().st_size if writer.records else 0,
+        duration=time.perf_counter() - start_time,
+        stats=counter.finish(task.target) if counter and writer.records else None,
+    )
+
+def _feed_filter(task: RewriteTask, record_filter: CompiledFilter):
+    """ Pass the records up to the end of the task window through a filter without writing them, only to update the filter state.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            task (RewriteTask): The rewrite task.
+            record_filter (CompiledFilter): The compiled task filter.
+    """
+    end = task.end if task.end is not None else 1 << 32
+
+    for record in iter_records(task.source):
+        if record.timestamp < end:
+            record_filter.seed(record)
+
+def rewrite_stream(tasks: list[RewriteTask]) -> list[RewriteResult]:
+    """ Rewrite the files of a stream one after another in timestamp order.
+        The filter state is carried across the files, so path changes of prefixes announced with a matching AS path in an earlier file are kept.
+        The state is seeded with the seed files of the first task, so are withdrawals and path changes of announcements before the window.
+        Up-to-date targets are skipped, their records only pass the filter if a later file of the stream is rewritten.
+        Files that cannot be read or decoded are reported as failed and the stream continues with the next file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            tasks (list[RewriteTask]): The rewrite tasks of the stream in timestamp order.
+
+        Returns:
+            list[RewriteResult]: The rewrite results in the order of the tasks.
+    """
+    record_filter = CompiledFilter(tasks[0].record_filter) if tasks[0].record_filter else None
+    last_rewritten = max((index for index, task in enumerate(tasks) if not _is_up_to_date(task)), default=-1)
+    results = []
+
+    if record_filter and record_filter.is_stateful and tasks[0].seed_files and last_rewritten >= 0:
+        mrt_file_name = parse_mrt_file_name(tasks[0].source.name)
+        record_filter.seed_files(tasks[0].seed_files, mrt_file_name.timestamp if mrt_file_name else tasks[0].start or 0)
+
+    for index, task in enumerate(tasks):
+        try:
+            if record_filter and index < last_rewritten and _is_up_to_date(task):
+                _feed_filter(task, record_filter)
+
+            results.append(rewrite_file(task, record_filter))
+        except (MRTDecodeError, OSError) as error:
+            results.append(RewriteResult(
+                source=task.source,
+                target=task.target,
+                input_records=0,
+                output_records=0,
+                input_bytes=0,
+                output_bytes=0,
+                duration=0,
+                failed=True,
+                error=str(error),
+            ))
+
+    return results
+
+def get_rewrite_streams(tasks: list[RewriteTask]) -> list[list[int]]:
+    """ Group rewrite tasks into streams that have to be rewritten one file after another.
+        Only filters on the AS path carry state from one file to the next, so the files of each peer form one stream in timestamp order,
+        otherwise every file is a stream of its own and all files are rewritten in parallel.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            tasks (list[RewriteTask]): The rewrite tasks.
+
+        Returns:
+            list[list[int]]: The task indexes of each stream.
+    """
+    if not any(task.record_filter and (task.record_filter.origin_asns or task.record_filter.as_path_contains) for task in tasks):
+        return [[index] for index in range(len(tasks))]
+
+    streams = {}
+
+    for index, task in enumerate(tasks):
+        mrt_file_name = parse_mrt_file_name(task.source.name)
+        key = (mrt_file_name.vendor, mrt_file_name.peer_name) if mrt_file_name else task.source
+        streams.setdefault(key, []).append((mrt_file_name.timestamp if mrt_file_name else 0, index))
+
+    return [
+        [index for _, index in sorted(stream)]
+        for stream in streams.values()
+    ]
+
+@timed('rewrite', files=len, bytes=lambda results: sum(result.input_bytes for result in results))
+def rewrite_files(tasks: list[RewriteTask], jobs: int = 4) -> list[RewriteResult]:
+    """ Rewrite MRT files in parallel using a process pool, the files of a stream are rewritten in order by the same worker.
+        Files that cannot be read or decoded are reported as failed instead of aborting the other rewrites.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            tasks (list[RewriteTask]): The rewrite tasks.
+            jobs (int): The number of worker processes.
+
+        Returns:
+            list[RewriteResult]: The rewrite results in the order of the tasks.
+    """
+    if not tasks:
+        return []
+
+    results = {}
+    streams = get_rewrite_streams(tasks)
+
+    with Progress(
+        '[progress.description]{task.description}',
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeRemainingColumn(),
+    ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(streams)), 1)) as executor:
+        progress_task = progress.add_task(
+            description='Rewrite',
+            total=len(tasks),
+        )
+        futures = {
+            executor.submit(rewrite_stream, [tasks[index] for index in stream]): stream
+            for stream in streams
+        }
+
+        for future in as_completed(futures):
+            for index, result in zip(futures[future], future.result()):
+                if result.failed:
+                    print(f'[red]\[warning][/] Cannot rewrite [purple]{result.source}[/]: {result.error}')
+
+                results[index] = result
+
+            progress.advance(progress_task, len(futures[future]))
+
+    return [results[index] for index in range(len(tasks))]
+
+def get_rewrite_name(name: str, codec: Optional[str] = None, window: Optional[tuple[int, int]] = None, record_filter: Optional[RecordFilter] = None) -> str:
+    """ Get the name of a rewritten MRT file.
+        The name contains the part of the file that is kept, so different windows and filters do not overwrite each other,
+        and the suffix of the codec the file is written with.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The name of the source file.
+            codec (Optional[str]): The codec, the codec of the source file is kept if not given.
+            window (Optional[tuple[int, int]]): The epoch range of the kept records.
+            record_filter (Optional[RecordFilter]): The filter of the kept records.
+
+        Returns:
+            str: The name of the rewritten file.
+    """
+    stem, _, suffix = name.partition('.')
+    suffix = get_codec_suffix(codec) if codec else f'.{suffix}'
+
+    if window:
+        stem = f'{stem}.{from_epoch(window[0]):%H%M%S}-{from_epoch(window[1]):%H%M%S}'
+    if record_filter:
+        stem = f'{stem}.filtered-{get_filter_digest(record_filter)}'
+
+    return f'{stem}{suffix}'
+
+def get_rewrite_tasks(mrt_files: list[Path], mrt_file_timestamps: list[int], target_directory: Path, window: Optional[tuple[int, int]] = None, codec: Optional[str] = None, record_filter: Optional[RecordFilter] = None, stats: bool = False, seed_files: Optional[dict[str, list[Path]]] = None) -> tuple[list[Path], list[RewriteTask]]:
+    """ Split update files into files that can be transferred as-is and files that have to be rewritten.
+        Files at the boundaries of a window are trimmed, all files are rewritten if they are filtered or transcoded to another codec.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_files (list[Path]): The update files.
+            mrt_file_timestamps (list[int]): The epoch timestamps of the update files.
+            target_directory (Path): The directory rewritten files are written to.
+            window (Optional[tuple[int, int]]): The epoch range records are trimmed to.
+            codec (Optional[str]): The codec files are transcoded to.
+            record_filter (Optional[RecordFilter]): The filter records are reduced to.
+            stats (bool): Collect the statistics of the rewritten files.
+            seed_files (Optional[dict[str, list[Path]]]): The RIB dump and update files before the window the filter of each peer name is seeded with.
+
+        Returns:
+            tuple[list[Path], list[RewriteTask]]: The files to transfer and the rewrite tasks.
+    """
+    interval = int(UPDATE_FILE_INTERVAL.total_seconds())
+    unchanged = []
+    tasks = []
+
+    for mrt_file, timestamp in zip(mrt_files, mrt_file_timestamps):
+        transcode = codec is not None and codec != get_codec(mrt_file)
+
+        if window and not (window[0] <= timestamp and timestamp + interval <= window[1]):
+            file_window = (max(window[0], timestamp), min(window[1], timestamp + interval))
+        elif transcode or record_filter:
+            file_window = None
+        else:
+            unchanged.append(mrt_file)
+            continue
+
+        mrt_file_name = parse_mrt_file_name(mrt_file.name)
+
+        tasks.append(RewriteTask(
+            source=mrt_file,
+            target=target_directory / get_rewrite_name(mrt_file.name, codec, file_window, record_filter),
+            start=file_window[0] if file_window else None,
+            end=file_window[1] if file_window else None,
+            record_filter=record_filter,
+            stats=stats,
+            seed_files=seed_files.get(mrt_file_name.peer_name, []) if seed_files and mrt_file_name else [],
+        ))
+
+    return unchanged, tasks
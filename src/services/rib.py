@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.bgp import AFI_IPV4, AFI_IPV6, ADDRESS_LENGTH, UINT32, decode_bgp4mp_update, decode_peer_index_table, decode_rib_entry, encode_peer_index_table, encode_rib_entry, get_rib_attributes
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeElapsedColumn
+from src.services.filename import parse_mrt_file_name, from_epoch, to_epoch
+from src.services.mrt import MRTDecodeError, MRTWriter, get_codec_suffix, iter_records
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.models.rib import RIBSynthesisTask, RIBSynthesisResult
+from src.services.rewrite import UPDATE_FILE_INTERVAL
+from src.services.snapshot import ArchiveSnapshot
+from src.services.query import query as query_service
+from src.services.seek import records_between
+from src.models.mrt_record import BGPUpdate, Peer
+from src.models.query import QueryRequest
+from src.services.trie import PrefixTrie
+from src.services.timings import timed
+from datetime import timedelta
+from typing import Iterator, Optional
+from pathlib import Path
+from rich import print
+import itertools
+import heapq
+import time
+import sys
+
+# How far before the window start the nearest RIB dump is searched
+RIB_LOOKBACK = timedelta(days=1)
+
+class RIBTable:
+    """ Compact in-memory RIB of all peers of a collector.
+        Every peer has one prefix trie per address family whose values are ids of interned path attributes,
+        so identical attributes of many prefixes and peers are stored once.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self):
+        """ Create an empty RIB.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        self.collector_bgp_id = 0
+        self.peers = []
+        self.peer_indexes = {}
+        self.tries = []
+        self.attributes = []
+        self.attribute_ids = {}
+
+    def add_peer(self, peer: Peer) -> int:
+        """ Add a peer with empty tries.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                peer (Peer): The peer.
+
+            Returns:
+                int: The peer index.
+        """
+        self.peers.append(peer)
+        self.peer_indexes.setdefault(peer.ip, len(self.peers) - 1)
+        self.tries.append({
+            afi: PrefixTrie(ADDRESS_LENGTH[afi] * 8)
+            for afi in (AFI_IPV4, AFI_IPV6)
+        })
+
+        return len(self.peers) - 1
+
+    def intern(self, attributes: bytes) -> int:
+        """ Get the id of path attributes, adding them if they are new.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                attributes (bytes): The encoded path attributes.
+
+            Returns:
+                int: The attribute id.
+        """
+        attribute_id = self.attribute_ids.get(attributes)
+
+        if attribute_id is None:
+            attribute_id = self.attribute_ids[attributes] = len(self.attributes)
+            self.attributes.append(attributes)
+
+        return attribute_id
+
+    def compact(self):
+        """ Drop the interned path attributes no prefix refers to anymore, since withdrawn or replaced routes leave them behind.
+            The attribute ids of the tries are renumbered in the order of the remaining attributes.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        tries = [trie for peer_tries in self.tries for trie in peer_tries.values()]
+        live = sorted({value for trie in tries for value in trie.values if value >= 0})
+
+        if len(live) == len(self.attributes):
+            return
+
+        mapping = {attribute_id: index for index, attribute_id in enumerate(live)}
+        for trie in tries:
+            values = trie.values
+            for node, value in enumerate(values):
+                if value >= 0:
+                    values[node] = mapping[value]
+
+        self.attributes = [self.attributes[attribute_id] for attribute_id in live]
+        self.attribute_ids = {attributes: index for index, attributes in enumerate(self.attributes)}
+
+    def load(self, path: Path):
+        """ Load a TABLE_DUMP_V2 RIB dump.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                path (Path): The path to the RIB file.
+        """
+        peer_count = 0
+
+        for record in iter_records(path):
+            peers = decode_peer_index_table(record)
+            if peers is not None:
+                self.collector_bgp_id = UINT32.unpack_from(record.data, record.header_length)[0]
+                peer_count = len(peers)
+                for peer in peers:
+                    self.add_peer(peer)
+                continue
+
+            entry = decode_rib_entry(record)
+            if not entry:
+                continue
+
+            afi, network, length = entry.prefix
+            for peer_index, originated_time, attributes in entry.entries:
+                if peer_index < peer_count:
+                    self.tries[peer_index][afi].insert(network, length, self.intern(bytes(attributes)), originated_time)
+
+    def apply(self, update: BGPUpdate):
+        """ Apply the withdrawals and announcements of a BGP update.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                update (BGPUpdate): The BGP update.
+        """
+        peer_index = self.peer_indexes.get(update.peer_ip)
+        if peer_index is None:
+            afi, address = update.peer_ip
+            peer_index = self.add_peer(Peer(address if afi == AFI_IPV4 else 0, update.peer_ip, update.peer_as))
+
+        tries = self.tries[peer_index]
+
+        for afi, network, length in update.withdrawn:
+            tries[afi].delete(network, length)
+
+        if update.announced:
+            attribute_id = self.intern(get_rib_attributes(update.attributes, update.as4))
+            for afi, network, length in update.announced:
+                tries[afi].insert(network, length, attribute_id, update.timestamp)
+
+    def iter_records(self, timestamp: int) -> Iterator[bytes]:
+        """ Iterate the encoded records of a TABLE_DUMP_V2 dump of the RIB.
+            The tries of all peers are merged in prefix order, so every prefix is written once with the entries of all peers.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                timestamp (int): The epoch seconds of the dump.
+
+            Returns:
+                Iterator[bytes]: The encoded records.
+        """
+        yield encode_peer_index_table(timestamp, self.collector_bgp_id, self.peers)
+
+        sequence = 0
+
+        for afi in (AFI_IPV4, AFI_IPV6):
+            routes = heapq.merge(*(
+                ((network, length, peer_index, value, stamp) for network, length, value, stamp in tries[afi].items())
+                for peer_index, tries in enumerate(self.tries)
+            ))
+
+            for (network, length), group in itertools.groupby(routes, key=lambda route: route[:2]):
+                yield encode_rib_entry(timestamp, sequence, (afi, network, length), [
+                    (peer_index, stamp, self.attributes[value])
+                    for _, _, peer_index, value, stamp in group
+                ])
+                sequence += 1
+
+    def get_prefix_count(self, peer_index: int) -> int:
+        """ Get the number of prefixes of a peer.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                peer_index (int): The peer index.
+
+            Returns:
+                int: The number of prefixes.
+        """
+        return sum(len(trie) for trie in self.tries[peer_index].values())
+
+    def get_trie_memory(self, peer_index: int) -> int:
+        """ Get the memory of the tries of a peer.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                peer_index (int): The peer index.
+
+            Returns:
+                int: The size in bytes.
+        """
+        return sum(trie.get_memory() for trie in self.tries[peer_index].values())
+
+    def get_attribute_memory(self) -> int:
+        """ Get the memory of the interned path attributes shared by all peers.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Returns:
+                int: The size in bytes.
+        """
+        return sys.getsizeof(self.attributes) + sys.getsizeof(self.attribute_ids) + sum(map(sys.getsizeof, self.attributes))
+
+def get_synthetic_rib_name(rib_file: Path, peer_name: str, timestamp: int, codec: Optional[str] = None) -> str:
+    """ Get the name of a synthetic RIB in the naming scheme of the archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            rib_file (Path): The RIB dump the synthetic RIB is based on.
+            peer_name (str): The peer name.
+            timestamp (int): The epoch seconds of the synthetic RIB.
+            codec (Optional[str]): The codec, bz2 if not given.
+
+        Returns:
+            str: The file name.
+    """
+    mrt_file_name = parse_mrt_file_name(rib_file.name)
+
+    return f'{from_epoch(timestamp):%Y%m%d_%H%M}_{timestamp}_bgp_{mrt_file_name.vendor}_ixp_{peer_name}_rib.synthetic{get_codec_suffix(codec or "bz2")}'
+
+def get_rib_lookback(mrt_input_path: Path, request: QueryRequest, peer_name: str, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None) -> Optional[tuple[Path, list[Path]]]:
+    """ Locate the nearest RIB dump of a peer at or before the window start and the update files since then.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the window.
+            peer_name (str): The peer name.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+
+        Returns:
+            Optional[tuple[Path, list[Path]]]: The RIB dump and the update files or None if there is no RIB dump within the lookback.
+    """
+    rib_file = query_service(
+        mrt_input_path=mrt_input_path,
+        request=request.model_copy(
+            update={
+                'peer_name': [peer_name],
+                'bgp_type': ['rib'],
+                'start_datetime': request.start_datetime - RIB_LOOKBACK,
+                'end_datetime': request.start_datetime + timedelta(seconds=1),
+            },
+        ),
+        layout=layout,
+        snapshot=snapshot,
+    ).rib_file
+
+    if not rib_file:
+        return None
+
+    update_files = query_service(
+        mrt_input_path=mrt_input_path,
+        request=request.model_copy(
+            update={
+                'peer_name': [peer_name],
+                'bgp_type': ['update'],
+                'start_datetime': from_epoch(parse_mrt_file_name(rib_file.name).timestamp) - UPDATE_FILE_INTERVAL + timedelta(seconds=1),
+                'end_datetime': request.start_datetime,
+            },
+        ),
+        layout=layout,
+        snapshot=snapshot,
+    ).mrt_files
+
+    return rib_file, update_files
+
+def get_rib_synthesis_tasks(mrt_input_path: Path, request: QueryRequest, target_directory: Path, layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None, codec: Optional[str] = None) -> tuple[list[RIBSynthesisTask], list[str]]:
+    """ Locate the nearest RIB dump at or before the window start and the update files since then for every peer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the window.
+            target_directory (Path): The directory synthetic RIBs are written to.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+            codec (Optional[str]): The codec of the synthetic RIBs.
+
+        Returns:
+            tuple[list[RIBSynthesisTask], list[str]]: The tasks and the peer names without a RIB dump.
+    """
+    timestamp = to_epoch(request.start_datetime)
+    tasks = []
+    missing = []
+
+    for peer_name in request.peer_name:
+        lookback = get_rib_lookback(
+            mrt_input_path=mrt_input_path,
+            request=request,
+            peer_name=peer_name,
+            layout=layout,
+            snapshot=snapshot,
+        )
+
+        if not lookback:
+            missing.append(peer_name)
+            continue
+
+        rib_file, update_files = lookback
+
+        tasks.append(RIBSynthesisTask(
+            peer_name=peer_name,
+            rib_file=rib_file,
+            update_files=update_files,
+            timestamp=timestamp,
+            target=target_directory / get_synthetic_rib_name(rib_file, peer_name, timestamp, codec),
+        ))
+
+    return tasks, missing
+
+def get_filter_seed_files(mrt_input_path: Path, request: QueryRequest, mrt_files: list[Path], layout: Optional[str] = None, snapshot: Optional[ArchiveSnapshot] = None) -> dict[str, list[Path]]:
+    """ Get the files an AS path filter of every peer is seeded with, the nearest RIB dump before the window and the update files since then.
+        Update files that are filtered themselves are left out, their records before the window seed the filter while it reads them.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request of the window.
+            mrt_files (list[Path]): The filtered update files.
+            layout (Optional[str]): The archive layout template used to prune the archive scan.
+            snapshot (Optional[ArchiveSnapshot]): The archive snapshot shared by chained commands.
+
+        Returns:
+            dict[str, list[Path]]: The RIB dump followed by the update files of each peer name with a RIB dump within the lookback.
+    """
+    filtered = set(mrt_files)
+    seed_files = {}
+
+    for peer_name in request.peer_name:
+        lookback = get_rib_lookback(
+            mrt_input_path=mrt_input_path,
+            request=request,
+            peer_name=peer_name,
+            layout=layout,
+            snapshot=snapshot,
+        )
+
+        if lookback:
+            rib_file, update_files = lookback
+            seed_files[peer_name] = [rib_file] + [update_file for update_file in update_files if update_file not in filtered]
+
+    return seed_files
+
+def synthesize_rib(task: RIBSynthesisTask) -> RIBSynthesisResult:
+    """ Synthesize a RIB at the task timestamp from the RIB dump and the updates in between.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            task (RIBSynthesisTask): The RIB synthesis task.
+
+        Returns:
+            RIBSynthesisResult: The RIB synthesis result.
+    """
+    start_time = time.perf_counter()
+    rib_timestamp = parse_mrt_file_name(task.rib_file.name).timestamp
+
+    table = RIBTable()
+    table.load(task.rib_file)
+
+    # Compacting whenever the interned attributes doubled bounds them by twice the live attributes at amortized linear cost
+    compacted = len(table.attributes)
+    updates = 0
+    for update_file in task.update_files:
+        for record in records_between(update_file, rib_timestamp, task.timestamp):
+            update = decode_bgp4mp_update(record)
+            if update:
+                table.apply(update)
+                updates += 1
+
+        if len(table.attributes) > 2 * compacted:
+            table.compact()
+            compacted = len(table.attributes)
+
+    table.compact()
+
+    with MRTWriter(task.target) as writer:
+        for data in table.iter_records(task.timestamp):
+            writer.write(data)
+
+    largest_peer = max(range(len(table.peers)), key=table.get_prefix_count, default=None)
+
+    return RIBSynthesisResult(
+        peer_name=task.peer_name,
+        rib_file=task.rib_file,
+        target=task.target,
+        update_files=len(task.update_files),
+        updates=updates,
+        peers=len(table.peers),
+        prefixes=sum(map(table.get_prefix_count, range(len(table.peers)))),
+        attributes=len(table.attributes),
+        largest_peer_prefixes=table.get_prefix_count(largest_peer) if largest_peer is not None else 0,
+        largest_peer_bytes=table.get_trie_memory(largest_peer) if largest_peer is not None else 0,
+        trie_bytes=sum(map(table.get_trie_memory, range(len(table.peers)))),
+        attribute_bytes=table.get_attribute_memory(),
+        duration=time.perf_counter() - start_time,
+    )
+
+@timed('rib', files=len)
+def synthesize_ribs(tasks: list[RIBSynthesisTask], jobs: int = 4) -> list[RIBSynthesisResult]:
+    """ Synthesize the RIBs of several peers in parallel worker processes.
+        Peers whose RIB dump or update files cannot be read or decoded are reported as failed instead of aborting the other peers.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            tasks (list[RIBSynthesisTask]): The RIB synthesis tasks.
+            jobs (int): The number of worker processes.
+
+        Returns:
+            list[RIBSynthesisResult]: The results in the order of the tasks.
+    """
+    if not tasks:
+        return []
+
+    results = {}
+
+    with Progress(
+        '[progress.description]{task.description}',
+        BarColumn(),
+        MofNCompleteColumn(),
+        TimeElapsedColumn(),
+    ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(tasks)), 1)) as executor:
+        progress_task = progress.add_task(
+            description='Synthesize RIB',
+            total=len(tasks),
+        )
+        futures = {
+            executor.submit(synthesize_rib, task): index
+            for index, task in enumerate(tasks)
+        }
+
+        for future in as_completed(futures):
+            index = futures[future]
+
+            try:
+                results[index] = future.result()
+            except (MRTDecodeError, OSError) as error:
+                print(f'[red]\[warning][/] Cannot synthesize the RIB of [blue]{tasks[index].peer_name}[/]: {error}')
+                results[index] = RIBSynthesisResult(
+                    peer_name=tasks[index].peer_name,
+                    rib_file=tasks[index].rib_file,
+                    target=tasks[index].target,
+                    update_files=len(tasks[index].update_files),
+                    updates=0,
+                    peers=0,
+                    prefixes=0,
+                    attributes=0,
+                    largest_peer_prefixes=0,
+                    largest_peer_bytes=0,
+                    trie_bytes=0,
+                    attribute_bytes=0,
+                    duration=0,
+                    failed=True,
+                )
+
+            progress.advance(progress_task)
+
+    return [results[index] for index in range(len(tasks))]
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.mrt_scenario import MRTScenario
+from src.services.mrt import get_codec
+from src.services.timings import timed
+from pathlib import Path
+import os
+
+SCENARIO_FILE = 'scenario.json'
+
+@timed('scenario.read')
+def load_scenario(scenario_output_path: Path) -> MRTScenario:
+    """ Load the scenario file of a scenario directory.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+
+        Returns:
+            MRTScenario: The scenario.
+    """
+    return MRTScenario.model_validate_json(
+        json_data=(scenario_output_path / SCENARIO_FILE).read_text(),
+    )
+
+@timed('scenario.write')
+def save_scenario(scenario_output_path: Path, scenario: MRTScenario):
+    """ Write the scenario file of a scenario directory atomically.
+        The MRT and RIB files are deduplicated and sorted and the codec of each file is recorded before writing.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            scenario (MRTScenario): The scenario.
+    """
+    scenario.mrt_files = sorted(set(scenario.mrt_files))
+    scenario.rib_files = sorted(set(scenario.rib_files))
+    scenario.mrt_file_codecs = {
+        mrt_file: get_codec(Path(mrt_file))
+        for mrt_file in scenario.mrt_files + scenario.rib_files
+    }
+
+    temporary = scenario_output_path / f'.{SCENARIO_FILE}.tmp'
+    temporary.write_text(
+        data=scenario.model_dump_json(
+            indent=4,
+        ),
+    )
+    os.replace(temporary, scenario_output_path / SCENARIO_FILE)
@@ -0,0 +1,501 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+from src.services.mrt import HEADER, MRTDecodeError, get_codec, iter_buffer_records, iter_records
+from src.models.seek import SeekBlock, SeekEntry, SeekIndexResult
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.models.mrt_record import MRTRecord
+from src.services.timings import timed
+from contextlib import nullcontext
+from typing import Iterator
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+import struct
+import mmap
+import time
+import bz2
+import os
+
+SEEK_INDEX_SUFFIX = '.idx'
+
+# Layout: header, block table and entry table, all fixed-width little endian
+SEEK_INDEX_MAGIC = b'MRTAWKI1'
+SEEK_INDEX_HEADER = struct.Struct('<8sBBHIIQQ')
+SEEK_INDEX_BLOCK = struct.Struct('<QQQ')
+SEEK_INDEX_ENTRY = struct.Struct('<III')
+
+SEEK_INDEX_CODECS = {
+    'none': 0,
+    'bz2': 1,
+}
+SORTED_FLAG = 1
+
+BLOCK_MAGIC = 0x314159265359
+END_MAGIC = 0x177245385090
+MAGIC_BITS = 48
+
+def get_seek_index_path(path: Path) -> Path:
+    """ Get the path of the seek index of an MRT file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            Path: The path to the seek index.
+    """
+    return path.with_name(path.name + SEEK_INDEX_SUFFIX)
+
+def _find_bit_pattern(data: bytes, pattern: int, bits: int = MAGIC_BITS) -> list[int]:
+    """ Find all bit offsets of a pattern that is not aligned to bytes.
+        For every bit shift, the bytes fully covered by the pattern are searched and the partial edge bytes are verified.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            data (bytes): The data.
+            pattern (int): The pattern.
+            bits (int): The length of the pattern in bits.
+
+        Returns:
+            list[int]: The sorted bit offsets.
+    """
+    offsets = []
+
+    for shift in range(8):
+        size = (shift + bits + 7) // 8
+        padding = size * 8 - shift - bits
+        value = pattern << padding
+        mask = ((1 << bits) - 1) << padding
+
+        first = 1 if shift else 0
+        last = size - 1 if padding else size
+        needle = value.to_bytes(size, 'big')[first:last]
+
+        position = data.find(needle)
+        while position != -1:
+            start = position - first
+            if start >= 0 and start + size <= len(data) and int.from_bytes(data[start:start + size], 'big') & mask == value:
+                offsets.append(start * 8 + shift)
+            position = data.find(needle, position + 1)
+
+    return sorted(offsets)
+
+def _extract_bits(data: bytes, start: int, end: int) -> int:
+    """ Extract the bits [start, end) of data as an integer.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            data (bytes): The data.
+            start (int): The first bit.
+            end (int): The bit after the last bit.
+
+        Returns:
+            int: The bits.
+    """
+    last = (end + 7) // 8
+    value = int.from_bytes(data[start // 8:last], 'big') >> (last * 8 - end)
+
+    return value & ((1 << (end - start)) - 1)
+
+def _get_block_stream(data: bytes, start: int, end: int) -> bytes:
+    """ Wrap a single bz2 block into a complete bz2 stream.
+        The stream CRC of a single block stream equals the CRC of the block.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            data (bytes): The compressed file.
+            start (int): The bit offset of the block magic.
+            end (int): The bit offset after the block.
+
+        Returns:
+            bytes: The bz2 stream.
+    """
+    crc = _extract_bits(data, start + MAGIC_BITS, start + MAGIC_BITS + 32)
+    bits = end - start + MAGIC_BITS + 32
+    padding = -bits % 8
+    value = ((_extract_bits(data, start, end) << (MAGIC_BITS + 32)) | (END_MAGIC << 32) | crc) << padding
+
+    return b'BZh9' + value.to_bytes((bits + padding) // 8, 'big')
+
+def _iter_bz2_blocks(data: bytes) -> Iterator[tuple[int, int, bytes]]:
+    """ Split a bz2 file into its blocks and decompress each block independently.
+        Magic numbers found inside compressed data are detected by the CRC check and skipped.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            data (bytes): The compressed file.
+
+        Returns:
+            Iterator[tuple[int, int, bytes]]: The bit range and decompressed data of each block.
+
+        Raises:
+            MRTDecodeError: If a block cannot be decompressed.
+    """
+    block_offsets = _find_bit_pattern(data, BLOCK_MAGIC)
+    markers = sorted(block_offsets + _find_bit_pattern(data, END_MAGIC))
+    block_offsets = set(block_offsets)
+    index = 0
+
+    while index < len(markers):
+        start = markers[index]
+        if start not in block_offsets:
+            index += 1
+            continue
+
+        # The block ends at the next marker, unless that marker is a false positive inside the block
+        for end_index in range(index + 1, len(markers)):
+            try:
+                output = bz2.decompress(_get_block_stream(data, start, markers[end_index]))
+                break
+            except (OSError, ValueError, EOFError):
+                continue
+        else:
+            raise MRTDecodeError(f'Corrupt or truncated bz2 block at bit {start}')
+
+        yield start, markers[end_index], output
+        index = end_index
+
+def build_seek_index(path: Path) -> tuple[int, int]:
+    """ Build the seek index of an MRT file.
+        The file is decompressed block by block and the first record of every new maximum timestamp
+        is recorded with its block and offset, so a reader can start decoding right before a timestamp.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            tuple[int, int]: The number of blocks and entries.
+
+        Raises:
+            ValueError: If the codec of the file does not support seeking.
+            MRTDecodeError: If the file is truncated or corrupt.
+    """
+    codec = get_codec(path)
+    if codec not in SEEK_INDEX_CODECS:
+        raise ValueError(f'Seek index is not supported for {codec} files')
+
+    stat = path.stat()
+
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else nullcontext(b'') as data:
+        if codec == 'bz2':
+            blocks = _iter_bz2_blocks(data)
+        else:
+            blocks = iter([(0, len(data) * 8, data)] if stat.st_size else [])
+
+        block_table = []
+        block_starts = []
+        entries = []
+        is_sorted = True
+        maximum = -1
+        previous = -1
+        total = 0
+        next_record = 0
+        carry = b''
+
+        for bit_offset, bit_end, output in blocks:
+            block_table.append(SeekBlock(bit_offset, bit_end, total))
+            block_starts.append(total)
+
+            # Only the bytes of a header split between two blocks are carried over
+            buffer = carry + output if carry else output
+            base = total - len(carry)
+            total += len(output)
+            position = next_record - base
+
+            while position + HEADER.size <= len(buffer):
+                timestamp, _, _, length = HEADER.unpack_from(buffer, position)
+                absolute = base + position
+
+                if timestamp > maximum:
+                    block = bisect_right(block_starts, absolute) - 1
+                    entries.append(SeekEntry(timestamp, block, absolute - block_starts[block]))
+                    maximum = timestamp
+                if timestamp < previous:
+                    is_sorted = False
+
+                previous = timestamp
+                position += HEADER.size + length
+
+            next_record = base + position
+            carry = bytes(buffer[position:]) if position < len(buffer) else b''
+
+        if next_record != total:
+            raise MRTDecodeError(f'Truncated MRT record at offset {next_record}')
+
+    index_path = get_seek_index_path(path)
+    temporary = index_path.with_name(f'.{index_path.name}.tmp')
+
+    with open(temporary, 'wb') as file:
+        file.write(SEEK_INDEX_HEADER.pack(
+            SEEK_INDEX_MAGIC,
+            SEEK_INDEX_CODECS[codec],
+            SORTED_FLAG if is_sorted else 0,
+            0,
+            len(block_table),
+            len(entries),
+            stat.st_size,
+            stat.st_mtime_ns,
+        ))
+        for block in block_table:
+            file.write(SEEK_INDEX_BLOCK.pack(*block))
+        for entry in entries:
+            file.write(SEEK_INDEX_ENTRY.pack(*entry))
+
+    os.replace(temporary, index_path)
+
+    return len(block_table), len(entries)
+
+class SeekIndex:
+    """ Memory mapped seek index of an MRT file.
+        The entries can be accessed like a sequence and searched with bisect without loading the index.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, path: Path):
+        """ Open the seek index of an MRT file.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                path (Path): The path to the MRT file.
+
+            Raises:
+                ValueError: If the seek index is missing, invalid or older than the MRT file.
+        """
+        index_path = get_seek_index_path(path)
+        if not index_path.exists():
+            raise ValueError(f'{path} has no seek index')
+
+        with open(index_path, 'rb') as file:
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.data) < SEEK_INDEX_HEADER.size:
+            self.close()
+            raise ValueError(f'{index_path} is truncated')
+
+        magic, codec, flags, _, self.block_count, self.entry_count, size, mtime_ns = SEEK_INDEX_HEADER.unpack_from(self.data)
+        stat = path.stat()
+
+        if magic != SEEK_INDEX_MAGIC:
+            self.close()
+            raise ValueError(f'{index_path} is not a seek index')
+        if len(self.data) < SEEK_INDEX_HEADER.size + self.block_count * SEEK_INDEX_BLOCK.size + self.entry_count * SEEK_INDEX_ENTRY.size:
+            self.close()
+            raise ValueError(f'{index_path} is truncated')
+        if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+            self.close()
+            raise ValueError(f'{index_path} is outdated')
+
+        self.path = path
+        self.codec = codec
+        self.is_sorted = bool(flags & SORTED_FLAG)
+        self.entry_offset = SEEK_INDEX_HEADER.size + self.block_count * SEEK_INDEX_BLOCK.size
+
+    def get_block(self, index: int) -> SeekBlock:
+        """ Get a block of the block table.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                index (int): The block index.
+
+            Returns:
+                SeekBlock: The block.
+        """
+        return SeekBlock(*SEEK_INDEX_BLOCK.unpack_from(self.data, SEEK_INDEX_HEADER.size + index * SEEK_INDEX_BLOCK.size))
+
+    def __len__(self) -> int:
+        return self.entry_count
+
+    def __getitem__(self, index: int) -> SeekEntry:
+        if not 0 <= index < self.entry_count:
+            raise IndexError(index)
+
+        return SeekEntry(*SEEK_INDEX_ENTRY.unpack_from(self.data, self.entry_offset + index * SEEK_INDEX_ENTRY.size))
+
+    def close(self):
+        """ Unmap the seek index.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        self.data.close()
+
+    def __enter__(self) -> 'SeekIndex':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def _iter_chunks_from(index: SeekIndex, entry: SeekEntry) -> Iterator[bytes]:
+    """ Decompress an MRT file starting at the record of a seek index entry.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            index (SeekIndex): The seek index.
+            entry (SeekEntry): The entry to start at.
+
+        Returns:
+            Iterator[bytes]: The decompressed chunks.
+    """
+    with open(index.path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        if index.codec == SEEK_INDEX_CODECS['none']:
+            yield data[entry.offset:]
+            return
+
+        for block_index in range(entry.block, index.block_count):
+            block = index.get_block(block_index)
+            output = bz2.decompress(_get_block_stream(data, block.bit_offset, block.bit_end))
+
+            yield output[entry.offset:] if block_index == entry.block else output
+
+def records_between(path: Path, start: int, end: int) -> Iterator[MRTRecord]:
+    """ Iterate the records of an MRT file with a timestamp in [start, end).
+        With an up to date seek index, decoding starts at the block of the first matching record
+        and stops at the first later record if the file is sorted. Otherwise the whole file is decoded.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+            start (int): The epoch start.
+            end (int): The epoch end.
+
+        Returns:
+            Iterator[MRTRecord]: The matching MRT records.
+    """
+    try:
+        index = SeekIndex(path)
+    except ValueError:
+        for record in iter_records(path):
+            if start <= record.timestamp < end:
+                yield record
+        return
+
+    with index:
+        position = bisect_left(index, start, key=lambda entry: entry.timestamp)
+        if position == len(index):
+            return
+
+        entry = index[position]
+        if index.is_sorted and entry.timestamp >= end:
+            return
+
+        for record in iter_buffer_records(_iter_chunks_from(index, entry)):
+            if record.timestamp >= end:
+                if index.is_sorted:
+                    return
+                continue
+
+            if record.timestamp >= start:
+                yield record
+
+def is_seek_index_fresh(path: Path) -> bool:
+    """ Check whether an MRT file has an up to date seek index.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            bool: True if the seek index can be used.
+    """
+    try:
+        SeekIndex(path).close()
+    except ValueError:
+        return False
+
+    return True
+
+@timed('seek-index', files=lambda result: result.indexed_files)
+def build_seek_indexes(paths: list[Path], jobs: int = 4, force: bool = False) -> SeekIndexResult:
+    """ Build the seek indexes of MRT files in parallel worker processes.
+        Files with an up to date seek index are skipped.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            paths (list[Path]): The paths to the MRT files.
+            jobs (int): The number of worker processes.
+            force (bool): Rebuild up to date seek indexes.
+
+        Returns:
+            SeekIndexResult: The seek index result.
+    """
+    start_time = time.perf_counter()
+    result = SeekIndexResult(
+        indexed_files=0,
+        skipped_files=0,
+        failed_files=[],
+        blocks=0,
+        entries=0,
+        duration=0,
+    )
+
+    pending = []
+    for path in paths:
+        if not force and is_seek_index_fresh(path):
+            result.skipped_files += 1
+        else:
+            pending.append(path)
+
+    if pending:
+        with Progress(
+            '[progress.description]{task.description}',
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeRemainingColumn(),
+        ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(pending)), 1)) as executor:
+            progress_task = progress.add_task(
+                description='Seek index',
+                total=len(pending),
+            )
+            futures = {
+                executor.submit(build_seek_index, path): path
+                for path in pending
+            }
+
+            for future in as_completed(futures):
+                try:
+                    blocks, entries = future.result()
+                    result.indexed_files += 1
+                    result.blocks += blocks
+                    result.entries += entries
+                except (ValueError, OSError):
+                    result.failed_files.append(futures[future].name)
+
+                progress.advance(progress_task)
+
+    result.duration = time.perf_counter() - start_time
+
+    return result
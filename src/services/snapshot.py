@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.filename import parse_mrt_file_name, to_epoch
+from src.services.index import is_index_fresh, iter_index, query_index, get_index_path
+from src.models.query import QueryRequest, QueryResponse, QueryRootResult
+from src.services.walk import walk_archive
+from src.services.timings import stage, timed
+from src.models.mrt_file import MRTFileName
+from typing import Iterator, Optional
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from rich import print
+import bisect
+import heapq
+import time
+
+class ArchiveSnapshot:
+    """ In-memory snapshot of the MRT archive shared by all commands of an invocation.
+        The archive is scanned lazily on the first query and every later query is answered
+        from the same record set, unless it asks for a part of the archive that was not scanned yet.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, mrt_input_path: Path, layout: Optional[str] = None):
+        """ Initialize an empty archive snapshot.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                mrt_input_path (Path): The path to the MRT input directory.
+                layout (Optional[str]): The archive layout template used to prune scans.
+        """
+        self.mrt_input_path = mrt_input_path
+        self.layout = layout
+        self.use_index: Optional[bool] = None
+        self.scanned_requests: list[QueryRequest] = []
+        self.complete = False
+        self.records: dict[Path, MRTFileName] = {}
+        self.sorted_records: list[tuple[MRTFileName, Path]] = []
+        self.timestamps: list[int] = []
+
+    def is_scanned(self, request: QueryRequest) -> bool:
+        """ Check whether all MRT files matching a request are already part of the snapshot.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                bool: True if the request can be answered without scanning the archive.
+        """
+        if self.complete:
+            return True
+
+        return any(
+            scanned.start_datetime <= request.start_datetime
+            and request.end_datetime <= scanned.end_datetime
+            and set(request.vendor) <= set(scanned.vendor)
+            and set(request.peer_name) <= set(scanned.peer_name)
+            and set(request.bgp_type) <= set(scanned.bgp_type)
+            for scanned in self.scanned_requests
+        )
+
+    def _scan(self, request: QueryRequest):
+        """ Scan the archive and add all found MRT files to the snapshot.
+            Without an archive layout the whole archive is scanned once, as no part of it can be skipped anyway.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request used to prune the scan.
+        """
+        unparseable_files = []
+
+        with stage('walk') as counter:
+            paths = list(walk_archive(
+                mrt_input_path=self.mrt_input_path,
+                request=request if self.layout else None,
+                layout=self.layout,
+            ))
+            counter.add(files=len(paths))
+
+        with stage('parse') as counter:
+            for path in paths:
+                mrt_file_name = parse_mrt_file_name(path.name)
+                if not mrt_file_name:
+                    unparseable_files.append(path)
+                    continue
+
+                self.records[path] = mrt_file_name
+
+            counter.add(files=len(paths))
+
+        if unparseable_files:
+            print(f'[red]\[warning][/] Cannot parse [red]{len(unparseable_files)}[/] MRT file names, e.g. [purple]{unparseable_files[0]}[/]')
+
+        if self.layout:
+            self.scanned_requests.append(request)
+        else:
+            self.complete = True
+
+        self.sorted_records = sorted((mrt_file_name, path) for path, mrt_file_name in self.records.items())
+        self.timestamps = [mrt_file_name.timestamp for mrt_file_name, _ in self.sorted_records]
+
+    def prepare(self, requests: list[QueryRequest]):
+        """ Scan the archive once for all given requests, so they can be answered from memory afterwards.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                requests (list[QueryRequest]): The query requests that will be queried.
+        """
+        if not requests:
+            return
+
+        self.query(
+            request=QueryRequest(
+                start_datetime=min(request.start_datetime for request in requests),
+                end_datetime=max(request.end_datetime for request in requests),
+                vendor=sorted({vendor for request in requests for vendor in request.vendor}),
+                peer_name=sorted({peer_name for request in requests for peer_name in request.peer_name}),
+                bgp_type=sorted({bgp_type for request in requests for bgp_type in request.bgp_type}),
+            ),
+        )
+
+    def is_index_usable(self, request: QueryRequest) -> bool:
+        """ Check whether the archive index can answer a request.
+            The index is checked for every request, as only the directories of its time range are compared.
+            Once the index is found stale the snapshot falls back to live scans for good.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                bool: True if the archive index can be used.
+        """
+        if self.use_index is False:
+            return False
+
+        if is_index_fresh(self.mrt_input_path, request):
+            return True
+
+        if get_index_path(self.mrt_input_path).exists():
+            print(f'[red]\[warning][/] Archive index is stale, falling back to a live scan')
+
+        self.use_index = False
+
+        return False
+
+    @timed('lookup', files=lambda response: len(response.mrt_files))
+    def query(self, request: QueryRequest) -> QueryResponse:
+        """ Query the snapshot for a subset of MRTs, scanning the archive only if necessary.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                QueryResponse: The query response.
+        """
+        scan_start_time = time.perf_counter()
+
+        use_index = self.is_index_usable(request)
+
+        if not use_index and not self.is_scanned(request):
+            self._scan(request)
+
+        filter_start_time = time.perf_counter()
+
+        with stage('index' if use_index else 'filter') as counter:
+            if use_index:
+                response = query_index(
+                    mrt_input_path=self.mrt_input_path,
+                    request=request,
+                )
+            else:
+                response = self._filter(request)
+
+            counter.add(files=len(response.mrt_files))
+
+        response.scan_duration = filter_start_time - scan_start_time
+        response.filter_duration = time.perf_counter() - filter_start_time
+
+        return response
+
+    def iterate(self, request: QueryRequest) -> Iterator[tuple[MRTFileName, Path]]:
+        """ Iterate the MRT files of the snapshot matching a request in timestamp order.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the matching MRT files.
+        """
+        if self.is_index_usable(request):
+            yield from iter_index(
+                mrt_input_path=self.mrt_input_path,
+                request=request,
+            )
+            return
+
+        if not self.is_scanned(request):
+            self._scan(request)
+
+        vendors = set(request.vendor)
+        peer_names = set(request.peer_name)
+        bgp_types = set(request.bgp_type)
+
+        # Records are sorted by timestamp, so the time range is a slice of the snapshot
+        for mrt_file_name, path in self.sorted_records[
+            bisect.bisect_left(self.timestamps, to_epoch(request.start_datetime)):
+            bisect.bisect_left(self.timestamps, to_epoch(request.end_datetime))
+        ]:
+            if mrt_file_name.vendor not in vendors:
+                continue
+            if mrt_file_name.peer_name not in peer_names:
+                continue
+            if mrt_file_name.bgp_type not in bgp_types:
+                continue
+
+            yield mrt_file_name, path
+
+    def _filter(self, request: QueryRequest) -> QueryResponse:
+        """ Filter the snapshot records by a request.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                QueryResponse: The query response.
+        """
+        response = QueryResponse(
+            mrt_files=[],
+            rib_file=None,
+        )
+
+        for mrt_file_name, path in self.iterate(request):
+            if mrt_file_name.bgp_type == 'rib':
+                response.rib_file = path
+            if mrt_file_name.bgp_type == 'update':
+                response.mrt_files.append(path)
+
+        return response
+
+class TieredSnapshot(ArchiveSnapshot):
+    """ Archive snapshot over several archive roots, e.g. a fast tier of recent months and a slow tier of the history.
+        Each root has its own snapshot and is scanned concurrently in a thread, and files found in several roots
+        are taken from the root listed first.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, mrt_input_paths: list[Path], layout: Optional[str] = None):
+        """ Initialize an empty snapshot of each archive root.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                mrt_input_paths (list[Path]): The paths to the MRT input directories, ordered by priority.
+                layout (Optional[str]): The archive layout template used to prune scans, shared by all roots.
+        """
+        super().__init__(
+            mrt_input_path=mrt_input_paths[0],
+            layout=layout,
+        )
+        self.use_index = False
+        self.complete = True
+        self.snapshots = [
+            ArchiveSnapshot(
+                mrt_input_path=mrt_input_path,
+                layout=layout,
+            )
+            for mrt_input_path in mrt_input_paths
+        ]
+        self.roots: list[QueryRootResult] = []
+
+    def _iterate_root(self, snapshot: ArchiveSnapshot, request: QueryRequest) -> tuple[list[tuple[MRTFileName, Path]], float]:
+        """ Collect the MRT files of one archive root matching a request.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                snapshot (ArchiveSnapshot): The snapshot of the archive root.
+                request (QueryRequest): The query request.
+
+            Returns:
+                tuple[list[tuple[MRTFileName, Path]], float]: The matching MRT files in timestamp order and the scan duration.
+        """
+        start_time = time.perf_counter()
+        mrt_files = list(snapshot.iterate(request))
+
+        return mrt_files, time.perf_counter() - start_time
+
+    def iterate(self, request: QueryRequest) -> Iterator[tuple[MRTFileName, Path]]:
+        """ Iterate the MRT files of all archive roots matching a request in timestamp order.
+            Files with the same name are yielded once, from the root with the highest priority.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the matching MRT files.
+        """
+        with ThreadPoolExecutor(max_workers=len(self.snapshots)) as executor:
+            results = list(executor.map(
+                lambda snapshot: self._iterate_root(snapshot, request),
+                self.snapshots,
+            ))
+
+        self.roots = [
+            QueryRootResult(
+                mrt_input_path=snapshot.mrt_input_path,
+                files=0,
+                duplicate_files=0,
+                scan_duration=duration,
+            )
+            for snapshot, (_, duration) in zip(self.snapshots, results)
+        ]
+        seen = set()
+
+        # Equal file names parse to equal names, so the root with the lower priority number comes first
+        for mrt_file_name, priority, path in heapq.merge(*(
+            [(mrt_file_name, priority, path) for mrt_file_name, path in mrt_files]
+            for priority, (mrt_files, _) in enumerate(results)
+        )):
+            if path.name in seen:
+                self.roots[priority].duplicate_files += 1
+                continue
+
+            seen.add(path.name)
+            self.roots[priority].files += 1
+
+            yield mrt_file_name, path
+
+    def query(self, request: QueryRequest) -> QueryResponse:
+        """ Query all archive roots for a subset of MRTs.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                request (QueryRequest): The query request.
+
+            Returns:
+                QueryResponse: The query response with the result of every root.
+        """
+        response = super().query(
+            request=request,
+        )
+
+        # The roots are scanned concurrently, so the slowest root bounds the scan time
+        response.roots = self.roots
+        response.scan_duration = max(root.scan_duration for root in self.roots)
+        response.filter_duration = max(response.filter_duration - response.scan_duration, 0)
+
+        return response
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+from src.models.stats import MinuteStats, FileStats, ScenarioStats, StatsResult
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.services.bgp import decode_bgp4mp_update
+from src.services.mrt import MRTDecodeError, iter_records
+from src.models.mrt_scenario import MRTScenario
+from src.models.mrt_record import MRTRecord
+from src.services.timings import timed
+from typing import Optional
+from pathlib import Path
+import time
+import os
+
+STATS_FILE = 'scenario.stats.json'
+
+def get_record_counts(record: MRTRecord) -> tuple[int, int, list[int]]:
+    """ Count the announced and withdrawn prefixes of an MRT record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            record (MRTRecord): The MRT record.
+
+        Returns:
+            tuple[int, int, list[int]]: The number of announced and withdrawn prefixes and the prefixes packed into single integers.
+
+        Raises:
+            MRTDecodeError: If the record is corrupt.
+    """
+    update = decode_bgp4mp_update(record)
+
+    if not update:
+        return 0, 0, []
+
+    # Prefixes are packed into single integers to keep the sets small
+    return len(update.announced), len(update.withdrawn), [
+        network << 9 | length << 1 | (afi - 1)
+        for afi, network, length in update.announced + update.withdrawn
+    ]
+
+class StatsCounter:
+    """ Statistics of the records of an MRT file, counted one record at a time.
+        Passes that already decode the records they write, like rewrites and merges, collect the statistics of their output without decoding it again.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self):
+        """ Initialize empty statistics.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        self.stats = FileStats(
+            size=0,
+            mtime_ns=0,
+            records=0,
+            announcements=0,
+            withdrawals=0,
+            prefixes=0,
+            start=0,
+            end=0,
+        )
+        self.prefixes = set()
+        self.minute = None
+        self.minute_prefixes = set()
+
+    def add(self, timestamp: int, announcements: int, withdrawals: int, prefixes: list[int]):
+        """ Count a record from its counts.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                timestamp (int): The epoch timestamp of the record.
+                announcements (int): The number of announced prefixes.
+                withdrawals (int): The number of withdrawn prefixes.
+                prefixes (list[int]): The packed announced and withdrawn prefixes.
+        """
+        stats = self.stats
+
+        if timestamp - timestamp % 60 != self.minute:
+            if self.minute is not None:
+                stats.minute_prefixes.append(len(self.minute_prefixes))
+                self.minute_prefixes.clear()
+
+            self.minute = timestamp - timestamp % 60
+            stats.minutes.append(self.minute)
+            stats.minute_records.append(0)
+            stats.minute_announcements.append(0)
+            stats.minute_withdrawals.append(0)
+
+        if not stats.records:
+            stats.start = timestamp
+        stats.end = timestamp
+        stats.records += 1
+        stats.minute_records[-1] += 1
+
+        stats.announcements += announcements
+        stats.withdrawals += withdrawals
+        stats.minute_announcements[-1] += announcements
+        stats.minute_withdrawals[-1] += withdrawals
+
+        self.prefixes.update(prefixes)
+        self.minute_prefixes.update(prefixes)
+
+    def add_record(self, record: MRTRecord):
+        """ Count a record.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                record (MRTRecord): The MRT record.
+
+            Raises:
+                MRTDecodeError: If the record is corrupt.
+        """
+        self.add(record.timestamp, *get_record_counts(record))
+
+    def finish(self, path: Path) -> FileStats:
+        """ Finish the statistics of a completely written file.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                path (Path): The path to the MRT file.
+
+            Returns:
+                FileStats: The statistics of the file.
+        """
+        if self.minute is not None:
+            self.stats.minute_prefixes.append(len(self.minute_prefixes))
+            self.minute_prefixes.clear()
+            self.minute = None
+
+        stat = path.stat()
+        self.stats.size = stat.st_size
+        self.stats.mtime_ns = stat.st_mtime_ns
+        self.stats.prefixes = len(self.prefixes)
+
+        return self.stats
+
+def get_file_stats(path: Path) -> FileStats:
+    """ Count the records, announcements, withdrawals and unique prefixes of an MRT file, in total and per minute.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            FileStats: The statistics of the file.
+
+        Raises:
+            MRTDecodeError: If the file is truncated or corrupt.
+    """
+    counter = StatsCounter()
+
+    for record in iter_records(path):
+        counter.add_record(record)
+
+    return counter.finish(path)
+
+def load_stats(scenario_output_path: Path, scenario: MRTScenario) -> ScenarioStats:
+    """ Load the statistics sidecar of a scenario.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            scenario (MRTScenario): The scenario.
+
+        Returns:
+            ScenarioStats: The statistics, empty if the scenario has no sidecar yet.
+    """
+    if not scenario.stats_file or not (scenario_output_path / scenario.stats_file).exists():
+        return ScenarioStats()
+
+    return ScenarioStats.model_validate_json(
+        json_data=(scenario_output_path / scenario.stats_file).read_text(),
+    )
+
+@timed('stats', files=lambda result: result[1].computed_files)
+def update_stats(scenario_output_path: Path, scenario: MRTScenario, jobs: int = 4, collected: Optional[dict[str, FileStats]] = None) -> tuple[ScenarioStats, StatsResult]:
+    """ Compute the statistics of the scenario files that are new or changed in parallel worker processes and write the sidecar.
+        Statistics of unchanged files and statistics collected while the files were written are kept, so every file is decoded once.
+        Files copied or linked as-is are decoded here, since transfers move their bytes without reading them into Python.
+        Files that are missing or cannot be read or decoded are reported and left out of the statistics.
+        The scenario references the sidecar afterwards, but is not saved.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            scenario_output_path (Path): The path to the scenario output directory.
+            scenario (MRTScenario): The scenario.
+            jobs (int): The number of worker processes.
+            collected (Optional[dict[str, FileStats]]): The statistics of scenario files collected while they were written, by file name.
+
+        Returns:
+            tuple[ScenarioStats, StatsResult]: The statistics and the update result.
+    """
+    start_time = time.perf_counter()
+    stats = load_stats(scenario_output_path, scenario)
+    stats.files.update(collected or {})
+    files = {}
+    pending = []
+    failed_files = []
+    missing_files = []
+
+    for mrt_file in sorted(set(scenario.mrt_files)):
+        file_stats = stats.files.get(mrt_file)
+
+        try:
+            stat = (scenario_output_path / mrt_file).stat()
+        except FileNotFoundError:
+            missing_files.append(mrt_file)
+            continue
+
+        if file_stats and file_stats.size == stat.st_size and file_stats.mtime_ns == stat.st_mtime_ns:
+            files[mrt_file] = file_stats
+        else:
+            pending.append(mrt_file)
+
+    collected_files = sum(mrt_file in files for mrt_file in collected or {})
+    cached_files = len(files) - collected_files
+
+    if pending:
+        with Progress(
+            '[progress.description]{task.description}',
+            BarColumn(),
+            MofNCompleteColumn(),
+            TimeRemainingColumn(),
+        ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(pending)), 1)) as executor:
+            progress_task = progress.add_task(
+                description='Stats',
+                total=len(pending),
+            )
+            futures = {
+                executor.submit(get_file_stats, scenario_output_path / mrt_file): mrt_file
+                for mrt_file in pending
+            }
+
+            for future in as_completed(futures):
+                try:
+                    files[futures[future]] = future.result()
+                except (MRTDecodeError, OSError):
+                    failed_files.append(futures[future])
+
+                progress.advance(progress_task)
+
+    stats.files = dict(sorted(files.items()))
+    scenario.stats_file = STATS_FILE
+
+    temporary = scenario_output_path / f'.{STATS_FILE}.tmp'
+    temporary.write_text(stats.model_dump_json())
+    os.replace(temporary, scenario_output_path / STATS_FILE)
+
+    return stats, StatsResult(
+        computed_files=len(pending) - len(failed_files),
+        cached_files=cached_files,
+        collected_files=collected_files,
+        failed_files=sorted(failed_files),
+        missing_files=missing_files,
+        duration=time.perf_counter() - start_time,
+    )
+
+def get_minute_stats(stats: ScenarioStats) -> list[MinuteStats]:
+    """ Get the statistics of every minute of a scenario, summed over all files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            stats (ScenarioStats): The statistics of the scenario.
+
+        Returns:
+            list[MinuteStats]: The statistics of the minutes with records in time order.
+    """
+    minutes = {}
+
+    for file_stats in stats.files.values():
+        for minute, *counts in zip(
+            file_stats.minutes,
+            file_stats.minute_records,
+            file_stats.minute_announcements,
+            file_stats.minute_withdrawals,
+            file_stats.minute_prefixes,
+        ):
+            totals = minutes.setdefault(minute, [0, 0, 0, 0])
+            for position, count in enumerate(counts):
+                totals[position] += count
+
+    return [
+        MinuteStats(minute, *totals)
+        for minute, totals in sorted(minutes.items())
+    ]
+
+def estimate_replay_duration(stats: ScenarioStats, playback_speed: Optional[int] = None) -> float:
+    """ Estimate the replay duration of a scenario.
+        The player replays the records at their original pace divided by the playback speed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            stats (ScenarioStats): The statistics of the scenario.
+            playback_speed (Optional[int]): The playback speed, real time if not given.
+
+        Returns:
+            float: The replay duration in seconds.
+    """
+    files = [file_stats for file_stats in stats.files.values() if file_stats.records]
+
+    if not files:
+        return 0.0
+
+    span = max(file_stats.end for file_stats in files) - min(file_stats.start for file_stats in files) + 1
+
+    return span / (playback_speed or 1)
@@ -0,0 +1,463 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+from concurrent.futures import Executor, as_completed
+from src.models.store import GarbageCollectionResult
+from src.models.transfer import TransferResult
+from src.services.transfer import CHUNK_SIZE, get_executor
+from src.services.timings import timed
+from typing import Callable, Iterator, Optional
+from contextlib import contextmanager
+from threading import Lock
+from pathlib import Path
+from rich import print
+import hashlib
+import sqlite3
+import errno
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS blobs (
+        digest TEXT PRIMARY KEY,
+        size INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS refs (
+        scenario TEXT NOT NULL,
+        name TEXT NOT NULL,
+        digest TEXT NOT NULL,
+        PRIMARY KEY (scenario, name)
+    );
+    CREATE TABLE IF NOT EXISTS sources (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        digest TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS refs_digest ON refs (digest);
+'''
+
+# Temporaries not written to for this many seconds are removed even if their pid is alive
+TEMPORARY_MAX_AGE = 24 * 60 * 60
+
+def _connect(store_path: Path) -> sqlite3.Connection:
+    """ Open the store database and make sure the schema exists.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+
+        Returns:
+            sqlite3.Connection: The store database connection.
+    """
+    (store_path / 'objects').mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    connection = sqlite3.connect(
+        store_path / 'store.sqlite',
+        timeout=60,
+    )
+    connection.execute('PRAGMA journal_mode = WAL')
+    connection.executescript(SCHEMA)
+
+    return connection
+
+@contextmanager
+def store_lock(store_path: Path, exclusive: bool = False) -> Iterator[None]:
+    """ Hold the store-wide lock.
+        Transfers hold it shared from the first lookup until their references are recorded, so any number of appends run at once,
+        and garbage collection holds it exclusively, so it never sees blobs that are linked but not yet referenced.
+        Without fcntl, e.g. on Windows, no lock is taken.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+            exclusive (bool): Take the lock exclusively.
+    """
+    if not fcntl:
+        yield
+        return
+
+    store_path.mkdir(
+        parents=True,
+        exist_ok=True,
+    )
+
+    with open(store_path / 'store.lock', 'a') as lock_file:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+def get_blob_path(store_path: Path, digest: str) -> Path:
+    """ Get the path of a blob in the store.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+            digest (str): The hex digest of the blob.
+
+        Returns:
+            Path: The path to the blob.
+    """
+    return store_path / 'objects' / digest[:2] / digest
+
+def _ingest(store_path: Path, source: Path, advance: Callable[[int], None]) -> str:
+    """ Copy a file into the store while hashing it, so the content is only read once.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+            source (Path): The source file.
+            advance (Callable[[int], None]): Called with the number of bytes read for each chunk.
+
+        Returns:
+            str: The hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    temporary = store_path / 'objects' / f'.{source.name}.{os.getpid()}.{id(source)}.tmp'
+
+    with source.open('rb') as source_file, temporary.open('wb') as target_file:
+        while chunk := source_file.read(CHUNK_SIZE):
+            digest.update(chunk)
+            target_file.write(chunk)
+            advance(len(chunk))
+
+    blob_path = get_blob_path(store_path, digest.hexdigest())
+    blob_path.parent.mkdir(exist_ok=True)
+
+    # Blobs are shared by hardlinks, so they must never be modified or replaced once they exist
+    temporary.chmod(0o444)
+    try:
+        os.link(temporary, blob_path)
+    except FileExistsError:
+        pass
+    finally:
+        temporary.unlink()
+
+    return digest.hexdigest()
+
+def _is_linked(blob_path: Path, target: Path) -> bool:
+    """ Check whether a scenario file is linked to a blob.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            blob_path (Path): The path to the blob.
+            target (Path): The path to the scenario file.
+
+        Returns:
+            bool: True if the scenario file is a hardlink or symlink to the blob.
+    """
+    try:
+        if target.is_symlink():
+            return os.readlink(target) == str(blob_path)
+
+        return os.path.samefile(blob_path, target)
+    except FileNotFoundError:
+        return False
+
+def _link(blob_path: Path, target: Path):
+    """ Link a blob into a scenario directory, hardlinks are preferred and symlinks are used across devices.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            blob_path (Path): The path to the blob.
+            target (Path): The path to the scenario file.
+    """
+    temporary = target.with_name(f'.{target.name}.tmp')
+    temporary.unlink(missing_ok=True)
+
+    try:
+        os.link(blob_path, temporary)
+    except OSError as error:
+        if error.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        os.symlink(blob_path, temporary)
+
+    os.replace(temporary, target)
+
+@timed('store', files=lambda result: len(result.transferred_files), bytes=lambda result: result.transferred_bytes)
+def store_files(store_path: Path, sources: list[Path], target_directory: Path, jobs: int = 4, executor: Optional[Executor] = None, show_progress: bool = True) -> TransferResult:
+    """ Add files to the content-addressed store and link them into a scenario directory.
+        Each distinct content is stored once and shared between all scenarios referencing it.
+        The store lock is held shared until the references are recorded, so garbage collection cannot remove the linked blobs in between.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+            sources (list[Path]): The source files.
+            target_directory (Path): The scenario directory.
+            jobs (int): The maximum number of concurrent transfers.
+            executor (Optional[Executor]): A shared executor limiting the concurrent transfers instead of jobs.
+            show_progress (bool): Show a progress bar.
+
+        Returns:
+            TransferResult: The transfer result.
+    """
+    with store_lock(store_path):
+        return _store_files(
+            store_path=store_path,
+            sources=sources,
+            target_directory=target_directory,
+            jobs=jobs,
+            executor=executor,
+            show_progress=show_progress,
+        )
+
+def _store_files(store_path: Path, sources: list[Path], target_directory: Path, jobs: int = 4, executor: Optional[Executor] = None, show_progress: bool = True) -> TransferResult:
+    """ Add files to the store and link them into a scenario directory while the store lock is held.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+            sources (list[Path]): The source files.
+            target_directory (Path): The scenario directory.
+            jobs (int): The maximum number of concurrent transfers.
+            executor (Optional[Executor]): A shared executor limiting the concurrent transfers instead of jobs.
+            show_progress (bool): Show a progress bar.
+
+        Returns:
+            TransferResult: The transfer result.
+    """
+    result = TransferResult(
+        transferred_files=[],
+        skipped_files=[],
+        failed_files=[],
+        transferred_bytes=0,
+        duration=0,
+    )
+    start_time = time.perf_counter()
+    scenario = str(target_directory.resolve())
+    connection = _connect(store_path)
+
+    # Look up digests of unchanged source files, so they do not have to be read again
+    known_digests = {}
+    for source in sources:
+        stat = source.stat()
+        row = connection.execute(
+            'SELECT digest FROM sources WHERE path = ? AND size = ? AND mtime_ns = ?',
+            (str(source), stat.st_size, stat.st_mtime_ns),
+        ).fetchone()
+        if row and get_blob_path(store_path, row[0]).exists():
+            known_digests[source] = row[0]
+
+    def transfer(source: Path, advance: Callable[[int], None]) -> tuple[str, bool]:
+        digest = known_digests.get(source)
+        if not digest:
+            digest = _ingest(store_path, source, advance)
+
+        blob_path = get_blob_path(store_path, digest)
+        target = target_directory / source.name
+
+        if _is_linked(blob_path, target):
+            return digest, False
+
+        _link(blob_path, target)
+
+        return digest, True
+
+    with Progress(
+        '[progress.description]{task.description}',
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        TimeRemainingColumn(),
+        disable=not show_progress,
+    ) as progress:
+        task = progress.add_task(
+            description='Transfer (store)',
+            total=sum(source.stat().st_size for source in sources if source not in known_digests),
+        )
+        lock = Lock()
+
+        def advance(count: int):
+            progress.advance(task, count)
+            with lock:
+                result.transferred_bytes += count
+
+        stored = []
+
+        with get_executor(executor, jobs) as transfer_executor:
+            futures = {
+                transfer_executor.submit(transfer, source, advance): source
+                for source in sources
+            }
+
+            for future in as_completed(futures):
+                source = futures[future]
+
+                try:
+                    digest, linked = future.result()
+                except OSError as error:
+                    print(f'[red]\[warning][/] Cannot transfer [purple]{source}[/]: {error}')
+                    result.failed_files.append(source.name)
+                    continue
+
+                stored.append((source, source.stat(), digest))
+
+                if linked:
+                    result.transferred_files.append(source.name)
+                else:
+                    result.skipped_files.append(source.name)
+
+    # Record all references in one short transaction, so concurrent appends do not block each other
+    with connection:
+        connection.executemany(
+            'INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)',
+            ((str(source), stat.st_size, stat.st_mtime_ns, digest) for source, stat, digest in stored),
+        )
+        connection.executemany(
+            'INSERT OR IGNORE INTO blobs VALUES (?, ?)',
+            ((digest, stat.st_size) for _, stat, digest in stored),
+        )
+        connection.executemany(
+            'INSERT OR REPLACE INTO refs VALUES (?, ?, ?)',
+            ((scenario, source.name, digest) for source, _, digest in stored),
+        )
+
+    connection.close()
+    result.duration = time.perf_counter() - start_time
+
+    return result
+
+def _is_abandoned(temporary: Path) -> bool:
+    """ Check whether a temporary file of the store was left behind by an interrupted transfer.
+        The name of a temporary contains the pid of the writing process, temporaries of live processes are only abandoned
+        if they have not been written to for a long time, in case the pid has been reused.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            temporary (Path): The temporary file.
+
+        Returns:
+            bool: True if the temporary file can be removed.
+    """
+    try:
+        if time.time() - temporary.stat().st_mtime > TEMPORARY_MAX_AGE:
+            return True
+    except FileNotFoundError:
+        return False
+
+    try:
+        pid = int(temporary.name.rsplit('.', 3)[1])
+    except (IndexError, ValueError):
+        return False
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+
+    return False
+
+def collect_garbage(store_path: Path) -> GarbageCollectionResult:
+    """ Drop references of scenario files that no longer link to their blob and remove unreferenced blobs.
+        The store lock is held exclusively, so running transfers finish recording their references first.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+
+        Returns:
+            GarbageCollectionResult: The garbage collection result.
+    """
+    with store_lock(store_path, exclusive=True):
+        return _collect_garbage(store_path)
+
+def _collect_garbage(store_path: Path) -> GarbageCollectionResult:
+    """ Drop unlinked references and unreferenced blobs while the store lock is held exclusively.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            store_path (Path): The path to the store directory.
+
+        Returns:
+            GarbageCollectionResult: The garbage collection result.
+    """
+    result = GarbageCollectionResult(
+        removed_references=0,
+        removed_blobs=0,
+        removed_bytes=0,
+        remaining_blobs=0,
+        remaining_bytes=0,
+    )
+    connection = _connect(store_path)
+
+    with connection:
+        for scenario, name, digest in connection.execute('SELECT scenario, name, digest FROM refs').fetchall():
+            if not _is_linked(get_blob_path(store_path, digest), Path(scenario) / name):
+                connection.execute(
+                    'DELETE FROM refs WHERE scenario = ? AND name = ?',
+                    (scenario, name),
+                )
+                result.removed_references += 1
+
+        unreferenced = connection.execute(
+            'SELECT digest, size FROM blobs WHERE digest NOT IN (SELECT digest FROM refs)',
+        ).fetchall()
+
+        for digest, size in unreferenced:
+            get_blob_path(store_path, digest).unlink(missing_ok=True)
+            connection.execute(
+                'DELETE FROM blobs WHERE digest = ?',
+                (digest,),
+            )
+            connection.execute(
+                'DELETE FROM sources WHERE digest = ?',
+                (digest,),
+            )
+            result.removed_blobs += 1
+            result.removed_bytes += size
+
+        # Remove leftovers of interrupted transfers, but not the temporaries concurrent transfers are still writing
+        for temporary in (store_path / 'objects').glob('.*.tmp'):
+            if _is_abandoned(temporary):
+                temporary.unlink(missing_ok=True)
+
+        result.remaining_blobs, result.remaining_bytes = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs',
+        ).fetchone()
+
+    connection.close()
+
+    return result
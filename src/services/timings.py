@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.models.timings import StageTiming, StageEvent, TimingsTrace
+from typing import Callable, Iterator, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+from pathlib import Path
+import functools
+import threading
+import pstats
+import cProfile
+import time
+import sys
+import io
+import os
+
+class StageCounter:
+    """ Counters of a running stage, added to its timing when the stage ends.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    __slots__ = ('files', 'bytes')
+
+    def __init__(self):
+        """ Initialize empty counters.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+        """
+        self.files = 0
+        self.bytes = 0
+
+    def add(self, files: int = 0, bytes: int = 0):
+        """ Count processed files and bytes.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                files (int): The number of processed files.
+                bytes (int): The number of processed bytes.
+        """
+        self.files += files
+        self.bytes += bytes
+
+class Timings:
+    """ Recorder of the stage timings of an invocation.
+        Stages nest per thread, so stages started in worker threads are recorded at the top level.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, trace: bool = False):
+        """ Initialize an empty recorder.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                trace (bool): Keep every single stage call for the JSON trace.
+        """
+        self.trace = trace
+        self.start_time = time.perf_counter()
+        self.stages: dict[str, StageTiming] = {}
+        self.events: list[StageEvent] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def register(self, name: str, depth: int):
+        """ Add a stage when it starts, so stages are listed before the stages nested in them.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                name (str): The nested stage name.
+                depth (int): The nesting depth of the stage.
+        """
+        with self.lock:
+            if name not in self.stages:
+                self.stages[name] = StageTiming(
+                    name=name,
+                    depth=depth,
+                )
+
+    def record(self, name: str, start: float, wall: float, cpu: float, counter: StageCounter):
+        """ Add a finished stage call to the timings.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                name (str): The nested stage name.
+                start (float): The perf counter at the start of the call.
+                wall (float): The wall time of the call.
+                cpu (float): The CPU time of the call, including reaped child processes.
+                counter (StageCounter): The counters of the call.
+        """
+        with self.lock:
+            timing = self.stages[name]
+            timing.calls += 1
+            timing.wall += wall
+            timing.cpu += cpu
+            timing.files += counter.files
+            timing.bytes += counter.bytes
+
+            if self.trace:
+                self.events.append(StageEvent(
+                    name=name,
+                    thread=threading.current_thread().name,
+                    start=start - self.start_time,
+                    wall=wall,
+                    cpu=cpu,
+                    files=counter.files,
+                    bytes=counter.bytes,
+                ))
+
+_timings: Optional[Timings] = None
+
+def enable_timings(trace: bool = False) -> Timings:
+    """ Start recording stage timings, e.g. when the services are used as a library.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            trace (bool): Keep every single stage call for the JSON trace.
+
+        Returns:
+            Timings: The recorder.
+    """
+    global _timings
+    _timings = Timings(
+        trace=trace,
+    )
+
+    return _timings
+
+def disable_timings() -> Optional[Timings]:
+    """ Stop recording stage timings.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Returns:
+            Optional[Timings]: The recorder that was active.
+    """
+    global _timings
+    timings, _timings = _timings, None
+
+    return timings
+
+def get_timings() -> Optional[Timings]:
+    """ Get the active recorder.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Returns:
+            Optional[Timings]: The recorder or None if timings are disabled.
+    """
+    return _timings
+
+def _get_cpu_time() -> float:
+    """ Get the CPU time of the process and its reaped child processes, like worker pools.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Returns:
+            float: The user and system CPU time in seconds.
+    """
+    times = os.times()
+
+    return times.user + times.system + times.children_user + times.children_system
+
+@contextmanager
+def stage(name: str) -> Iterator[StageCounter]:
+    """ Time a stage, a no-op if timings are disabled.
+        Processed files and bytes can be counted on the yielded counter.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The stage name.
+
+        Returns:
+            Iterator[StageCounter]: The counters of the stage.
+    """
+    timings = _timings
+    counter = StageCounter()
+
+    if not timings:
+        yield counter
+        return
+
+    stack = timings.local.__dict__.setdefault('stack', [])
+    stack.append(name)
+    path = '/'.join(stack)
+    timings.register(path, len(stack) - 1)
+    start_time = time.perf_counter()
+    start_cpu = _get_cpu_time()
+
+    try:
+        yield counter
+    finally:
+        wall = time.perf_counter() - start_time
+        cpu = _get_cpu_time() - start_cpu
+        timings.record(path, start_time, wall, cpu, counter)
+        stack.pop()
+
+def timed(name: str, files: Optional[Callable[[object], int]] = None, bytes: Optional[Callable[[object], int]] = None) -> Callable:
+    """ Decorate a function to time each call as a stage.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The stage name.
+            files (Optional[Callable[[object], int]]): Get the number of processed files from the result.
+            bytes (Optional[Callable[[object], int]]): Get the number of processed bytes from the result.
+
+        Returns:
+            Callable: The decorator.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _timings:
+                return function(*args, **kwargs)
+
+            with stage(name) as counter:
+                result = function(*args, **kwargs)
+                counter.add(
+                    files=files(result) if files else 0,
+                    bytes=bytes(result) if bytes else 0,
+                )
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+def print_timings(timings: Timings):
+    """ Print the summary table of the stage timings to stderr.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timings (Timings): The recorder.
+    """
+    table = Table(
+        title='Timings',
+        title_justify='left',
+    )
+    for column in ['stage', 'calls', 'wall', 'cpu', 'files', 'MB', 'files/s', 'MB/s']:
+        table.add_column(column, justify='left' if column == 'stage' else 'right')
+
+    for timing in timings.stages.values():
+        table.add_row(
+            '  ' * timing.depth + timing.name.rsplit('/', 1)[-1],
+            str(timing.calls),
+            f'{timing.wall:.3f}s',
+            f'{timing.cpu:.3f}s',
+            str(timing.files) if timing.files else '',
+            f'{timing.bytes / 1e6:.1f}' if timing.bytes else '',
+            f'{timing.files / max(timing.wall, 1e-9):.0f}' if timing.files else '',
+            f'{timing.bytes / max(timing.wall, 1e-9) / 1e6:.1f}' if timing.bytes else '',
+        )
+
+    Console(file=sys.stderr).print(table)
+
+def write_trace(timings: Timings, path: Path):
+    """ Write the stage timings and, if traced, every single stage call as JSON.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            timings (Timings): The recorder.
+            path (Path): The path to the trace file.
+    """
+    path.write_text(TimingsTrace(
+        created=datetime.now(),
+        argv=sys.argv,
+        stages=list(timings.stages.values()),
+        events=timings.events,
+    ).model_dump_json(
+        indent=4,
+    ))
+
+@contextmanager
+def profile(name: str, output_path: Optional[Path] = None, limit: int = 25) -> Iterator[cProfile.Profile]:
+    """ Profile a block with cProfile and print the functions with the highest cumulative time to stderr.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            name (str): The name of the profiled block.
+            output_path (Optional[Path]): The path the raw profile is written to, e.g. for snakeviz.
+            limit (int): The number of functions to print.
+
+        Returns:
+            Iterator[cProfile.Profile]: The profiler.
+    """
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+
+        if output_path:
+            profiler.dump_stats(output_path)
+
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(limit)
+        print(f'Profile of {name}\n{output.getvalue()}', file=sys.stderr)
@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from src.models.transfer import TransferResult
+from src.services.timings import timed
+from typing import Callable, Optional
+from threading import Lock
+from pathlib import Path
+from rich import print
+import hashlib
+import shutil
+import errno
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl request number of FICLONE on Linux
+FICLONE = 0x40049409
+CHUNK_SIZE = 8 * 1024 * 1024
+
+def _checksum(path: Path) -> str:
+    """ Calculate the checksum of a file with a streaming read.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the file.
+
+        Returns:
+            str: The hex digest of the file.
+    """
+    digest = hashlib.blake2b()
+
+    with path.open('rb') as file:
+        while chunk := file.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def is_up_to_date(source: Path, target: Path, strategy: str, checksum: bool = False) -> bool:
+    """ Check whether a target file already holds the content of a source file.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            source (Path): The source file.
+            target (Path): The target file.
+            strategy (str): The transfer strategy.
+            checksum (bool): Compare the file checksums instead of size and mtime.
+
+        Returns:
+            bool: True if the target file does not need to be transferred again.
+    """
+    if strategy == 'symlink':
+        return target.is_symlink() and os.readlink(target) == str(source)
+
+    try:
+        source_stat = source.stat()
+        target_stat = target.stat(follow_symlinks=False)
+    except FileNotFoundError:
+        return False
+
+    if (source_stat.st_dev, source_stat.st_ino) == (target_stat.st_dev, target_stat.st_ino):
+        return True
+    if source_stat.st_size != target_stat.st_size:
+        return False
+    if checksum:
+        return _checksum(source) == _checksum(target)
+
+    return source_stat.st_mtime_ns == target_stat.st_mtime_ns
+
+def _stream_copy(source: Path, target: Path, advance: Callable[[int], None]):
+    """ Copy a file in chunks, using copy_file_range or sendfile to avoid copies through user space.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            source (Path): The source file.
+            target (Path): The target file.
+            advance (Callable[[int], None]): Called with the number of bytes copied for each chunk.
+    """
+    with source.open('rb') as source_file, target.open('wb') as target_file:
+        source_fd, target_fd = source_file.fileno(), target_file.fileno()
+
+        for copy in (
+            getattr(os, 'copy_file_range', None),
+            lambda source_fd, target_fd, count: os.sendfile(target_fd, source_fd, None, count),
+        ):
+            if not copy:
+                continue
+
+            try:
+                while copied := copy(source_fd, target_fd, CHUNK_SIZE):
+                    advance(copied)
+                return
+            except OSError as error:
+                # Only fall back if nothing has been copied yet with this method
+                if error.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP) or target_file.tell() != 0:
+                    raise
+
+        while chunk := source_file.read(CHUNK_SIZE):
+            target_file.write(chunk)
+            advance(len(chunk))
+
+def _reflink(source: Path, target: Path):
+    """ Clone a file with copy-on-write semantics, only supported by some filesystems like btrfs or xfs.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            source (Path): The source file.
+            target (Path): The target file.
+
+        Raises:
+            OSError: If the filesystem does not support reflinks.
+    """
+    if not fcntl:
+        raise OSError(errno.EOPNOTSUPP, 'Reflinks are not supported on this platform')
+
+    with source.open('rb') as source_file, target.open('wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+
+def transfer_file(source: Path, target: Path, strategy: str, advance: Callable[[int], None] = lambda _: None):
+    """ Transfer a single file with the given strategy, falling back to a streaming copy if the strategy is not supported.
+        The file is written to a temporary name first and then moved into place.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            source (Path): The source file.
+            target (Path): The target file.
+            strategy (str): The transfer strategy.
+            advance (Callable[[int], None]): Called with the number of bytes transferred.
+    """
+    temporary = target.with_name(f'.{target.name}.tmp')
+    temporary.unlink(missing_ok=True)
+
+    linkers = {
+        'symlink': os.symlink,
+        'hardlink': os.link,
+        'reflink': _reflink,
+    }
+
+    linked = False
+
+    if strategy in linkers:
+        try:
+            linkers[strategy](source, temporary)
+            advance(source.stat().st_size)
+            linked = True
+        except OSError:
+            temporary.unlink(missing_ok=True)
+
+    if not linked:
+        _stream_copy(source, temporary, advance)
+        shutil.copystat(source, temporary)
+
+    os.replace(temporary, target)
+
+def get_executor(executor: Optional[Executor], jobs: int):
+    """ Get a context manager of the executor to run transfers on.
+        A shared executor is not shut down when the context exits.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            executor (Optional[Executor]): A shared executor.
+            jobs (int): The number of workers of a new executor.
+
+        Returns:
+            The executor context manager.
+    """
+    if executor:
+        return nullcontext(executor)
+
+    return ThreadPoolExecutor(max_workers=max(jobs, 1))
+
+@timed('transfer', files=lambda result: len(result.transferred_files), bytes=lambda result: result.transferred_bytes)
+def transfer_files(sources: list[Path], target_directory: Path, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, executor: Optional[Executor] = None, show_progress: bool = True) -> TransferResult:
+    """ Transfer files into a directory using a bounded thread pool.
+        Files that are already present with the same size and mtime (or checksum) are skipped.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            sources (list[Path]): The source files.
+            target_directory (Path): The target directory.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to detect present files.
+            executor (Optional[Executor]): A shared executor limiting the concurrent transfers instead of jobs.
+            show_progress (bool): Show a progress bar.
+
+        Returns:
+            TransferResult: The transfer result.
+    """
+    result = TransferResult(
+        transferred_files=[],
+        skipped_files=[],
+        failed_files=[],
+        transferred_bytes=0,
+        duration=0,
+    )
+    start_time = time.perf_counter()
+
+    pending = []
+    for source in sources:
+        if is_up_to_date(source, target_directory / source.name, strategy, checksum):
+            result.skipped_files.append(source.name)
+        else:
+            pending.append(source)
+
+    with Progress(
+        '[progress.description]{task.description}',
+        BarColumn(),
+        DownloadColumn(),
+        TransferSpeedColumn(),
+        TimeRemainingColumn(),
+        disable=not show_progress,
+    ) as progress:
+        task = progress.add_task(
+            description=f'Transfer ({strategy})',
+            total=sum(source.stat().st_size for source in pending),
+        )
+
+        lock = Lock()
+
+        def advance(count: int):
+            progress.advance(task, count)
+            with lock:
+                result.transferred_bytes += count
+
+        with get_executor(executor, jobs) as transfer_executor:
+            futures = {
+                transfer_executor.submit(transfer_file, source, target_directory / source.name, strategy, advance): source
+                for source in pending
+            }
+
+            for future in as_completed(futures):
+                source = futures[future]
+
+                try:
+                    future.result()
+                    result.transferred_files.append(source.name)
+                except OSError as error:
+                    print(f'[red]\[warning][/] Cannot transfer [purple]{source}[/]: {error}')
+                    result.failed_files.append(source.name)
+
+    result.duration = time.perf_counter() - start_time
+
+    return result
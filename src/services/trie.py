@@ -0,0 +1,372 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from typing import Iterator, Optional
+from array import array
+
+class PrefixTrie:
+    """ Path compressed binary radix trie of the prefixes of one address family.
+        Nodes are stored in parallel typed arrays instead of objects, so a node costs 29 bytes.
+        Each prefix maps to an integer value, e.g. an interned attribute id, and a 32 bit stamp, e.g. a timestamp.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+    """
+    def __init__(self, width: int):
+        """ Create an empty trie with the root node of the default route.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                width (int): The address width in bits, 32 for IPv4 or 128 for IPv6.
+        """
+        self.width = width
+        self.lengths = array('B', [0])
+        self.highs = array('Q', [0])
+        self.lows = array('Q', [0])
+        self.zeros = array('I', [0])
+        self.ones = array('I', [0])
+        self.values = array('i', [-1])
+        self.stamps = array('I', [0])
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _get_network(self, node: int) -> int:
+        """ Get the network address of a node.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                node (int): The node.
+
+            Returns:
+                int: The network address.
+        """
+        return (self.highs[node] << 64) | self.lows[node]
+
+    def _get_bit(self, network: int, position: int) -> int:
+        """ Get a bit of a network address, counted from the most significant bit.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                position (int): The bit position.
+
+            Returns:
+                int: The bit.
+        """
+        return (network >> (self.width - 1 - position)) & 1
+
+    def _get_common_length(self, network: int, length: int, other: int, other_length: int) -> int:
+        """ Get the length of the common prefix of two prefixes.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+                other (int): The other network address.
+                other_length (int): The other prefix length.
+
+            Returns:
+                int: The common prefix length.
+        """
+        limit = min(length, other_length)
+        difference = (network ^ other) >> (self.width - limit)
+
+        return limit - difference.bit_length()
+
+    def _mask(self, network: int, length: int) -> int:
+        """ Clear the host bits of a network address.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                int: The masked network address.
+        """
+        return network >> (self.width - length) << (self.width - length) if length else 0
+
+    def _add_node(self, network: int, length: int, value: int, stamp: int) -> int:
+        """ Append a node without children.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+                value (int): The value, -1 for branch nodes.
+                stamp (int): The stamp.
+
+            Returns:
+                int: The node.
+        """
+        self.lengths.append(length)
+        self.highs.append(network >> 64)
+        self.lows.append(network & 0xffffffffffffffff)
+        self.zeros.append(0)
+        self.ones.append(0)
+        self.values.append(value)
+        self.stamps.append(stamp)
+
+        return len(self.lengths) - 1
+
+    def _get_children(self, bit: int) -> array:
+        """ Get the child array of a branch direction.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                bit (int): The bit.
+
+            Returns:
+                array: The child nodes of all nodes in that direction.
+        """
+        return self.ones if bit else self.zeros
+
+    def insert(self, network: int, length: int, value: int, stamp: int = 0):
+        """ Insert or replace a prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+                value (int): The non-negative value.
+                stamp (int): The 32 bit stamp.
+        """
+        width = self.width
+        network = self._mask(network, length)
+        lengths, highs, lows, zeros, ones = self.lengths, self.highs, self.lows, self.zeros, self.ones
+        node = 0
+
+        # The hot loop inlines the bit helpers, this is the bulk of loading a full table
+        while True:
+            node_length = lengths[node]
+
+            if node_length == length:
+                if self.values[node] < 0:
+                    self.size += 1
+                self.values[node] = value
+                self.stamps[node] = stamp
+                return
+
+            children = ones if (network >> (width - 1 - node_length)) & 1 else zeros
+            child = children[node]
+
+            if not child:
+                children[node] = self._add_node(network, length, value, stamp)
+                self.size += 1
+                return
+
+            child_network = (highs[child] << 64) | lows[child]
+            child_length = lengths[child]
+            limit = length if length < child_length else child_length
+            common = limit - ((network ^ child_network) >> (width - limit)).bit_length()
+
+            if common == child_length:
+                node = child
+                continue
+
+            # The new prefix either becomes the parent of the child or both hang below a new branch node
+            if common == length:
+                parent = self._add_node(network, length, value, stamp)
+            else:
+                parent = self._add_node(self._mask(network, common), common, -1, 0)
+                self._get_children(self._get_bit(network, common))[parent] = self._add_node(network, length, value, stamp)
+
+            self._get_children(self._get_bit(child_network, common))[parent] = child
+            children[node] = parent
+            self.size += 1
+            return
+
+    def _find(self, network: int, length: int) -> int:
+        """ Find the node of a prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                int: The node or -1 if the trie has no node of the prefix.
+        """
+        network = self._mask(network, length)
+        node = 0
+
+        while self.lengths[node] < length:
+            node = self._get_children(self._get_bit(network, self.lengths[node]))[node]
+
+            if not node or self._get_common_length(network, length, self._get_network(node), self.lengths[node]) < self.lengths[node]:
+                return -1
+
+        return node if self.lengths[node] == length else -1
+
+    def get(self, network: int, length: int) -> Optional[tuple[int, int]]:
+        """ Get the value and stamp of a prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                Optional[tuple[int, int]]: The value and stamp or None if the prefix is not in the trie.
+        """
+        node = self._find(network, length)
+        if node < 0 or self.values[node] < 0:
+            return None
+
+        return self.values[node], self.stamps[node]
+
+    def delete(self, network: int, length: int) -> bool:
+        """ Remove a prefix. The node is kept, so it is reused if the prefix is inserted again.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                bool: True if the prefix was in the trie.
+        """
+        node = self._find(network, length)
+        if node < 0 or self.values[node] < 0:
+            return False
+
+        self.values[node] = -1
+        self.size -= 1
+
+        return True
+
+    def longest_match(self, network: int, length: int) -> Optional[tuple[int, int, int]]:
+        """ Find the most specific prefix of the trie covering a prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                Optional[tuple[int, int, int]]: The network, length and value of the covering prefix or None.
+        """
+        network = self._mask(network, length)
+        match = None
+        node = 0
+
+        while True:
+            node_length = self.lengths[node]
+
+            if self.values[node] >= 0:
+                match = (self._get_network(node), node_length, self.values[node])
+
+            if node_length >= length:
+                return match
+
+            node = self._get_children(self._get_bit(network, node_length))[node]
+
+            if not node or self.lengths[node] > length or self._get_common_length(network, length, self._get_network(node), self.lengths[node]) < self.lengths[node]:
+                return match
+
+    def _iter_subtree(self, node: int) -> Iterator[tuple[int, int, int, int]]:
+        """ Iterate the prefixes below a node in (network, length) order.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                node (int): The node.
+
+            Returns:
+                Iterator[tuple[int, int, int, int]]: The network, length, value and stamp of each prefix.
+        """
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+
+            if self.values[node] >= 0:
+                yield self._get_network(node), self.lengths[node], self.values[node], self.stamps[node]
+
+            if self.ones[node]:
+                stack.append(self.ones[node])
+            if self.zeros[node]:
+                stack.append(self.zeros[node])
+
+    def items(self) -> Iterator[tuple[int, int, int, int]]:
+        """ Iterate all prefixes in (network, length) order.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Returns:
+                Iterator[tuple[int, int, int, int]]: The network, length, value and stamp of each prefix.
+        """
+        return self._iter_subtree(0)
+
+    def covered(self, network: int, length: int) -> Iterator[tuple[int, int, int, int]]:
+        """ Iterate the prefixes equal to or more specific than a prefix.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Params:
+                network (int): The network address.
+                length (int): The prefix length.
+
+            Returns:
+                Iterator[tuple[int, int, int, int]]: The network, length, value and stamp of each prefix.
+        """
+        network = self._mask(network, length)
+        node = 0
+
+        while self.lengths[node] < length:
+            node = self._get_children(self._get_bit(network, self.lengths[node]))[node]
+
+            if not node or self._get_common_length(network, length, self._get_network(node), self.lengths[node]) < min(length, self.lengths[node]):
+                return
+
+        yield from self._iter_subtree(node)
+
+    def get_memory(self) -> int:
+        """ Get the memory allocated by the node arrays.
+
+            Author:
+                Benedikt SCHWERING <mail@bschwer.ing>
+
+            Returns:
+                int: The size in bytes.
+        """
+        return sum(
+            nodes.buffer_info()[1] * nodes.itemsize
+            for nodes in (self.lengths, self.highs, self.lows, self.zeros, self.ones, self.values, self.stamps)
+        )
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from rich.progress import Progress, BarColumn, DownloadColumn, TransferSpeedColumn, TimeRemainingColumn
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.services.mrt import MRTDecodeError, iter_records
+from src.services.cache import load_cache_files, save_cache_file
+from src.models.verify import VerifyFileResult, VerifyResult
+from src.services.timings import timed
+from pathlib import Path
+import json
+import time
+
+VERIFY_CACHE_FILE = 'verify.json'
+
+# MRT types of RFC 6396, anything else means the framing is off
+MRT_TYPES = {11, 12, 13, 16, 17, 32, 33, 48, 49}
+# Larger records do not occur in practice and point to a corrupt length field
+MAX_RECORD_LENGTH = 1 << 20
+
+def verify_file(path: Path) -> VerifyFileResult:
+    """ Verify an MRT file by decompressing the whole stream and checking the framing of every record.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            path (Path): The path to the MRT file.
+
+        Returns:
+            VerifyFileResult: The verify result of the file.
+    """
+    stat = path.stat()
+    records = 0
+    error = None
+
+    try:
+        for record in iter_records(path):
+            if record.type not in MRT_TYPES:
+                raise MRTDecodeError(f'Unknown MRT type {record.type} of record {records}')
+            if len(record.data) > MAX_RECORD_LENGTH:
+                raise MRTDecodeError(f'Implausible length {len(record.data)} of record {records}')
+
+            records += 1
+    except (MRTDecodeError, ValueError, OSError) as exception:
+        error = str(exception)
+
+    return VerifyFileResult(
+        path=path,
+        size=stat.st_size,
+        mtime_ns=stat.st_mtime_ns,
+        records=records,
+        error=error,
+    )
+
+def _load_cache(cache_path: Path) -> dict[str, VerifyFileResult]:
+    """ Load the cached verify results, including those written to the user cache directory if the cache file is read-only.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            cache_path (Path): The path to the cache file.
+
+        Returns:
+            dict[str, VerifyFileResult]: The verify results by path.
+    """
+    return {
+        path: VerifyFileResult.model_validate(result)
+        for data in load_cache_files(cache_path)
+        for path, result in json.loads(data).items()
+    }
+
+def _save_cache(cache_path: Path, cache: dict[str, VerifyFileResult]):
+    """ Write the cached verify results atomically, to the user cache directory if the cache file cannot be written, e.g. in a read-only archive.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            cache_path (Path): The path to the cache file.
+            cache (dict[str, VerifyFileResult]): The verify results by path.
+    """
+    save_cache_file(cache_path, json.dumps({
+        path: result.model_dump(mode='json')
+        for path, result in cache.items()
+    }))
+
+@timed('verify', files=lambda result: result.verified_files, bytes=lambda result: result.verified_bytes)
+def verify_files(paths: list[Path], cache_path: Path, jobs: int = 4, force: bool = False) -> VerifyResult:
+    """ Verify MRT files in parallel worker processes.
+        Results are cached by path, size and mtime, so unchanged files are not verified again.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            paths (list[Path]): The paths to the MRT files.
+            cache_path (Path): The path to the cache file.
+            jobs (int): The number of worker processes.
+            force (bool): Verify files with a cached result again.
+
+        Returns:
+            VerifyResult: The verify result.
+    """
+    start_time = time.perf_counter()
+    cache = _load_cache(cache_path)
+    results = []
+    pending = []
+
+    for path in paths:
+        cached = cache.get(str(path))
+        stat = path.stat()
+
+        if not force and cached and cached.size == stat.st_size and cached.mtime_ns == stat.st_mtime_ns:
+            results.append(cached)
+        else:
+            pending.append((path, stat.st_size))
+
+    cached_files = len(results)
+
+    if pending:
+        with Progress(
+            '[progress.description]{task.description}',
+            BarColumn(),
+            DownloadColumn(),
+            TransferSpeedColumn(),
+            TimeRemainingColumn(),
+        ) as progress, ProcessPoolExecutor(max_workers=max(min(jobs, len(pending)), 1)) as executor:
+            progress_task = progress.add_task(
+                description='Verify',
+                total=sum(size for _, size in pending),
+            )
+            futures = {
+                executor.submit(verify_file, path): size
+                for path, size in pending
+            }
+
+            for future in as_completed(futures):
+                result = future.result()
+                cache[str(result.path)] = result
+                results.append(result)
+                progress.advance(progress_task, futures[future])
+
+        _save_cache(cache_path, cache)
+
+    return VerifyResult(
+        verified_files=len(pending),
+        cached_files=cached_files,
+        bad_files=sorted(
+            (result for result in results if result.error),
+            key=lambda result: result.path,
+        ),
+        verified_bytes=sum(size for _, size in pending),
+        duration=time.perf_counter() - start_time,
+    )
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.index import INDEX_DIRECTORY
+from src.services.filename import parse_mrt_file_name, to_epoch
+from src.models.mrt_file import MRTFileName
+from src.models.query import QueryRequest
+from typing import Iterator, Optional
+from pathlib import Path
+import itertools
+import calendar
+import heapq
+import re
+import os
+
+LAYOUT_FIELDS = {
+    'peer': r'(?P<peer_name>[A-Za-z0-9-]+)',
+    'vendor': r'(?P<vendor>[A-Za-z0-9-]+)',
+    'type': r'(?P<bgp_type>[A-Za-z0-9-]+)',
+    'YYYY': r'(?P<year>\d{4})',
+    'MM': r'(?P<month>\d{2})',
+    'DD': r'(?P<day>\d{2})',
+    'HH': r'(?P<hour>\d{2})',
+}
+LAYOUT_FIELD_PATTERN = re.compile(r'\{([^}]*)\}')
+
+def compile_layout(layout: str) -> list[re.Pattern]:
+    """ Compile an archive layout template like {peer}/{YYYY}/{MM}/{DD} into one pattern per directory level.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            layout (str): The archive layout template.
+
+        Returns:
+            list[re.Pattern]: The directory name pattern of each level.
+
+        Raises:
+            ValueError: If the template contains an unknown or repeated field.
+    """
+    segments = []
+    seen = set()
+
+    for segment in layout.strip('/').split('/'):
+        pattern = ''
+        position = 0
+
+        for match in LAYOUT_FIELD_PATTERN.finditer(segment):
+            field = match.group(1)
+            if field not in LAYOUT_FIELDS:
+                raise ValueError(f'Unknown layout field {{{field}}}, expected one of {", ".join(LAYOUT_FIELDS)}')
+            if field in seen:
+                raise ValueError(f'Layout field {{{field}}} is used more than once')
+            seen.add(field)
+
+            pattern += re.escape(segment[position:match.start()]) + LAYOUT_FIELDS[field]
+            position = match.end()
+
+        segments.append(re.compile(pattern + re.escape(segment[position:])))
+
+    return segments
+
+def _get_time_range(fields: dict[str, str]) -> Optional[tuple[int, int]]:
+    """ Get the epoch range [start, end) covered by the date fields of a partially matched path.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            fields (dict[str, str]): The layout fields matched so far.
+
+        Returns:
+            Optional[tuple[int, int]]: The covered epoch range or None if no year is known yet.
+    """
+    if 'year' not in fields:
+        return None
+
+    year = int(fields['year'])
+
+    if 'month' not in fields:
+        return calendar.timegm((year, 1, 1, 0, 0, 0)), calendar.timegm((year + 1, 1, 1, 0, 0, 0))
+
+    month = int(fields['month'])
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    if 'day' not in fields:
+        return calendar.timegm((year, month, 1, 0, 0, 0)), calendar.timegm((next_year, next_month, 1, 0, 0, 0))
+
+    start = calendar.timegm((year, month, int(fields['day']), 0, 0, 0))
+
+    if 'hour' not in fields:
+        return start, start + 86400
+
+    start += int(fields['hour']) * 3600
+
+    return start, start + 3600
+
+def _can_intersect(fields: dict[str, str], request: QueryRequest, start: int, end: int) -> bool:
+    """ Check whether a directory with the given layout fields can contain MRT files matching the request.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            fields (dict[str, str]): The layout fields matched so far.
+            request (QueryRequest): The query request.
+            start (int): The epoch start of the request.
+            end (int): The epoch end of the request.
+
+        Returns:
+            bool: False if the directory can be skipped.
+    """
+    if 'peer_name' in fields and fields['peer_name'] not in request.peer_name:
+        return False
+    if 'vendor' in fields and fields['vendor'] not in request.vendor:
+        return False
+    if 'bgp_type' in fields and fields['bgp_type'] not in request.bgp_type:
+        return False
+
+    try:
+        time_range = _get_time_range(fields)
+    except ValueError:
+        return False
+
+    return not time_range or (time_range[0] < end and start < time_range[1])
+
+def walk_archive(mrt_input_path: Path, request: Optional[QueryRequest] = None, layout: Optional[str] = None) -> Iterator[Path]:
+    """ Walk the MRT archive and yield all MRT files.
+        If a request and an archive layout are given, only subtrees that can intersect
+        the requested time range, vendors, peer names and BGP types are entered.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (Optional[QueryRequest]): The query request used for pruning.
+            layout (Optional[str]): The archive layout template, e.g. {peer}/{YYYY}/{MM}/{DD}.
+
+        Returns:
+            Iterator[Path]: The paths of the MRT files.
+    """
+    segments = compile_layout(layout) if request and layout else []
+    start = to_epoch(request.start_datetime) if request else 0
+    end = to_epoch(request.end_datetime) if request else 0
+
+    def walk(directory: str, depth: int, fields: dict[str, str]) -> Iterator[Path]:
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name == INDEX_DIRECTORY:
+                    continue
+
+                if depth < len(segments):
+                    match = segments[depth].fullmatch(entry.name)
+                    if not match:
+                        continue
+
+                    child_fields = {**fields, **match.groupdict()}
+                    if not _can_intersect(child_fields, request, start, end):
+                        continue
+                else:
+                    child_fields = fields
+
+                yield from walk(entry.path, depth + 1, child_fields)
+            elif entry.name.endswith('.bz2'):
+                yield Path(entry.path)
+
+    yield from walk(str(mrt_input_path), 0, {})
+
+def iter_archive_ordered(mrt_input_path: Path, request: QueryRequest, layout: str) -> Iterator[tuple[MRTFileName, Path]]:
+    """ Walk the MRT archive and yield the MRT files of the pruned subtrees in timestamp order.
+        Date partitioned directories are visited one after another in date order, while independent
+        subtrees like peers are merged lazily, so no global sort over all matches is needed.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            mrt_input_path (Path): The path to the MRT input directory.
+            request (QueryRequest): The query request used for pruning.
+            layout (str): The archive layout template, e.g. {peer}/{YYYY}/{MM}/{DD}.
+
+        Returns:
+            Iterator[tuple[MRTFileName, Path]]: The parsed file names and paths of the MRT files.
+    """
+    segments = compile_layout(layout)
+    start = to_epoch(request.start_datetime)
+    end = to_epoch(request.end_datetime)
+
+    # Directories of a level can be visited one after another if the level only partitions by date
+    sequential = [
+        set(segment.groupindex) <= {'year', 'month', 'day', 'hour'}
+        for segment in segments
+    ]
+
+    def walk(directory: str, depth: int, fields: dict[str, str]) -> Iterator[tuple[MRTFileName, Path]]:
+        with os.scandir(directory) as entries:
+            entries = list(entries)
+
+        files = []
+        children = []
+
+        for entry in entries:
+            if entry.is_dir():
+                if entry.name == INDEX_DIRECTORY:
+                    continue
+
+                if depth < len(segments):
+                    match = segments[depth].fullmatch(entry.name)
+                    if not match:
+                        continue
+
+                    child_fields = {**fields, **match.groupdict()}
+                    if not _can_intersect(child_fields, request, start, end):
+                        continue
+                else:
+                    child_fields = fields
+
+                children.append((entry.path, child_fields))
+            elif entry.name.endswith('.bz2'):
+                mrt_file_name = parse_mrt_file_name(entry.name)
+                if mrt_file_name:
+                    files.append((mrt_file_name, Path(entry.path)))
+
+        files.sort()
+
+        if depth < len(segments) and sequential[depth] and all(_get_time_range(child_fields) for _, child_fields in children):
+            children.sort(key=lambda child: _get_time_range(child[1]))
+            subtrees = itertools.chain.from_iterable(
+                walk(path, depth + 1, child_fields)
+                for path, child_fields in children
+            )
+        else:
+            subtrees = heapq.merge(*(
+                walk(path, depth + 1, child_fields)
+                for path, child_fields in children
+            ))
+
+        yield from heapq.merge(files, subtrees)
+
+    yield from walk(str(mrt_input_path), 0, {})
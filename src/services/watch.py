@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+mrtawk - Advanced Anomaly Detection in Internet Routing
+Copyright (C) 2024 Benedikt Schwering
+
+This software is distributed under the terms of the MIT license.
+It can be found in the LICENSE file or at https://opensource.org/licenses/MIT.
+
+Author Benedikt SCHWERING <mail@bschwer.ing>
+"""
+from src.services.scenario import load_scenario, save_scenario
+from src.services.filename import parse_mrt_file_name, to_epoch, from_epoch
+from src.services.rewrite import UPDATE_FILE_INTERVAL
+from src.services.transfer import transfer_files
+from src.services.daemon import ArchiveCatalogue
+from src.services.store import store_files
+from src.services.stats import update_stats
+from src.models.watch import WatchResult
+from src.models.query import QueryRequest
+from datetime import datetime, timedelta
+from typing import Optional
+from pathlib import Path
+import time
+
+def get_window_end(catalogue: ArchiveCatalogue, vendor: list[str], peer_name: list[str]) -> Optional[datetime]:
+    """ Get the end of the rolling window, the end of the newest matching update file of the archive.
+        Anchoring the window to the archive instead of the clock keeps the scenario intact while the archive lags behind.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            catalogue (ArchiveCatalogue): The archive catalogue.
+            vendor (list[str]): The vendors.
+            peer_name (list[str]): The peer names.
+
+        Returns:
+            Optional[datetime]: The end of the window or None if the archive has no matching update files.
+    """
+    for mrt_file_name, _ in reversed(catalogue.sorted_records):
+        if mrt_file_name.bgp_type == 'update' and mrt_file_name.vendor in vendor and mrt_file_name.peer_name in peer_name:
+            return from_epoch(mrt_file_name.timestamp) + UPDATE_FILE_INTERVAL
+
+    return None
+
+def watch_cycle(catalogue: ArchiveCatalogue, scenario_output_path: Path, vendor: list[str], peer_name: list[str], window: timedelta, strategy: str = 'copy', jobs: int = 4, checksum: bool = False, store_path: Optional[Path] = None, window_start: Optional[datetime] = None) -> WatchResult:
+    """ Bring a rolling window scenario up to date with the archive.
+        New update files within the window are transferred, the scenario file is replaced atomically,
+        and only then files that fell out of the window are removed, so the scenario file never references missing files.
+
+        Author:
+            Benedikt SCHWERING <mail@bschwer.ing>
+
+        Params:
+            catalogue (ArchiveCatalogue): The archive catalogue, kept between cycles.
+            scenario_output_path (Path): The path to the scenario output directory.
+            vendor (list[str]): The vendors.
+            peer_name (list[str]): The peer names.
+            window (timedelta): The length of the rolling window.
+            strategy (str): The transfer strategy, one of copy, hardlink, reflink or symlink.
+            jobs (int): The maximum number of concurrent transfers.
+            checksum (bool): Compare checksums instead of size and mtime to skip files already in the scenario.
+            store_path (Optional[Path]): The path to the shared MRT store, files are linked from the store if given.
+            window_start (Optional[datetime]): The window start of the previous cycle, older archive directories are not rescanned.
+
+        Returns:
+            WatchResult: The watch cycle result.
+    """
+    start_time = time.perf_counter()
+
+    records = catalogue.rescan(
+        request=QueryRequest(
+            start_datetime=window_start or from_epoch(0),
+            end_datetime=datetime.max,
+            vendor=vendor,
+            peer_name=peer_name,
+            bgp_type=['update'],
+        ),
+    )
+    if records is not None:
+        catalogue.apply(records)
+
+    result = WatchResult(
+        window_start=None,
+        window_end=get_window_end(catalogue, vendor, peer_name),
+        scanned_directories=catalogue.listed_directories,
+        added_files=[],
+        expired_files=[],
+        failed_files=[],
+        duration=0,
+    )
+
+    if not result.window_end:
+        result.duration = time.perf_counter() - start_time
+        return result
+
+    result.window_start = result.window_end - window
+    scenario = load_scenario(
+        scenario_output_path=scenario_output_path,
+    )
+    present = set(scenario.mrt_files)
+
+    sources = [
+        path
+        for _, path in catalogue.iterate(QueryRequest(
+            start_datetime=result.window_start,
+            end_datetime=result.window_end,
+            vendor=vendor,
+            peer_name=peer_name,
+            bgp_type=['update'],
+        ))
+        if path.name not in present
+    ]
+
+    if sources and store_path:
+        transfer_result = store_files(
+            store_path=store_path,
+            sources=sources,
+            target_directory=scenario_output_path,
+            jobs=jobs,
+            show_progress=False,
+        )
+    elif sources:
+        transfer_result = transfer_files(
+            sources=sources,
+            target_directory=scenario_output_path,
+            strategy=strategy,
+            jobs=jobs,
+            checksum=checksum,
+            show_progress=False,
+        )
+    else:
+        transfer_result = None
+
+    if transfer_result:
+        result.added_files = transfer_result.transferred_files + transfer_result.skipped_files
+        result.failed_files = transfer_result.failed_files
+
+    start = to_epoch(result.window_start)
+    result.expired_files = [
+        mrt_file
+        for mrt_file in scenario.mrt_files
+        if (mrt_file_name := parse_mrt_file_name(mrt_file)) and mrt_file_name.timestamp < start
+    ]
+
+    if not result.added_files and not result.expired_files:
+        result.duration = time.perf_counter() - start_time
+        return result
+
+    expired = set(result.expired_files)
+    scenario.mrt_files = [mrt_file for mrt_file in scenario.mrt_files if mrt_file not in expired] + result.added_files
+
+    if scenario.stats_file:
+        update_stats(
+            scenario_output_path=scenario_output_path,
+            scenario=scenario,
+            jobs=jobs,
+        )
+
+    save_scenario(
+        scenario_output_path=scenario_output_path,
+        scenario=scenario,
+    )
+
+    for mrt_file in result.expired_files:
+        (scenario_output_path / mrt_file).unlink(missing_ok=True)
+
+    result.duration = time.perf_counter() - start_time
+
+    return result